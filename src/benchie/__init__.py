@@ -1,13 +1,25 @@
+import functools
 import subprocess
 import sys
 import time
+from contextlib import ExitStack
 from pathlib import Path
 
 from loguru import logger
 
 from benchie.benchmark import benchmark
+from benchie.cache import ResultCache
+from benchie.calibration import calibrate, set_hash_seed, write_calibration, write_normalised
+from benchie.complexity import write_complexity
+from benchie.containers import ContainerPool, DockerRuntime
+from benchie.daemon import Backoff, SolutionsWatcher, Trigger, serve, start_notify_server
+from benchie.events import events
 from benchie.fetch_submissions import refresh
+from benchie.history import History
+from benchie.leaderboard import write_leaderboard
+from benchie.regression import detect_regressions
 from benchie.reporting import postprocess_output
+from benchie.sweep import run_sweep_all
 
 
 def do_commit(cwd):
@@ -51,6 +63,32 @@ def main(
     loop_timeout,
     benchmark_options,
     docker_image,
+    jobs=1,
+    cache_dir=None,
+    target_ci=0.05,
+    time_budget=10.0,
+    min_runs=3,
+    batch_size=1,
+    race_rounds=5,
+    race_factor=1.0,
+    pretest_as_warmup=False,
+    docker_pool=0,
+    docker_memory="2g",
+    flamegraph=False,
+    rss_interval_ms=10,
+    history=None,
+    events_path=None,
+    metrics_path=None,
+    daemon=False,
+    notify_host="127.0.0.1",
+    notify_port=8765,
+    watch=False,
+    debounce=5.0,
+    poll_interval=60,
+    calibration=False,
+    calibration_reference=None,
+    normalise=False,
+    hash_seed="0",
     *args,
     **kwargs,
 ):
@@ -77,6 +115,33 @@ def main(
         loop_timeout (float): Timeout value for the loop.
         benchmark_options (list[BenchmarkOption]): List of benchmarking options.
         docker_image (str): Docker image to use for benchmarking.
+        jobs (int): Number of solutions to run at the same time.
+        cache_dir (str): Path to the result cache. Solutions with cached results are not run again.
+        target_ci (float): Target relative width of the confidence interval for the adaptive benchmark.
+        time_budget (float): Time budget in seconds per solution for the adaptive benchmark.
+        min_runs (int): Minimum number of hyperfine runs of every solution.
+        batch_size (int): Number of solutions per hyperfine process.
+        race_rounds (int): Number of rounds of the racing benchmark.
+        race_factor (float): How much slower than the leader a solution has to be to be eliminated from the race.
+        pretest_as_warmup (bool): Flag indicating whether the pretest run counts as the warmup of the timed benchmarks.
+        docker_pool (int): Number of long-lived, CPU-pinned containers to run the docker image in, 0 to disable.
+        docker_memory (str): Memory limit of every container in the pool.
+        flamegraph (bool): Flag indicating whether to render a memray flamegraph of every solution.
+        rss_interval_ms (int): Interval to sample the memory of the timed runs at, with the rss option.
+        history (str): Path to a SQLite database to store the results of every iteration in, see `History`.
+        events_path (str): Path to a JSON lines file to append the progress events to, see `benchie.events`.
+        metrics_path (str): Path to write the Prometheus metrics to, for the textfile collector of the node exporter.
+        daemon (bool): Flag indicating whether to run cycles on notifications instead of the loop, see `benchie.daemon`.
+        notify_host (str): Host to listen for notifications on in daemon mode.
+        notify_port (int): Port to listen for notifications on in daemon mode.
+        watch (bool): Flag indicating whether to watch the solutions folder for changes in daemon mode.
+        debounce (float): Time in seconds without new notifications before a cycle starts in daemon mode.
+        poll_interval (float): Minimum interval of the fallback polling in daemon mode, backing off to `loop_timeout`.
+        calibration (bool): Flag indicating whether to calibrate the speed and noise of the host before and after
+            every cycle, see `benchie.calibration`.
+        calibration_reference (str): Path to the calibration of the reference machine, written by the first host.
+        normalise (bool): Flag indicating whether to also report the times normalised to the reference machine.
+        hash_seed (str): PYTHONHASHSEED of the solutions with calibration, unless it is already set.
 
     Returns
     -------
@@ -90,72 +155,278 @@ def main(
     output = Path(output).resolve() / exercise_name
     output.mkdir(exist_ok=True, parents=True)
     solutions_path = Path(solutions).resolve() / exercise_name
+    cache = ResultCache(cache_dir) if cache_dir else None
+    events.configure(events_path=events_path, metrics_path=metrics_path)
+    if calibration:
+        logger.info(f"PYTHONHASHSEED={set_hash_seed(hash_seed)}")
+        calibration_reference = calibration_reference or output / "calibration_reference.json"
+    if daemon and cache is None:
+        # unchanged solutions are restored from the cache, so a cycle only runs the changed solutions
+        cache = ResultCache(output / "cache")
+    with ExitStack() as stack:
+        if history:
+            history = History(history)
+            stack.callback(history.close)
+        pool = None
+        if docker_image and docker_pool:
+            pool = stack.enter_context(ContainerPool(DockerRuntime(), docker_image, docker_pool, memory=docker_memory))
+        benchmark_kwargs = {
+            "subset": subset,
+            "timeout": timeout,
+            "disable_pretest": disable_pretest,
+            "benchmark_options": benchmark_options,
+            "docker_image": docker_image,
+            "jobs": jobs,
+            "cache": cache,
+            "target_ci": target_ci,
+            "time_budget": time_budget,
+            "min_runs": min_runs,
+            "batch_size": batch_size,
+            "race_rounds": race_rounds,
+            "race_factor": race_factor,
+            "pretest_as_warmup": pretest_as_warmup,
+            "pool": pool,
+            "flamegraph": flamegraph,
+            "rss_interval_ms": rss_interval_ms,
+        }
+        cycle = functools.partial(
+            _run_cycle,
+            exercise_name=exercise_name,
+            data=data,
+            output=output,
+            solutions_path=solutions_path,
+            fetch_args=None if skip_fetch else (course_id, exercise_id, solutions_path, token),
+            force=force,
+            subset=subset,
+            subset_data=subset_data,
+            skip_benchmark=skip_benchmark,
+            history=history,
+            calibration_reference=calibration_reference if calibration else None,
+            normalise=normalise,
+            commit_cwd=cwd if commit else None,
+            benchmark_kwargs=benchmark_kwargs,
+        )
+        if daemon:
+            trigger = Trigger()
+            server = start_notify_server(trigger, notify_host, notify_port)
+            stack.callback(server.shutdown)
+            if watch:
+                watcher = SolutionsWatcher(trigger, solutions_path)
+                watcher.start()
+                stack.callback(watcher.stop)
+            # the first cycle benchmarks the current solutions
+            trigger.notify()
+            serve(cycle, trigger, Backoff(poll_interval, max(poll_interval, loop_timeout)), debounce=debounce)
+            return
+        _run_loop(cycle, loop, loop_timeout, exercise_name)
+
+
+def _run_loop(cycle, loop, loop_timeout, exercise_name):
+    """Run cycles until there is no data, or forever with `loop`, sleeping `loop_timeout` seconds when nothing changed."""
     while True:
-        if not skip_fetch:
-            refreshed = refresh(
-                # course id
-                course_id,
-                # exercise id
-                exercise_id,
-                # output directory
-                solutions_path,
-                # token location
-                token,
-            )
-        else:
-            refreshed = True
-        logger.info(force)
-        if force or refreshed:
-            logger.info("New submissions or forced")
-            # there is new data
-            # benchmark(6, Path("reconstruction/J02459.1.6mers"), output=output)
-            # benchmark(50, Path("reconstruction/J02459.1.50mers"), output=output)
-            # make sure solutions are importable
-            logger.debug(solutions_path)
-            sys.path.append(str(solutions_path))
-
-            # find folders or .py files
-            all_solutions = [
-                p for p in solutions_path.iterdir() if (p.is_dir() and p.name != "__pycache__") or p.suffix == ".py"
-            ][:subset]
-            logger.info(f"Found {len(all_solutions)} solutions.")
-            valid_solutions = all_solutions
-
-            data_paths: list[Path] = sorted(data.resolve().glob("data_*.py"))[:subset_data]
-            shell_paths: list[Path] = sorted(data.resolve().glob("*.sh"))
-            if not data_paths and not shell_paths:
-                logger.info("No data to process")
-                return
-            for path in data_paths + shell_paths:
-                if not valid_solutions:
-                    logger.error("No valid solutions to benchmark.")
-                    break
-                assert path.exists(), f"Path {path} does not exist"
-                logger.info(f"Testing on data {path.name}")
-                output_folder_data = output / path.stem
-                if not skip_benchmark:
-                    valid_solutions = benchmark(
-                        path,
-                        subset=subset,
-                        output=output_folder_data,
-                        solutions=valid_solutions,
-                        timeout=timeout,
-                        disable_pretest=disable_pretest,
-                        benchmark_options=benchmark_options,
-                        docker_image=docker_image,
-                    )
-                logger.info("Postprocess")
-                postprocess_output(path, output_folder_data)
-                if commit:
-                    logger.info("Committing")
-                    do_commit(cwd)
-                else:
-                    logger.info("Not committing")
-        else:
-            # no new data
-            logger.info("No new submissions. Not Benchmarking")
-            if loop:
-                logger.info(f"Sleeping for {loop_timeout} seconds.")
-                time.sleep(loop_timeout)
+        benchmarked = cycle()
+        if benchmarked is None:
+            return
         if not loop:
             break
+        if not benchmarked:
+            logger.info(f"Sleeping for {loop_timeout} seconds.")
+            with events.stage("sleep", exercise=exercise_name):
+                time.sleep(loop_timeout)
+
+
+def _find_solutions(solutions_path, subset=None):
+    """Solution folders and .py files, and make the solutions importable."""
+    logger.debug(solutions_path)
+    if str(solutions_path) not in sys.path:
+        sys.path.append(str(solutions_path))
+    solutions = [p for p in solutions_path.iterdir() if (p.is_dir() and p.name != "__pycache__") or p.suffix == ".py"]
+    return solutions[:subset]
+
+
+def _run_dataset(
+    path,
+    output,
+    all_solutions,
+    valid_solutions,
+    exercise_name,
+    iteration=None,
+    history=None,
+    changed=None,
+    skip_benchmark=False,
+    commit_cwd=None,
+    benchmark_kwargs=None,
+):
+    """
+    Benchmark the valid solutions on a dataset and write its tables, see `_run_cycle` for the arguments.
+
+    Returns
+    -------
+        list[Path]: The solutions that are still valid.
+    """
+    assert path.exists(), f"Path {path} does not exist"
+    logger.info(f"Testing on data {path.name}")
+    output_folder_data = output / path.stem
+    if not skip_benchmark:
+        with events.stage("benchmark", exercise=exercise_name, dataset=path.stem):
+            valid_solutions = benchmark(
+                path,
+                output=output_folder_data,
+                solutions=valid_solutions,
+                changed=changed,
+                **(benchmark_kwargs or {}),
+            )
+        # compare the new versions of the solutions with their previous versions
+        detect_regressions(path, output_folder_data, output / "previous", all_solutions)
+    if iteration is not None:
+        history.record(iteration, path, output_folder_data, all_solutions)
+    logger.info("Postprocess")
+    postprocess_output(
+        path,
+        output_folder_data,
+        history=history if iteration is not None else None,
+        exercise=exercise_name,
+    )
+    if commit_cwd is not None:
+        logger.info("Committing")
+        do_commit(commit_cwd)
+    else:
+        logger.info("Not committing")
+    return valid_solutions
+
+
+def _run_sweeps(output, sweep_paths, solutions, exercise_name, timeout, jobs=1):
+    """Run the scaling sweeps of the solutions, see `benchie.sweep`."""
+    for path in sweep_paths:
+        with events.stage("sweep", exercise=exercise_name, dataset=path.stem):
+            run_sweep_all(output / path.stem, solutions, path, timeout=timeout, jobs=jobs)
+
+
+def _finish_calibration(
+    output, before, paths, exercise_name, iteration=None, history=None, calibration_reference=None, normalise=False
+):
+    """Calibrate the host after a cycle and write the calibration, and the normalised tables with `normalise`."""
+    with events.stage("calibration", exercise=exercise_name):
+        summary = write_calibration(output, before, calibrate(), calibration_reference)
+    if iteration is not None:
+        history.record_calibration(iteration, summary)
+    if normalise:
+        for path in paths:
+            write_normalised(path, output / path.stem, summary)
+
+
+def _run_cycle(
+    changed=None,
+    fetch=True,
+    *,
+    exercise_name,
+    data,
+    output,
+    solutions_path,
+    fetch_args=None,
+    force=False,
+    subset=None,
+    subset_data=None,
+    skip_benchmark=False,
+    history=None,
+    calibration_reference=None,
+    normalise=False,
+    commit_cwd=None,
+    benchmark_kwargs=None,
+):
+    """
+    Fetch and benchmark the solutions, returns whether there were new submissions or changed solutions.
+
+    With `changed`, only the changed solutions run and the others are restored from the cache.
+
+    Args:
+        changed (set[str]): Names of the changed solutions, or None for all solutions.
+        fetch (bool): Flag indicating whether to fetch new submissions first.
+        exercise_name (str): Exercise name.
+        data (Path): Data folder of the exercise.
+        output (Path): Output folder of the exercise.
+        solutions_path (Path): Solutions folder of the exercise.
+        fetch_args (tuple): Course id, exercise id, solutions folder and token location to fetch with, or None to
+            skip fetching.
+        force (bool): Flag indicating whether to benchmark even if there are no new submissions.
+        subset (int): Number of solutions to consider.
+        subset_data (int): Number of data files to consider.
+        skip_benchmark (bool): Flag indicating whether to skip benchmarking.
+        history (History): History to record the iteration in, or None.
+        calibration_reference (Path): Calibration of the reference machine, or None to not calibrate.
+        normalise (bool): Flag indicating whether to also report the times normalised to the reference machine.
+        commit_cwd (Path): Repository to commit the results to, or None to not commit.
+        benchmark_kwargs (dict): Keyword arguments of `benchie.benchmark.benchmark`.
+
+    Returns
+    -------
+        bool: Whether the solutions were benchmarked, or None without data.
+    """
+    refreshed = True
+    if fetch and fetch_args is not None:
+        with events.stage("fetch", exercise=exercise_name):
+            refreshed = refresh(*fetch_args)
+    logger.info(force)
+    if not (force or refreshed):
+        # no new data
+        logger.info("No new submissions. Not Benchmarking")
+        events.cycle_succeeded(exercise=exercise_name, benchmarked=False)
+        return False
+    logger.info("New submissions or forced")
+    if changed:
+        logger.info(f"Changed solutions: {', '.join(sorted(changed))}")
+    # there is new data
+    all_solutions = _find_solutions(solutions_path, subset)
+    logger.info(f"Found {len(all_solutions)} solutions.")
+    valid_solutions = all_solutions
+
+    data_paths: list[Path] = sorted(data.resolve().glob("data_*.py"))[:subset_data]
+    shell_paths: list[Path] = sorted(data.resolve().glob("*.sh"))
+    sweep_paths: list[Path] = sorted(data.resolve().glob("sweep_*.json"))
+    if not data_paths and not shell_paths and not sweep_paths:
+        logger.info("No data to process")
+        return None
+    iteration = history.start_iteration(exercise_name) if history and not skip_benchmark else None
+    calibration = calibration_reference is not None and not skip_benchmark
+    if calibration:
+        with events.stage("calibration", exercise=exercise_name):
+            before = calibrate()
+    for i, path in enumerate(data_paths + shell_paths):
+        events.queue("datasets", len(data_paths) + len(shell_paths) - i)
+        if not valid_solutions:
+            logger.error("No valid solutions to benchmark.")
+            break
+        valid_solutions = _run_dataset(
+            path,
+            output,
+            all_solutions,
+            valid_solutions,
+            exercise_name,
+            iteration=iteration,
+            history=history,
+            changed=changed,
+            skip_benchmark=skip_benchmark,
+            commit_cwd=commit_cwd,
+            benchmark_kwargs=benchmark_kwargs,
+        )
+    # fit the scaling of the solutions over the datasets of increasing size
+    write_complexity(output, data_paths)
+    write_leaderboard(output, data_paths + shell_paths, [solution.stem for solution in all_solutions])
+    if not skip_benchmark and valid_solutions:
+        _run_sweeps(
+            output, sweep_paths, valid_solutions, exercise_name, benchmark_kwargs["timeout"], benchmark_kwargs["jobs"]
+        )
+    events.queue("datasets", 0)
+    if calibration:
+        _finish_calibration(
+            output,
+            before,
+            data_paths + shell_paths,
+            exercise_name,
+            iteration,
+            history,
+            calibration_reference,
+            normalise,
+        )
+    events.cycle_succeeded(exercise=exercise_name, benchmarked=True)
+    return True
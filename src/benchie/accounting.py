@@ -0,0 +1,144 @@
+"""
+Account the resources a command and all its descendants used.
+
+The CPU time, peak memory, page faults and context switches come from the resource usage that `wait4` reports for
+a child, which includes the descendants it waited for. The I/O comes from `/proc/<pid>/io` of the exited child,
+read before it is reaped, which also includes its reaped descendants.
+
+This file only uses the standard library, so it can run as a script, e.g. as the shell of hyperfine:
+
+    python -S accounting.py --record runs.jsonl python -c "import solution"
+
+which runs the command and appends its resource usage as a JSON line to `runs.jsonl`.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# fields of /proc/<pid>/io to keep
+IO_FIELDS = ("rchar", "wchar", "read_bytes", "write_bytes")
+# resource fields that are summarized over runs
+RESOURCE_FIELDS = (
+    "user",
+    "system",
+    "max_rss",
+    "minor_faults",
+    "major_faults",
+    "voluntary_cs",
+    "involuntary_cs",
+    *IO_FIELDS,
+)
+
+
+def read_io(pid):
+    """
+    I/O counters of a process in bytes, all 0 if the platform has no `/proc/<pid>/io`.
+
+    >>> sorted(read_io(os.getpid())) == sorted(IO_FIELDS)
+    True
+    """
+    try:
+        text = Path(f"/proc/{pid}/io").read_text()
+    except OSError:
+        return dict.fromkeys(IO_FIELDS, 0)
+    counters = dict(line.split(": ") for line in text.splitlines() if ": " in line)
+    return {field: int(counters.get(field, 0)) for field in IO_FIELDS}
+
+
+def rusage_fields(rusage):
+    """Resource usage of `wait4`, with the peak memory in bytes."""
+    return {
+        "user": rusage.ru_utime,
+        "system": rusage.ru_stime,
+        # kB on Linux
+        "max_rss": rusage.ru_maxrss * 1024,
+        "minor_faults": rusage.ru_minflt,
+        "major_faults": rusage.ru_majflt,
+        "voluntary_cs": rusage.ru_nvcsw,
+        "involuntary_cs": rusage.ru_nivcsw,
+    }
+
+
+def has_exited(pid, block=False):
+    """Whether a child has exited, without reaping it. With `block`, wait until it has."""
+    options = os.WEXITED | os.WNOWAIT | (0 if block else os.WNOHANG)
+    return os.waitid(os.P_PID, pid, options) is not None
+
+
+def reap(pid):
+    """
+    Reap a child that has exited, see `has_exited`, and account its resources.
+
+    Returns
+    -------
+        tuple[int, dict]: The exit code and the resources, see `RESOURCE_FIELDS`.
+    """
+    # the exited child is a zombie until it is reaped, so its I/O counters can still be read
+    io = read_io(pid)
+    _, status, rusage = os.wait4(pid, 0)
+    return os.waitstatus_to_exitcode(status), {**rusage_fields(rusage), **io}
+
+
+def summarize_resources(runs):
+    """
+    Median of every resource field over the runs, with the CPU utilisation as the CPU time relative to the wall time.
+
+    >>> summarize_resources([{"wall": 2.0, "user": 1.0, "system": 0.5}, {"wall": 1.0, "user": 0.5, "system": 0.0}])["cpu"]
+    0.625
+    """
+    summary = {"n_runs": len(runs)}
+    for field in ("wall", *RESOURCE_FIELDS):
+        values = [run[field] for run in runs if field in run]
+        if values:
+            summary[field] = statistics.median(values)
+    cpu = [(run["user"] + run["system"]) / run["wall"] for run in runs if run.get("wall")]
+    if cpu:
+        summary["cpu"] = statistics.median(cpu)
+    return summary
+
+
+def write_resources_json(json_path, runs_by_name):
+    """Write the resources of the runs of all solutions, and their summary, to `<data>_resources.json`."""
+    results = [
+        {
+            "command": name,
+            **summarize_resources(runs),
+            "runs": [{k: v for k, v in run.items() if k not in ("argv", "cmdlines")} for run in runs],
+        }
+        for name, runs in runs_by_name.items()
+    ]
+    Path(json_path).write_text(json.dumps({"results": results}, indent=2), encoding="utf8")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", required=True, help="JSON lines file to append the resource usage to.")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    # the wall-clock window of the run, to compare with other processes, e.g. `benchie.interference`
+    started = time.time()
+    start = time.perf_counter()
+    process = subprocess.Popen(args.command)  # noqa: S603
+    # wait without reaping, so the I/O counters are still there
+    has_exited(process.pid, block=True)
+    wall = time.perf_counter() - start
+    exit_code, resources = reap(process.pid)
+    # the process is reaped by wait4, let Popen know
+    process.returncode = exit_code
+    record = {"argv": args.command, "wall": wall, "start": started, "end": started + wall, "exit_code": exit_code}
+    record.update(resources)
+    # a single write of a line in append mode, so parallel runs do not mix their records
+    with open(args.record, "a", encoding="utf8") as fh:
+        fh.write(json.dumps(record) + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import json
+import statistics
+import sys
+
+from loguru import logger
+
+from benchie.accounting import summarize_resources
+from benchie.measure import measure
+from benchie.runtime import merge_hyperfine_json, run_on_cores, solution_env
+from benchie.stats import is_stationary, relative_ci_width
+from benchie.utils import create_command
+
+
+def summarize_samples(name, samples, **extra):
+    """Summarize measured samples like a hyperfine JSON export result."""
+    times = [s["wall"] for s in samples if s["exit_code"] == 0]
+    result = {
+        "command": name,
+        "mean": statistics.mean(times) if times else float("nan"),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "median": statistics.median(times) if times else float("nan"),
+        "user": statistics.mean(s["user"] for s in samples) if samples else 0.0,
+        "system": statistics.mean(s["system"] for s in samples) if samples else 0.0,
+        "min": min(times) if times else float("nan"),
+        "max": max(times) if times else float("nan"),
+        "times": times,
+        "exit_codes": [s["exit_code"] for s in samples],
+    }
+    if any("max_rss" in s for s in samples):
+        result["resources"] = summarize_resources([s for s in samples if "max_rss" in s])
+    rss = [s["rss"] for s in samples if s.get("rss")]
+    if rss:
+        # memory sampled during the timed runs, see `RssSampler`
+        result["peak_rss"] = statistics.median(r["peak_rss"] for r in rss)
+        result["peak_uss"] = statistics.median(r["peak_uss"] for r in rss)
+    result.update(extra)
+    return result
+
+
+def sample_adaptive(
+    run, target_ci=0.05, time_budget=10.0, min_runs=3, max_runs=1000, max_warmup=10, window=3, tolerance=0.1, seed=()
+):
+    """
+    Measure until the confidence interval of the mean is narrow enough or the time budget runs out.
+
+    Warmup runs are measured until `window` consecutive runs are stationary; those runs are kept as the first
+    samples. Afterwards, runs are added until the 95% confidence interval of the mean is narrower than
+    `target_ci` relative to the mean.
+
+    Args:
+        run (callable): Measures a single run and returns a sample as returned by `measure`.
+        target_ci (float): Target width of the confidence interval, relative to the mean.
+        time_budget (float): Total wall time in seconds to spend, including the warmup.
+        min_runs (int): Minimum number of samples.
+        max_runs (int): Maximum number of samples.
+        max_warmup (int): Maximum number of warmup runs before the samples are used anyway.
+        window (int): Number of consecutive runs that have to be stationary to end the warmup.
+        tolerance (float): Maximum range of stationary runs, relative to their mean.
+        seed (list[dict]): Runs that were already measured, e.g. the pretest run. They count as the first warmup runs.
+
+    Returns
+    -------
+        tuple[list[dict], int, str]: The samples, the number of warmup runs and the reason sampling stopped.
+    """
+    history = list(seed)
+    spent = sum(s["wall"] for s in history)
+    # warmup: drop runs until the last `window` runs are stationary
+    while len(history) < max_warmup + window:
+        sample = run()
+        spent += sample["wall"]
+        if sample["exit_code"] != 0:
+            return [sample], len(history), "failed"
+        history.append(sample)
+        if is_stationary([s["wall"] for s in history], window=window, tolerance=tolerance):
+            break
+        if spent > time_budget:
+            break
+    n_warmup = max(len(history) - window, 0)
+    samples = history[n_warmup:]
+
+    while True:
+        times = [s["wall"] for s in samples]
+        if len(samples) >= min_runs and relative_ci_width(times) <= target_ci:
+            return samples, n_warmup, "converged"
+        if spent > time_budget and len(samples) >= min_runs:
+            return samples, n_warmup, "time_budget"
+        if len(samples) >= max_runs:
+            return samples, n_warmup, "max_runs"
+        sample = run()
+        spent += sample["wall"]
+        samples.append(sample)
+        if sample["exit_code"] != 0:
+            return samples, n_warmup, "failed"
+
+
+def run_adaptive_all(
+    output,
+    all_correct_solutions,
+    testfile,
+    target_ci=0.05,
+    time_budget=10.0,
+    timeout=None,
+    jobs=1,
+    durations=None,
+    seed_samples=None,
+    pool=None,
+    rss_interval_ms=None,
+):
+    """
+    Benchmark all solutions in a fresh interpreter per run, with an adaptive number of runs.
+
+    With the pretest `durations`, the slowest solutions start first. The `seed_samples`, e.g. the pretest runs,
+    count as the first warmup run of each solution. With a `ContainerPool`, every run is a `docker exec` in a
+    container of the pool instead of a run on the host. With `rss_interval_ms`, the memory of every run on the host
+    is sampled and the median peak RSS is added to the results.
+
+    The results are written to `<data>_adaptive.json` in the format of a hyperfine JSON export, with the number of
+    warmup runs and samples and the reason sampling stopped for every solution.
+
+    Returns
+    -------
+        dict: The merged results, or None if there was nothing to benchmark.
+    """
+    name = testfile.stem
+    if len(all_correct_solutions) == 0:
+        logger.error("No valid solutions to benchmark.")
+        return
+    jobs_output = output / f"{name}_adaptive_jobs"
+    jobs_output.mkdir(exist_ok=True, parents=True)
+
+    def run_solution(solution, cpu):
+        command = [sys.executable, "-c", create_command(solution, testfile)]
+        env = solution_env(solution)
+        logger.info(f"Adaptive benchmark of {solution.stem} on core {cpu}")
+
+        def run():
+            if pool is not None:
+                return pool.run(solution, testfile, timeout=timeout)
+            # DANGER: arbitrary code run, only run on valid Dodona code!
+            return measure(command, env=env, timeout=timeout, cpu=cpu, rss_interval_ms=rss_interval_ms)
+
+        samples, n_warmup, stop_reason = sample_adaptive(
+            run,
+            target_ci=target_ci,
+            time_budget=time_budget,
+            seed=[seed_samples[solution]] if solution in (seed_samples or {}) else (),
+        )
+        times = [s["wall"] for s in samples if s["exit_code"] == 0]
+        result = summarize_samples(
+            solution.stem,
+            samples,
+            n_samples=len(samples),
+            n_warmup=n_warmup,
+            stop_reason=stop_reason,
+            ci_rel_width=relative_ci_width(times) if len(times) > 1 else None,
+        )
+        logger.info(f"{solution.stem}: {len(samples)} samples after {n_warmup} warmup runs, stopped on {stop_reason}")
+        solution_json = jobs_output / f"{solution.stem}.json"
+        solution_json.write_text(json.dumps({"results": [result]}, indent=2), encoding="utf8")
+        return solution_json
+
+    jobs = pool.size if pool is not None else jobs
+    solution_jsons = run_on_cores(run_solution, all_correct_solutions, jobs, durations=durations)
+    names = [x.stem for x in all_correct_solutions]
+    return merge_hyperfine_json(solution_jsons, output / f"{name}_adaptive.json", names=names)
@@ -1,16 +1,24 @@
+import itertools
+import json
 import os
 import shutil
-import subprocess
 import sys
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
 
 from loguru import logger
 
-from benchie.memray import run_memray
-from benchie.reporting import key_by_memory
-from benchie.runtime import run_hyperfine_all
+from benchie.accounting import write_resources_json
+from benchie.adaptive import run_adaptive_all, summarize_samples
+from benchie.events import events, outcome
+from benchie.measure import measure
+from benchie.memray import run_memray_all
+from benchie.procfs import can_sample, write_rss_json
+from benchie.racing import run_racing_all
+from benchie.runtime import hyperfine_markdown, merge_hyperfine_json, run_forkserver_all, run_hyperfine_all
+from benchie.scalene import has_scalene, run_scalene_all
+from benchie.staging import remove_workdir, stage_workdir
 from benchie.utils import create_command
 
 
@@ -21,23 +29,57 @@ class BenchmarkOption(Enum):
     SCALENE = "scalene"
     MEMRAY_TRACKER = "memray_tracker"
     MEMRAY_IMPORTS = "memray_imports"
+    FORKSERVER = "forkserver"
+    ADAPTIVE = "adaptive"
+    RACING = "racing"
+    RSS = "rss"
+    RESOURCES = "resources"
+    INTERFERENCE = "interference"
+
+
+# record in the result cache for each cacheable option
+CACHE_RECORDS = {
+    BenchmarkOption.HYPERFINE.value: "hyperfine.json",
+    BenchmarkOption.FORKSERVER.value: "forkserver.json",
+    BenchmarkOption.ADAPTIVE.value: "adaptive.json",
+    BenchmarkOption.MEMRAY_TRACKER.value: "memray.txt",
+    BenchmarkOption.MEMRAY_IMPORTS.value: "memray_imports.txt",
+    BenchmarkOption.SCALENE.value: "scalene.json",
+}
+# JSON output file of the timing options, relative to the test file name
+TIMING_OUTPUTS = {
+    BenchmarkOption.HYPERFINE.value: "{}_benchmark.json",
+    BenchmarkOption.FORKSERVER.value: "{}_forkserver.json",
+    BenchmarkOption.ADAPTIVE.value: "{}_adaptive.json",
+}
+# JSON output file of the resources and the memory of the runs, relative to the test file name, by cache record
+RUN_OUTPUTS = {
+    "resources.json": "{}_resources.json",
+    "rss.json": "{}_rss.json",
+}
+# output file of the memory and profiling options, relative to the solution name
+MEMRAY_OUTPUTS = {
+    BenchmarkOption.MEMRAY_TRACKER.value: "{}_memray.txt",
+    BenchmarkOption.MEMRAY_IMPORTS.value: "{}_memray_imports.txt",
+    BenchmarkOption.SCALENE.value: "scalene/{}_scalene.json",
+}
 
 
 def prep_workdir(data_folder, chdir=True):
-    tmp = Path(tempfile.mkdtemp())
-    # copy all files from data folder to tmp, except .py files
-    for path in data_folder.glob("*"):
-        if path.is_dir():
-            dst = tmp / path.name
-            shutil.copytree(path, dst)
-        elif path.suffix != ".py":
-            shutil.copy(path, tmp)
+    """
+    Create a workdir with all files of the data folder, except .py files.
+
+    The files are linked from a read-only copy in the data store instead of copied, see `benchie.staging`. Remove
+    the workdir with `remove_workdir` when the run is done.
+    """
+    tmp = stage_workdir(data_folder)
     if chdir:
         os.chdir(tmp)
     return tmp
 
 
-def run_once(solution, testfile, timeout) -> None:
+def once_command(solution, testfile):
+    """Command and environment to run the test file once on a solution."""
     executable = sys.executable
     if solution.is_dir():
         src = solution / "src"
@@ -51,30 +93,17 @@ def run_once(solution, testfile, timeout) -> None:
     logger.info(f"Command: {command}")
     # cmds = f"docker run -it --rm --mount type=bind,source={solution!s},destination=/submission,readonly local_combio_project"
     # logger.debug(f"Running command: {cmds}")
-    subprocess.run(
-        [executable, "-c", command],
-        # cmds,
-        check=True,
-        timeout=timeout,
-        env=env,
-        # shell=True,
-    )
+    return [executable, "-c", command], env
 
 
-def run_once_docker(docker_image, solution, testfile, timeout) -> None:
+def once_command_docker(docker_image, solution, testfile):
+    """Shell command to run the test file once on a solution in a docker container."""
     src = "/submission/" + solution.name + "/src" if solution.is_dir() else "/submission"
     command = create_command(solution, testfile)
     logger.info(f"Command: {command}")
     cmds = f"docker run -t --rm --mount type=bind,source={solution!s},destination=/submission/{solution.name!s},readonly --entrypoint '/bin/bash' {docker_image} -c 'PYTHONPATH={src} uv run --frozen --no-sync python -c \"{command}\"'"
     logger.debug(f"Running command: {cmds}")
-    subprocess.run(
-        # [executable, "-c", command],
-        cmds,
-        check=True,
-        timeout=timeout,
-        # env=env,
-        shell=True,
-    )
+    return cmds
 
 
 def _parse_dynamic_sampling_timer(timer: int, base_limit: int = 1, runtime_percentage=0.001) -> int:
@@ -89,6 +118,398 @@ def _parse_dynamic_sampling_timer(timer: int, base_limit: int = 1, runtime_perce
     return max(round(timer * runtime_percentage), base_limit)
 
 
+def pretest_solution(solution, testfile, timeout, docker_image=None, pool=None, rss_interval_ms=None):
+    """
+    Test the correctness of a single solution in its own working directory.
+
+    The run is measured, so it can also count as the first run of the timed benchmark.
+
+    Args:
+        solution (Path): Path to the solution.
+        testfile (Path): Path to the test file.
+        timeout (int): Timeout value in seconds.
+        docker_image (str): Docker image to use for the run.
+        pool (ContainerPool): Pool of containers to run in, instead of a new container for the run.
+        rss_interval_ms (int): Interval to sample the memory of the run at, see `RssSampler`.
+
+    Returns
+    -------
+        dict: The measured run, see `measure`, or None if the solution could not run.
+    """
+    if pool is not None:
+        # DANGER: arbitrary code run, only run on valid Dodona code!
+        sample = pool.run(solution, testfile, timeout=timeout)
+        if sample["exit_code"] != 0:
+            logger.error(f"Error while testing '{solution.stem}'; exit code {sample['exit_code']}")
+        return sample
+    workdir = prep_workdir(testfile.parent, chdir=False)
+    try:
+        if docker_image:
+            command, env = ["/bin/sh", "-c", once_command_docker(docker_image, solution, testfile)], None
+        else:
+            command, env = once_command(solution, testfile)
+        # DANGER: arbitrary code run, only run on valid Dodona code!
+        # the memory of a docker client says nothing about the solution
+        rss = None if docker_image else rss_interval_ms
+        sample = measure(command, env=env, cwd=workdir, timeout=timeout, rss_interval_ms=rss)
+    except FileNotFoundError:
+        logger.error(f"File not found while testing '{solution.stem}'")
+        return None
+    finally:
+        remove_workdir(workdir)
+    if sample["exit_code"] is None:
+        logger.error(f"Timeout while testing '{solution.stem}'")
+    elif sample["exit_code"] != 0:
+        logger.error(f"Error while testing '{solution.stem}'; exit code {sample['exit_code']}")
+    return sample
+
+
+def pretest_all(solutions, testfile, timeout, docker_image=None, jobs=1, output=None, pool=None, rss_interval_ms=None):
+    """
+    Test the correctness of all solutions, running up to `jobs` solutions at the same time.
+
+    The measured runs are written to `<data>_pretest.json` in `output`, in the format of a hyperfine JSON export.
+
+    Returns
+    -------
+        list[dict]: The correct solutions in the order of `solutions`, with their pretest run.
+    """
+    jobs = pool.size if pool is not None else jobs
+    logger.info(f"Testing correctness with {jobs} job(s).")
+    events.queue("pretest", len(solutions))
+    finished = itertools.count(1)
+
+    def run(solution):
+        sample = pretest_solution(solution, testfile, timeout, docker_image, pool, rss_interval_ms)
+        events.queue("pretest", len(solutions) - next(finished))
+        return sample
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        # map keeps the order of the solutions, whatever order the runs finish in
+        samples = list(executor.map(run, solutions))
+    all_correct_solutions = []
+    results = []
+    for solution, sample in zip(solutions, samples):
+        if sample is None:
+            events.run("pretest", solution.stem, testfile.stem, "failed")
+            continue
+        events.run("pretest", solution.stem, testfile.stem, outcome(sample["exit_code"]), duration=sample["wall"])
+        results.append(summarize_samples(solution.stem, [sample]))
+        if sample["exit_code"] != 0:
+            continue
+        # time is in s, convert to ms
+        pretest_ms = round(sample["wall"] * 1000)
+        all_correct_solutions.append({
+            "path": solution,
+            # round to 10 ms, take .1% of runtime
+            "memory_interval_ms": _parse_dynamic_sampling_timer(pretest_ms),
+            "pretest_ms": pretest_ms,
+            "pretest": sample,
+        })
+    if output is not None:
+        (output / f"{testfile.stem}_pretest.json").write_text(json.dumps({"results": results}, indent=2))
+    return all_correct_solutions
+
+
+def _cache_settings(benchmark_options, timeout, disable_pretest, rss, **options):
+    """
+    Settings of a benchmark that change its measurements, as part of the cache key.
+
+    The `options` are those of `benchmark`, only those of the selected options are kept.
+
+    >>> _cache_settings(["hyperfine"], 10, False, None, time_budget=10.0, min_runs=3, batch_size=1,
+    ...     pretest_as_warmup=False, target_ci=0.05)
+    {'timeout': 10, 'disable_pretest': False, 'time_budget': 10.0, 'pretest_as_warmup': False, 'min_runs': 3, 'batch_size': 1, 'resources': False, 'interference': False}
+    """
+    settings = {"timeout": timeout, "disable_pretest": disable_pretest}
+    timed = {BenchmarkOption.HYPERFINE.value, BenchmarkOption.ADAPTIVE.value}.intersection(benchmark_options)
+    if timed:
+        # the time budget caps the hyperfine runs, the pretest replaces the warmup
+        settings.update(time_budget=options["time_budget"], pretest_as_warmup=options["pretest_as_warmup"])
+    if BenchmarkOption.HYPERFINE.value in benchmark_options:
+        settings.update(
+            min_runs=options["min_runs"],
+            batch_size=options["batch_size"],
+            # the accounting wrapper adds noise to the hyperfine runs
+            resources=BenchmarkOption.RESOURCES.value in benchmark_options,
+            interference=BenchmarkOption.INTERFERENCE.value in benchmark_options,
+        )
+    if BenchmarkOption.ADAPTIVE.value in benchmark_options:
+        settings.update(target_ci=options["target_ci"])
+    if rss:
+        settings.update(rss_interval_ms=rss)
+    return settings
+
+
+def _cache_lookup(cache, solutions, testfile, benchmark_options, docker_image, settings):
+    """
+    Split the solutions in those with all requested results in the cache and those that need to run.
+
+    Solutions that failed the pretest with the same source and data count as cached, so they are not run again.
+    A timeout can be transient, e.g. under load, so it is never cached.
+    """
+    keys = {
+        solution: cache.key(solution, testfile, docker_image=docker_image, settings=settings) for solution in solutions
+    }
+    records = [record for option, record in CACHE_RECORDS.items() if option in benchmark_options]
+    cached = []
+    for solution in solutions:
+        pretest = cache.load(keys[solution], "pretest.json")
+        if pretest is None:
+            continue
+        pretest = json.loads(pretest)
+        if pretest.get("outcome") == "failed" or (pretest["ok"] and cache.has(keys[solution], records)):
+            cached.append(solution)
+    return keys, cached
+
+
+def _json_outputs(benchmark_options):
+    """JSON output files with a result per solution that are cached, by cache record, relative to the test file name."""
+    outputs = {
+        CACHE_RECORDS[option]: output_name
+        for option, output_name in TIMING_OUTPUTS.items()
+        if option in benchmark_options
+    }
+    outputs.update(RUN_OUTPUTS)
+    return outputs
+
+
+def _pretest_exit_codes(output, testfile):
+    """Exit code of the pretest of every solution that ran, None after a timeout."""
+    pretest_path = output / f"{testfile.stem}_pretest.json"
+    if not pretest_path.exists():
+        return {}
+    results = json.loads(pretest_path.read_text(encoding="utf8"))["results"]
+    return {c["command"]: c["exit_codes"][-1] for c in results if c.get("exit_codes")}
+
+
+def _cache_store(cache, keys, solutions, all_correct_solutions, output, testfile, benchmark_options):
+    """Store the results of the solutions that just ran in the cache, except those that timed out."""
+    correct = {solution["path"]: solution for solution in all_correct_solutions}
+    exit_codes = _pretest_exit_codes(output, testfile)
+    records = {}
+    for record, output_name in _json_outputs(benchmark_options).items():
+        json_path = output / output_name.format(testfile.stem)
+        if json_path.exists():
+            results = json.loads(json_path.read_text(encoding="utf8"))["results"]
+            records[record] = {c["command"]: c for c in results}
+    for solution in solutions:
+        key = keys[solution]
+        ok = solution in correct
+        # a solution that could not run at all failed as well
+        result = "ok" if ok else outcome(exit_codes.get(solution.stem, 1))
+        if result == "timeout":
+            continue
+        pretest_ms = correct[solution].get("pretest_ms") if ok else None
+        cache.store(key, "pretest.json", json.dumps({"ok": ok, "outcome": result, "pretest_ms": pretest_ms}))
+        if not ok:
+            continue
+        # failed timing runs are not cached, so they run again next time
+        for record, results in records.items():
+            if solution.stem in results:
+                cache.store(key, record, json.dumps(results[solution.stem]))
+        for option, output_name in MEMRAY_OUTPUTS.items():
+            output_peak = output / output_name.format(solution.stem)
+            if option in benchmark_options and output_peak.exists():
+                cache.store(key, CACHE_RECORDS[option], output_peak.read_text())
+
+
+def _merge_cached(output, json_path, results, names):
+    """Merge the cached results into a JSON output of the solutions that just ran, or write it if there is none."""
+    cached_json = output / f"{json_path.stem}_cached.json"
+    cached_json.write_text(json.dumps({"results": results}), encoding="utf8")
+    json_paths = [json_path, cached_json] if json_path.exists() else [cached_json]
+    merged = merge_hyperfine_json(json_paths, json_path, names=names)
+    cached_json.unlink()
+    return merged
+
+
+def _cache_restore(cache, keys, cached, output, testfile, benchmark_options, names):
+    """
+    Write the cached results to the output folder, next to the results of the solutions that just ran.
+
+    Returns
+    -------
+        list[Path]: The cached solutions that passed the pretest.
+    """
+    correct = []
+    outputs = _json_outputs(benchmark_options)
+    records = {record: [] for record in outputs}
+    for solution in cached:
+        key = keys[solution]
+        if not json.loads(cache.load(key, "pretest.json"))["ok"]:
+            logger.info(f"Skipping '{solution.stem}', it failed before with the same source and data")
+            continue
+        correct.append(solution)
+        # the resources and memory of the runs are only there if they were recorded
+        for record, results in records.items():
+            result = cache.load(key, record)
+            if result is not None:
+                results.append(json.loads(result))
+        for option, output_name in MEMRAY_OUTPUTS.items():
+            if option in benchmark_options:
+                output_path = output / output_name.format(solution.stem)
+                output_path.parent.mkdir(exist_ok=True)
+                output_path.write_text(cache.load(key, CACHE_RECORDS[option]))
+    name = testfile.stem
+    for record, results in records.items():
+        if not results:
+            continue
+        merged = _merge_cached(output, output / outputs[record].format(name), results, names)
+        if record == CACHE_RECORDS[BenchmarkOption.HYPERFINE.value]:
+            (output / f"{name}_benchmark.md").write_text(hyperfine_markdown(merged["results"]), encoding="utf8")
+    return correct
+
+
+def _write_status(output, testfile, solutions, correct_solutions):
+    """
+    Write the status of every solution on the data to `<data>_status.json`: `ok`, `timeout` or `failed`.
+
+    The solutions that are missing in the results of the other data files are those that failed on this one.
+    """
+    exit_codes = _pretest_exit_codes(output, testfile)
+    status = {}
+    for solution in solutions:
+        if solution in correct_solutions:
+            status[solution.stem] = "ok"
+        elif solution.stem in exit_codes and exit_codes[solution.stem] is None:
+            status[solution.stem] = "timeout"
+        else:
+            status[solution.stem] = "failed"
+    (output / f"{testfile.stem}_status.json").write_text(json.dumps(status, indent=2), encoding="utf8")
+    return status
+
+
+def _clean_output(output):
+    """Remove everything in the output directory, except the .md files, or create it."""
+    if output.exists():
+        for path in output.glob("*"):
+            if path.suffix != ".md":
+                if path.is_dir():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+    output.mkdir(exist_ok=True)
+
+
+def _only_changed(solutions, changed):
+    """The solutions that changed, by name, the unchanged solutions without cached results are not run."""
+    unchanged = [solution for solution in solutions if solution.stem not in changed]
+    if unchanged:
+        logger.info(f"Not running {len(unchanged)} unchanged solution(s) without cached results.")
+    return [solution for solution in solutions if solution.stem in changed]
+
+
+def _run_hyperfine(output, all_correct_solutions, testfile, benchmark_options, docker_image=None, rss=None, **options):
+    """
+    Time the correct solutions with hyperfine, see `run_hyperfine_all` for the `options`.
+
+    Without hyperfine, the pretest runs are written as the accounted and sampled runs.
+    """
+    if BenchmarkOption.HYPERFINE.value in benchmark_options:
+        run_hyperfine_all(
+            output,
+            [solution["path"] for solution in all_correct_solutions],
+            testfile,
+            docker_image=docker_image,
+            rss_interval_ms=rss,
+            record_resources=BenchmarkOption.RESOURCES.value in benchmark_options,
+            interference=BenchmarkOption.INTERFERENCE.value in benchmark_options,
+            **options,
+        )
+    elif "pretest" in all_correct_solutions[0]:
+        pretests = {solution["path"].stem: solution["pretest"] for solution in all_correct_solutions}
+        if not docker_image:
+            write_resources_json(output / f"{testfile.stem}_resources.json", {k: [v] for k, v in pretests.items()})
+        if rss:
+            rss_runs = {k: [v["rss"]] if v.get("rss") else [] for k, v in pretests.items()}
+            write_rss_json(output / f"{testfile.stem}_rss.json", rss_runs)
+
+
+def _run_timing_engines(
+    output,
+    solution_paths,
+    testfile,
+    benchmark_options,
+    timeout,
+    docker_image=None,
+    pool=None,
+    rss=None,
+    jobs=1,
+    durations=None,
+    seed_samples=None,
+    target_ci=0.05,
+    time_budget=10.0,
+):
+    """Time the correct solutions with the forkserver and the adaptive benchmark, if selected."""
+    if BenchmarkOption.FORKSERVER.value in benchmark_options:
+        if docker_image:
+            logger.warning("The forkserver does not support docker images yet, skipping.")
+        else:
+            with events.stage("forkserver", dataset=testfile.stem):
+                run_forkserver_all(output, solution_paths, testfile, timeout=timeout, jobs=jobs, cwd=Path.cwd())
+
+    if BenchmarkOption.ADAPTIVE.value in benchmark_options:
+        if docker_image and pool is None:
+            logger.warning("The adaptive benchmark only supports docker images with a container pool, skipping.")
+        else:
+            with events.stage("adaptive", dataset=testfile.stem):
+                run_adaptive_all(
+                    output,
+                    solution_paths,
+                    testfile,
+                    target_ci=target_ci,
+                    time_budget=time_budget,
+                    timeout=timeout,
+                    jobs=jobs,
+                    durations=durations,
+                    seed_samples=seed_samples,
+                    pool=pool,
+                    rss_interval_ms=rss,
+                )
+
+
+def _run_profilers(
+    output,
+    solution_paths,
+    testfile,
+    benchmark_options,
+    timeout,
+    memory_intervals,
+    docker_image=None,
+    jobs=1,
+    flamegraph=False,
+):
+    """Profile the memory and the hotspots of the correct solutions with memray and scalene, if selected."""
+    n_memory_profiles = 3
+    for option, use_tracker, runs in (
+        (BenchmarkOption.MEMRAY_TRACKER.value, True, n_memory_profiles),
+        (BenchmarkOption.MEMRAY_IMPORTS.value, False, 1),
+    ):
+        if option in benchmark_options:
+            with events.stage(option, dataset=testfile.stem):
+                run_memray_all(
+                    output,
+                    solution_paths,
+                    testfile,
+                    use_tracker=use_tracker,
+                    runs=runs,
+                    timeout=timeout,
+                    memory_intervals=memory_intervals,
+                    jobs=jobs,
+                    flamegraph=flamegraph,
+                )
+
+    if BenchmarkOption.SCALENE.value in benchmark_options:
+        if docker_image:
+            logger.warning("Scalene does not support docker images yet, skipping.")
+        elif not has_scalene():
+            logger.warning("Scalene is not installed, skipping. Install it with `uv pip install scalene`.")
+        else:
+            with events.stage("scalene", dataset=testfile.stem):
+                run_scalene_all(output, solution_paths, testfile, timeout=timeout, jobs=jobs)
+
+
 def benchmark(
     testfile,
     output,
@@ -98,6 +519,19 @@ def benchmark(
     benchmark_options: list[BenchmarkOption],
     subset=None,
     docker_image=None,
+    jobs=1,
+    cache=None,
+    target_ci=0.05,
+    time_budget=10.0,
+    race_rounds=5,
+    race_factor=1.0,
+    pretest_as_warmup=False,
+    pool=None,
+    flamegraph=False,
+    rss_interval_ms=10,
+    min_runs=3,
+    batch_size=1,
+    changed=None,
 ):
     """
     Perform benchmarking on submissions.
@@ -108,6 +542,22 @@ def benchmark(
         output (Path): Path to the output directory.
         solutions (List[Path]): List of paths to the solutions.
         timeout (int): Timeout value in seconds.
+        jobs (int): Number of solutions to test and benchmark at the same time.
+        cache (ResultCache): Cache of earlier results. Only solutions without cached results are run.
+        target_ci (float): Adaptive option: target width of the confidence interval of the mean, relative to the mean.
+        time_budget (float): Maximum time in seconds to spend on each solution in the adaptive option, also caps the
+            number of hyperfine runs of each solution after a pretest.
+        race_rounds (int): Racing option: number of rounds.
+        race_factor (float): Racing option: how much slower than the leader a solution has to be to be eliminated.
+        pretest_as_warmup (bool): Count the pretest run as the warmup run of hyperfine and as the first run of the
+            adaptive and racing options.
+        pool (ContainerPool): Pool of long-lived containers for the pretest and the adaptive and racing options.
+        flamegraph (bool): Flag indicating whether to render a memray flamegraph of every solution.
+        rss_interval_ms (int): Interval to sample the memory of the timed runs at, with the rss option.
+        min_runs (int): Minimum number of hyperfine runs of each solution.
+        batch_size (int): Number of solutions per hyperfine process.
+        changed (set[str]): Names of the changed solutions, e.g. from the daemon. Only these run, the other
+            solutions are only restored from the cache. None to run every solution without cached results.
 
     Returns
     -------
@@ -115,123 +565,136 @@ def benchmark(
 
     """
     logger.info("Benchmarking submissions")
-    if output.exists():
-        # remove everything in the output directory, except the .md files
-        for path in output.glob("*"):
-            if path.suffix != ".md":
-                if path.is_dir():
-                    shutil.rmtree(path)
-                else:
-                    path.unlink()
-    output.mkdir(exist_ok=True)
-
+    _clean_output(output)
     testfile = testfile.resolve()
-    prep_workdir(testfile.parent)
+    cwd = Path.cwd()
+    workdir = prep_workdir(testfile.parent)
+
+    # sample the memory of the timed runs, see `RssSampler`
+    rss = rss_interval_ms if BenchmarkOption.RSS.value in benchmark_options and can_sample() else None
+
+    all_solutions = solutions
+    if cache is not None:
+        settings = _cache_settings(
+            benchmark_options,
+            timeout,
+            disable_pretest,
+            rss,
+            time_budget=time_budget,
+            pretest_as_warmup=pretest_as_warmup,
+            target_ci=target_ci,
+            min_runs=min_runs,
+            batch_size=batch_size,
+        )
+        keys, cached = _cache_lookup(cache, solutions, testfile, benchmark_options, docker_image, settings)
+        solutions = [solution for solution in solutions if solution not in cached]
+        logger.info(f"{len(cached)} solution(s) cached, {len(solutions)} solution(s) to run.")
+    if changed is not None:
+        solutions = _only_changed(solutions, changed)
 
     if not disable_pretest:
         # test solution correctness and report errors
-        logger.info("Testing correctness.")
-        import time
-
-        all_correct_solutions = []
-        for solution in solutions:
-            try:
-                # start time clock, set memory_interval_ms to 0.001 of runtime for each solution
-                start = time.time_ns()
-                if docker_image:
-                    run_once_docker(docker_image, solution, testfile, timeout)
-                else:
-                    run_once(solution, testfile, timeout)
-
-                end = time.time_ns()
-                # time is in ns, convert to ms
-                # round to 10 ms, take .1% of runtime
-                memory_interval_ms = _parse_dynamic_sampling_timer(int((end - start) / 1_000_000))
-
-                # code = with_timeout(timeout, action='timeout')(exec)(command)
-                # if code == 'timeout':
-                #     logger.error(f"Timeout while testing '{solution.stem}'")
-                #     continue
-                # exec(command)
-            except FileNotFoundError:
-                logger.error(f"File not found while testing '{solution.stem}'")
-                continue
-            except subprocess.TimeoutExpired:
-                logger.error(f"Timeout while testing '{solution.stem}'")
-                continue
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Error while testing '{solution.stem}'; {e}")
-                continue
-            all_correct_solutions.append({"path": solution, "memory_interval_ms": memory_interval_ms})
+        with events.stage("pretest", dataset=testfile.stem):
+            all_correct_solutions = pretest_all(
+                solutions,
+                testfile,
+                timeout,
+                docker_image=docker_image,
+                jobs=jobs,
+                output=output,
+                pool=pool,
+                rss_interval_ms=rss,
+            )
         logger.info(f"Correct solutions: {len(all_correct_solutions)}")
     else:
         all_correct_solutions = [{"path": solution, "memory_interval_ms": 10} for solution in solutions]
 
     logger.debug(f"Correct solutions: {all_correct_solutions}")
-
-    if BenchmarkOption.HYPERFINE.value in benchmark_options:
+    # the pretest durations set the order and the number of runs of the timed benchmarks
+    durations = {
+        solution["path"]: solution["pretest_ms"] for solution in all_correct_solutions if "pretest_ms" in solution
+    }
+    seed_samples = {}
+    if pretest_as_warmup:
+        seed_samples = {
+            solution["path"]: solution["pretest"] for solution in all_correct_solutions if "pretest" in solution
+        }
+
+    if all_correct_solutions:
+        _run_hyperfine(
+            output,
+            all_correct_solutions,
+            testfile,
+            benchmark_options,
+            docker_image=docker_image,
+            rss=rss,
+            # the pretest already warmed up the solution and its data
+            warmup=0 if seed_samples else 1,
+            subset=subset,
+            jobs=jobs,
+            durations=durations,
+            time_budget=time_budget,
+            min_runs=min_runs,
+            batch_size=batch_size,
+        )
         solution_paths = [solution["path"] for solution in all_correct_solutions]
-        run_hyperfine_all(output, solution_paths, testfile, subset=subset, docker_image=docker_image)
-
-    # prepare for memory profiling
-    n_memory_profiles = 3
-
-    for solution in all_correct_solutions:
-        path = solution["path"]
-        memory_interval_ms = solution["memory_interval_ms"]
-
-        # change work dir to the solutions path
-        if BenchmarkOption.MEMRAY_TRACKER.value in benchmark_options:
-            peaks = []
-            for i in range(n_memory_profiles):
-                logger.debug(f"Running memray on {path}, {i}")
-                workdir = prep_workdir(testfile.parent)
-                i_output = output / f"memray_{i}"
-                i_output.mkdir(exist_ok=True)
-                memray_peak = run_memray(
-                    i_output,
-                    path,
+        _run_timing_engines(
+            output,
+            solution_paths,
+            testfile,
+            benchmark_options,
+            timeout,
+            docker_image=docker_image,
+            pool=pool,
+            rss=rss,
+            jobs=jobs,
+            durations=durations,
+            seed_samples=seed_samples,
+            target_ci=target_ci,
+            time_budget=time_budget,
+        )
+        memory_intervals = {solution["path"]: solution["memory_interval_ms"] for solution in all_correct_solutions}
+        _run_profilers(
+            output,
+            solution_paths,
+            testfile,
+            benchmark_options,
+            timeout,
+            memory_intervals,
+            docker_image=docker_image,
+            jobs=jobs,
+            flamegraph=flamegraph,
+        )
+
+    correct = {solution["path"] for solution in all_correct_solutions}
+    if cache is not None:
+        _cache_store(cache, keys, solutions, all_correct_solutions, output, testfile, benchmark_options)
+        names = [solution.stem for solution in all_solutions]
+        correct.update(_cache_restore(cache, keys, cached, output, testfile, benchmark_options, names))
+    correct_solutions = [solution for solution in all_solutions if solution in correct]
+
+    # a race depends on all solutions, so it is never cached and always runs with the cached solutions too
+    if BenchmarkOption.RACING.value in benchmark_options and correct_solutions:
+        if docker_image and pool is None:
+            logger.warning("Racing only supports docker images with a container pool, skipping.")
+        else:
+            with events.stage("racing", dataset=testfile.stem):
+                run_racing_all(
+                    output,
+                    correct_solutions,
                     testfile,
-                    workdir,
-                    use_tracker=True,
+                    rounds=race_rounds,
+                    factor=race_factor,
                     timeout=timeout,
-                    memory_interval_ms=memory_interval_ms,
+                    jobs=jobs,
+                    seed_samples=seed_samples,
+                    pool=pool,
+                    rss_interval_ms=rss,
                 )
-                logger.debug(f"Peak memory usage: {memray_peak}")
-                peaks.append(memray_peak)
-            # get median peak memory usage, with support for KiB and MiB
-            median_peak = sorted(peaks, key=lambda x: key_by_memory(x))[len(peaks) // 2]
-            logger.info(f"Median peak memory usage: {median_peak}")
-            # write median peak memory usage to file
-            output_peak = output / f"{path.stem}_memray.txt"
-            output_peak.write_text(str(median_peak))
-        if BenchmarkOption.MEMRAY_IMPORTS.value in benchmark_options:
-            logger.debug(f"Running memray on {path}")
-            workdir = prep_workdir(testfile.parent)
-            i_output = output / "memray_imports"
-            i_output.mkdir(exist_ok=True)
-            memray_peak = run_memray(
-                i_output,
-                path,
-                testfile,
-                workdir,
-                use_tracker=False,
-                timeout=timeout,
-                memory_interval_ms=memory_interval_ms,
-            )
-            logger.debug(f"Peak memory usage: {memray_peak}")
-            # write median peak memory usage to file
-            output_peak = output / f"{path.stem}_memray_imports.txt"
-            output_peak.write_text(str(memray_peak))
-        if BenchmarkOption.SCALENE.value in benchmark_options:
-            from benchie.scalene import run_scalene
-
-            peaks = []
-            for i in range(n_memory_profiles):
-                i_output = output / f"memory_{i}"
-                i_output.mkdir(exist_ok=True)
-                run_scalene(i_output, path, testfile)
-    return [solution["path"] for solution in all_correct_solutions]
+    _write_status(output, testfile, all_solutions, correct_solutions)
+    os.chdir(cwd)
+    remove_workdir(workdir)
+    return correct_solutions
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from functools import cache
+from pathlib import Path
+
+from loguru import logger
+
+# files that change when a solution is run, but not when its source changes
+IGNORED_NAMES = {"__pycache__", ".git", ".DS_Store"}
+
+
+@cache
+def _hash_file(path, size, mtime_ns):
+    """Hash the content of a file, memoized on its size and modification time."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_file(path):
+    """
+    Hash the content of a file.
+
+    Large data files are only read again when their size or modification time changes.
+    """
+    path = Path(path)
+    stat = path.stat()
+    return _hash_file(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def hash_tree(path, skip_suffixes=()):
+    """
+    Hash a file or a folder on the relative paths and contents of all its files.
+
+    Args:
+        path (Path): File or folder to hash.
+        skip_suffixes (tuple[str]): File suffixes to leave out, e.g. `(".py",)`.
+
+    Returns
+    -------
+        str: The hex digest.
+    """
+    path = Path(path)
+    if path.is_file():
+        return hash_file(path)
+    h = hashlib.sha256()
+    for p in sorted(path.rglob("*")):
+        relative = p.relative_to(path)
+        if IGNORED_NAMES.intersection(relative.parts) or p.suffix == ".pyc" or not p.is_file():
+            continue
+        if p.suffix in skip_suffixes:
+            continue
+        h.update(str(relative).encode())
+        h.update(hash_file(p).encode())
+    return h.hexdigest()
+
+
+def hash_data(testfile):
+    """Hash a test file together with the input files that are staged next to it."""
+    h = hashlib.sha256()
+    h.update(Path(testfile).read_bytes())
+    h.update(hash_tree(Path(testfile).parent, skip_suffixes=(".py",)).encode())
+    return h.hexdigest()
+
+
+@cache
+def docker_image_id(docker_image):
+    """Id of a docker image, so a rebuilt image with the same tag invalidates the cache."""
+    try:
+        output = subprocess.run(  # noqa: S603
+            ["docker", "image", "inspect", "--format", "{{.Id}}", docker_image],  # noqa: S607
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        logger.warning(f"Could not inspect docker image {docker_image}, caching on its name")
+        return docker_image
+    return output.stdout.strip()
+
+
+class ResultCache:
+    """
+    Persistent cache of benchmark results, keyed on the content of everything that influences a result.
+
+    Every key is a folder with one record file per result, e.g. the hyperfine result or the memray peak.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def key(self, solution, testfile, docker_image=None, settings=None):
+        """
+        Key of a solution run on a test file.
+
+        Args:
+            solution (Path): Path to the solution file or folder.
+            testfile (Path): Path to the test file.
+            docker_image (str): Docker image the solution runs in.
+            settings (dict): Benchmark settings that influence the result, e.g. the timeout.
+
+        Returns
+        -------
+            str: The hex digest.
+        """
+        parts = {
+            # the name is the module name and the command name in the results
+            "name": Path(solution).name,
+            "solution": hash_tree(solution),
+            "data": hash_data(testfile),
+            "python": [sys.executable, sys.version],
+            "docker_image": docker_image_id(docker_image) if docker_image else None,
+            "settings": settings or {},
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key, record):
+        return self.root / key[:2] / key / record
+
+    def has(self, key, records):
+        return all(self._path(key, record).exists() for record in records)
+
+    def load(self, key, record):
+        path = self._path(key, record)
+        if not path.exists():
+            return None
+        return path.read_text(encoding="utf8")
+
+    def store(self, key, record, content):
+        path = self._path(key, record)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, so a crash never leaves a half-written record
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(content, encoding="utf8")
+        tmp.replace(path)
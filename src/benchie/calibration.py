@@ -0,0 +1,231 @@
+"""
+Calibration of the speed and the noise of a host, to compare results between machines.
+
+A fixed suite of reference workloads, CPU-bound, allocation-heavy and I/O, runs before and after every cycle. The
+speed factor of a host is the geometric mean of its workload times relative to a reference machine, so 2 is twice
+as slow, and its noise floor is the largest run-to-run noise of the workloads, their median absolute deviation
+relative to their median, so a single outlier does not count: a difference between two solutions smaller than the
+noise floor is not meaningful on that host.
+
+The reference machine is the first host that calibrates with a reference file, copy the file to the other hosts:
+
+    before = calibrate()
+    ...  # benchmark
+    write_calibration(output, before, calibrate(), reference_path="calibration_reference.json")
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from benchie.history import host_fingerprint
+from benchie.leaderboard import geometric_mean
+from benchie.regression import TIMING_FILES
+from benchie.runtime import hyperfine_markdown
+
+# reference workloads, each a `workload` function that takes about 10 to 50 ms on a recent machine
+WORKLOADS = {
+    "cpu": """
+def workload():
+    return sum(i * i % 7 for i in range(200_000))
+""",
+    "alloc": """
+def workload():
+    return len([{"key": list(range(20)), "value": str(i)} for i in range(20_000)])
+""",
+    "io": """
+import os, tempfile
+def workload():
+    with tempfile.TemporaryFile() as fh:
+        fh.write(b"x" * (4 << 20))
+        fh.flush()
+        os.fsync(fh.fileno())
+        fh.seek(0)
+        return len(fh.read())
+""",
+}
+# times the workloads in a fresh interpreter, after a warmup run
+RUNNER = """
+import json, time
+{workload}
+workload()
+times = []
+for _ in range({repeats}):
+    start = time.perf_counter()
+    workload()
+    times.append(time.perf_counter() - start)
+print(json.dumps(times))
+"""
+# fields of a hyperfine result that are times in seconds
+TIME_FIELDS = ["mean", "stddev", "median", "user", "system", "min", "max"]
+
+
+def set_hash_seed(seed="0"):
+    """
+    Fix the hash seed of all solutions, so the order of sets and dicts of strings is the same in every run.
+
+    A `PYTHONHASHSEED` that is already set takes precedence, the solutions get it with `benchie.runtime.solution_env`.
+    """
+    seed = str(seed)
+    current = os.environ.setdefault("PYTHONHASHSEED", seed)
+    if current != seed:
+        logger.warning(f"PYTHONHASHSEED={current} is already set, ignoring the hash seed {seed}")
+    return current
+
+
+def _read(path):
+    path = Path(path)
+    try:
+        return path.read_text().strip() if path.exists() else None
+    except OSError:
+        return None
+
+
+def environment_info():
+    """Details of the host and its state that affect the reproducibility of the benchmarks."""
+    fingerprint, info = host_fingerprint()
+    load = os.getloadavg() if hasattr(os, "getloadavg") else None
+    return {
+        **info,
+        "fingerprint": fingerprint,
+        "governor": _read("/sys/devices/system/cpu/cpu0/cpufreq/scaling_governor"),
+        "no_turbo": _read("/sys/devices/system/cpu/intel_pstate/no_turbo"),
+        "loadavg": list(load) if load else None,
+        "pythonhashseed": os.environ.get("PYTHONHASHSEED"),
+    }
+
+
+def run_workload(name, repeats=10):
+    """Times in seconds of the runs of a reference workload, in a fresh interpreter with the benchmark environment."""
+    code = RUNNER.format(workload=WORKLOADS[name], repeats=repeats)
+    process = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)  # noqa: S603
+    return json.loads(process.stdout)
+
+
+def relative_noise(times):
+    """
+    Median absolute deviation of the times relative to their median, scaled to a standard deviation.
+
+    >>> round(relative_noise([1.0, 1.1, 0.9, 1.0, 5.0]), 3)
+    0.148
+    """
+    median = statistics.median(times)
+    return 1.4826 * statistics.median(abs(t - median) for t in times) / median
+
+
+def calibrate(repeats=10):
+    """
+    Run the reference workloads.
+
+    Returns
+    -------
+        dict: The median time and the relative noise of every workload, the noise floor of the host and its
+            environment.
+    """
+    workloads = {}
+    for name in WORKLOADS:
+        times = run_workload(name, repeats)
+        workloads[name] = {"median": statistics.median(times), "noise": relative_noise(times), "times": times}
+    noise_floor = max(w["noise"] for w in workloads.values())
+    medians = ", ".join(f"{name} {w['median'] * 1000:.1f} ms" for name, w in workloads.items())
+    logger.info(f"Calibrated: {medians}, noise floor {noise_floor * 100:.1f}%")
+    return {"time": time.time(), "workloads": workloads, "noise_floor": noise_floor, "environment": environment_info()}
+
+
+def speed_factor(calibration, reference):
+    """
+    Geometric mean of the workload times relative to the reference machine.
+
+    >>> round(speed_factor({"workloads": {"cpu": {"median": 2.0}, "io": {"median": 8.0}}},
+    ...     {"workloads": {"cpu": {"median": 1.0}, "io": {"median": 2.0}}}), 4)
+    2.8284
+    """
+    return geometric_mean([
+        w["median"] / reference["workloads"][name]["median"]
+        for name, w in calibration["workloads"].items()
+        if name in reference["workloads"]
+    ])
+
+
+def load_reference(reference_path, calibration):
+    """The calibration of the reference machine, this host becomes the reference without a reference file."""
+    reference_path = Path(reference_path)
+    if reference_path.exists():
+        return json.loads(reference_path.read_text(encoding="utf8"))
+    logger.info(f"No reference calibration, {calibration['environment']['node']} is the reference machine")
+    reference_path.parent.mkdir(parents=True, exist_ok=True)
+    reference_path.write_text(json.dumps(calibration, indent=2), encoding="utf8")
+    return calibration
+
+
+def write_calibration(output, before, after, reference_path):
+    """
+    Write the calibrations before and after a cycle, with the speed factor and noise floor of the host, to
+    `calibration.json`.
+
+    Returns
+    -------
+        dict: The calibration summary, with the speed factor, the noise floor and the drift of the speed during
+            the cycle.
+    """
+    reference = load_reference(reference_path, before)
+    factors = [speed_factor(before, reference), speed_factor(after, reference)]
+    summary = {
+        "speed_factor": statistics.mean(factors),
+        "noise_floor": max(before["noise_floor"], after["noise_floor"]),
+        # a host that slows down during a cycle, e.g. by thermal throttling or other load, drifts
+        "drift": factors[1] / factors[0] - 1,
+        "reference": reference["environment"]["fingerprint"],
+        "before": before,
+        "after": after,
+    }
+    if abs(summary["drift"]) > summary["noise_floor"]:
+        logger.warning(f"The host drifted {summary['drift'] * 100:+.1f}% during the cycle, beyond its noise floor")
+    (Path(output) / "calibration.json").write_text(json.dumps(summary, indent=2), encoding="utf8")
+    logger.info(f"Speed factor {summary['speed_factor']:.2f}, noise floor {summary['noise_floor'] * 100:.1f}%")
+    return summary
+
+
+def normalise_results(results, factor):
+    """
+    Timing results as if they ran on the reference machine.
+
+    >>> normalise_results([{"command": "a", "mean": 2.0, "times": [1.0, 3.0]}], 2.0)
+    [{'command': 'a', 'mean': 1.0, 'times': [0.5, 1.5]}]
+    """
+    normalised = []
+    for result in results:
+        result = dict(result)
+        for field in TIME_FIELDS:
+            if result.get(field) is not None:
+                result[field] = result[field] / factor
+        if result.get("times"):
+            result["times"] = [t / factor for t in result["times"]]
+        normalised.append(result)
+    return normalised
+
+
+def write_normalised(testfile, output, summary):
+    """Write the times of a dataset normalised to the reference machine to `<data>_normalised_benchmark.md`."""
+    name = testfile.stem
+    for timing_file in TIMING_FILES:
+        json_path = output / timing_file.format(name)
+        if json_path.exists():
+            results = json.loads(json_path.read_text(encoding="utf8"))["results"]
+            break
+    else:
+        return None
+    table = hyperfine_markdown(normalise_results(results, summary["speed_factor"]))
+    note = (
+        f"\n\nTimes normalised to the reference machine: speed factor {summary['speed_factor']:.2f}, "
+        f"differences below the noise floor of {summary['noise_floor'] * 100:.1f}% are not significant.\n"
+    )
+    md_path = output / f"{name}_normalised_benchmark.md"
+    md_path.write_text(table + note, encoding="utf8")
+    return md_path
@@ -0,0 +1,214 @@
+"""
+Empirical complexity of the solutions, from their times and peak memory on datasets of increasing size.
+
+The size of a dataset is declared in a `sizes.json` next to the data files, e.g. `{"data_01": 1000, "data_02": 10000}`,
+or measured as the total size in bytes of the data files its test file refers to. For every solution, the time and
+the peak memory are fit against the size on a log-log scale, so the slope is the scaling exponent, e.g. about 2 for a
+quadratic solution.
+"""
+
+import json
+import math
+import re
+
+from loguru import logger
+
+from benchie.reporting import TIMING_ENGINES, key_by_memory
+
+# timing outputs of a dataset in order of preference, relative to the test file name
+TIMING_FILES = ["{}_benchmark.json", *(f"{{}}_{engine}.json" for engine in TIMING_ENGINES), "{}_pretest.json"]
+# peak memory outputs of a solution in order of preference, relative to the solution name
+MEMORY_FILES = ["{}_memray.txt", "{}_memray_imports.txt"]
+
+
+def fit_power_law(sizes, values):
+    """
+    Least squares fit of `value = coefficient * size ** exponent`, on a log-log scale.
+
+    Returns
+    -------
+        dict: The exponent, the coefficient, the coefficient of determination r2 of the fit on the log-log scale and
+            the number of points, or None if there are fewer than 2 different positive sizes.
+
+    >>> fit = fit_power_law([10, 100, 1000], [0.5, 50, 5000])
+    >>> round(fit["exponent"], 3), round(fit["coefficient"], 3), round(fit["r2"], 3)
+    (2.0, 0.005, 1.0)
+    """
+    points = [(math.log(s), math.log(v)) for s, v in zip(sizes, values) if s > 0 and v > 0]
+    if len({x for x, _ in points}) < 2:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    exponent = sxy / sxx
+    intercept = mean_y - exponent * mean_x
+    # a constant value is fit perfectly by a flat line
+    r2 = 1.0 if syy == 0 else sxy**2 / (sxx * syy)
+    return {"exponent": exponent, "coefficient": math.exp(intercept), "r2": r2, "n": n}
+
+
+def measure_size(testfile):
+    """Total size in bytes of the files in the data folder that the test file refers to, or None if there are none."""
+    testcode = testfile.read_text()
+    size = 0
+    found = False
+    for p in testfile.parent.rglob("*"):
+        if not p.is_file() or p.suffix == ".py" or p.name == "sizes.json":
+            continue
+        relative = p.relative_to(testfile.parent).as_posix()
+        if re.search(rf"(?<![\w.]){re.escape(relative)}(?![\w.])", testcode):
+            size += p.stat().st_size
+            found = True
+    return size if found else None
+
+
+def data_sizes(data_paths):
+    """
+    Size of every dataset, declared in `sizes.json` or measured with `measure_size`.
+
+    Returns
+    -------
+        dict: The size per test file name, without the datasets of which the size is unknown.
+    """
+    sizes = {}
+    for path in data_paths:
+        sidecar = path.parent / "sizes.json"
+        declared = json.loads(sidecar.read_text(encoding="utf8")) if sidecar.exists() else {}
+        size = declared.get(path.stem, declared.get(path.name))
+        if size is None:
+            size = measure_size(path)
+        if size is None:
+            logger.debug(f"Unknown size of {path.name}, it is left out of the complexity estimate")
+            continue
+        sizes[path.stem] = size
+    return sizes
+
+
+def read_median_times(output_data, name):
+    """
+    Median times in seconds of the solutions that passed, from the first timing output of a dataset.
+
+    Returns
+    -------
+        tuple[dict, dict]: The median time and the sampled peak RSS per solution.
+    """
+    for timing_file in TIMING_FILES:
+        json_path = output_data / timing_file.format(name)
+        if json_path.exists():
+            results = json.loads(json_path.read_text(encoding="utf8"))["results"]
+            times = {}
+            for c in results:
+                time = c.get("median", c["mean"])
+                if all(code == 0 for code in c.get("exit_codes", [0])) and not math.isnan(time):
+                    times[c["command"]] = time
+            return times, {c["command"]: c.get("peak_rss") for c in results if c.get("peak_rss")}
+    return {}, {}
+
+
+def read_peak_memory(output_data, solution):
+    """Memray peak memory of a solution in bytes, or None."""
+    for memory_file in MEMORY_FILES:
+        path = output_data / memory_file.format(solution)
+        if path.exists():
+            peak = key_by_memory(path.read_text())
+            # MB to bytes
+            return peak * 1e6 if peak != float("inf") else None
+    return None
+
+
+def collect_points(output, sizes):
+    """
+    Times in seconds and peak memory in bytes of every solution on every dataset with a known size.
+
+    The time is the median of the first timing output of a dataset, e.g. hyperfine, or the pretest. The peak memory
+    comes from memray, or the sampled peak RSS of the timed runs.
+
+    Returns
+    -------
+        dict: Per metric, `time` and `memory`, the `(size, value)` points per solution.
+    """
+    points = {"time": {}, "memory": {}}
+    for name, size in sizes.items():
+        output_data = output / name
+        times, peak_rss = read_median_times(output_data, name)
+        for solution, time in times.items():
+            points["time"].setdefault(solution, []).append((size, time))
+            memory = read_peak_memory(output_data, solution) or peak_rss.get(solution)
+            if memory:
+                points["memory"].setdefault(solution, []).append((size, memory))
+    return points
+
+
+def estimate_complexity(points, flag_exponent=1.5):
+    """
+    Fit the scaling exponent of every solution and metric, see `fit_power_law`.
+
+    Args:
+        points (dict): The `(size, value)` points per solution, per metric, see `collect_points`.
+        flag_exponent (float): Time exponent above which a solution is flagged, e.g. a quadratic solution.
+
+    Returns
+    -------
+        list[dict]: Per solution, the fit per metric and whether the solution is flagged.
+    """
+    solutions = sorted({solution for metric in points.values() for solution in metric})
+    results = []
+    for solution in solutions:
+        result = {"command": solution}
+        for metric, metric_points in points.items():
+            solution_points = metric_points.get(solution, [])
+            result[metric] = fit_power_law([s for s, _ in solution_points], [v for _, v in solution_points])
+        result["flagged"] = bool(result.get("time")) and result["time"]["exponent"] > flag_exponent
+        results.append(result)
+    return results
+
+
+def create_complexity_table(results):
+    r"""
+    Markdown table with the scaling exponents of the solutions, the slowest scaling first.
+
+    >>> create_complexity_table([{"command": "a", "time": {"exponent": 2.01, "r2": 0.998, "n": 3}, "memory": None,
+    ...     "flagged": True}]).splitlines()[2]
+    ' | `a` ⚠ | 2.01 | 0.998 | 3 |  |  | '
+    """
+    d = " | "
+    header = ["Command", "Time exponent", "Time r²", "Sizes", "Memory exponent", "Memory r²"]
+    output = [d + d.join(header) + d, d + d.join([":---", *["---:" for _ in range(len(header) - 1)]]) + d]
+    ordered = sorted(results, key=lambda r: r["time"]["exponent"] if r.get("time") else -math.inf, reverse=True)
+    for r in ordered:
+        time, memory = r.get("time"), r.get("memory")
+        columns = [
+            f"`{r['command']}`" + (" ⚠" if r["flagged"] else ""),
+            f"{time['exponent']:.2f}" if time else "",
+            f"{time['r2']:.3f}" if time else "",
+            str(time["n"]) if time else "",
+            f"{memory['exponent']:.2f}" if memory else "",
+            f"{memory['r2']:.3f}" if memory else "",
+        ]
+        output.append(d + d.join(columns) + d)
+    return "\n".join(output)
+
+
+def write_complexity(output, data_paths, flag_exponent=1.5):
+    """
+    Estimate the complexity of all solutions from the outputs of the datasets and write `complexity.md` and
+    `complexity.json` to the output folder.
+
+    Returns
+    -------
+        list[dict]: The fits, see `estimate_complexity`, or None if fewer than 2 datasets have a known size.
+    """
+    sizes = data_sizes(data_paths)
+    if len(set(sizes.values())) < 2:
+        logger.info("Fewer than 2 datasets of a known, different size, no complexity estimate")
+        return None
+    results = estimate_complexity(collect_points(output, sizes), flag_exponent=flag_exponent)
+    for r in results:
+        if r["flagged"]:
+            logger.warning(f"'{r['command']}' scales with an exponent of {r['time']['exponent']:.2f} on the data size")
+    (output / "complexity.json").write_text(json.dumps({"sizes": sizes, "results": results}, indent=2))
+    (output / "complexity.md").write_text(create_complexity_table(results))
+    return results
@@ -0,0 +1,250 @@
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+
+from benchie.cache import hash_data, hash_tree
+from benchie.measure import measure
+from benchie.utils import create_command
+
+
+class ContainerRuntime(ABC):
+    """Runtime that starts long-lived containers and runs commands in them."""
+
+    # command to start the Python interpreter of the solutions in a container
+    python: tuple[str, ...] = ("python",)
+
+    @abstractmethod
+    def start(self, image, cpuset, memory):
+        """Start a container pinned to the `cpuset` cores with at most `memory` memory, and return its id."""
+
+    @abstractmethod
+    def mkdir(self, container, path):
+        """Create the folder `path` and its parents in the container."""
+
+    @abstractmethod
+    def remove(self, container, path):
+        """Remove the file or folder `path` in the container, if it exists."""
+
+    @abstractmethod
+    def copy_in(self, container, src, dst):
+        """
+        Copy the host file or folder `src` to the path `dst` in the container, like `docker cp`.
+
+        A folder copied to an existing folder ends up inside it, so remove an earlier copy first.
+        """
+
+    @abstractmethod
+    def run(self, container, command, env=None, workdir=None, timeout=None):
+        """Run a command in the container and return the measured run, see `measure`."""
+
+    @abstractmethod
+    def stop(self, container):
+        """Stop and remove the container."""
+
+    def path(self, container, path):
+        """Path in the container as seen by the commands that run in it."""
+        return path
+
+
+class DockerRuntime(ContainerRuntime):
+    """Containers managed by the docker CLI, with commands started by `docker exec`."""
+
+    python = ("uv", "run", "--frozen", "--no-sync", "python")
+
+    def start(self, image, cpuset, memory):
+        name = f"benchie-{uuid.uuid4().hex[:12]}"
+        command = ["docker", "run", "-d", "--rm", "--name", name, "--cpuset-cpus", cpuset]
+        if memory:
+            # no swap, so a solution can not use more memory than the others by swapping
+            command += ["--memory", memory, "--memory-swap", memory]
+        command += ["--entrypoint", "sleep", image, "infinity"]
+        logger.debug(f"Starting container: {command}")
+        subprocess.run(command, check=True, capture_output=True)  # noqa: S603
+        return name
+
+    def mkdir(self, container, path):
+        subprocess.run(["docker", "exec", container, "mkdir", "-p", str(path)], check=True)  # noqa: S603, S607
+
+    def remove(self, container, path):
+        subprocess.run(["docker", "exec", container, "rm", "-rf", str(path)], check=True)  # noqa: S603, S607
+
+    def copy_in(self, container, src, dst):
+        self.mkdir(container, Path(dst).parent)
+        subprocess.run(["docker", "cp", str(src), f"{container}:{dst}"], check=True, capture_output=True)  # noqa: S603, S607
+
+    def run(self, container, command, env=None, workdir=None, timeout=None):
+        docker_command = ["docker", "exec"]
+        for k, v in (env or {}).items():
+            docker_command += ["-e", f"{k}={v}"]
+        if workdir:
+            docker_command += ["-w", str(workdir)]
+        sample = measure([*docker_command, container, *command], timeout=timeout)
+        if sample["exit_code"] is None:
+            # killing the docker client leaves the command running in the container
+            subprocess.run(["docker", "exec", container, "kill", "-9", "-1"], check=False)  # noqa: S603, S607
+        return sample
+
+    def stop(self, container):
+        subprocess.run(["docker", "rm", "-f", container], check=False, capture_output=True)  # noqa: S603, S607
+
+
+class LocalRuntime(ContainerRuntime):
+    """
+    Fake runtime that runs every container as a folder on the host, to test the pool without a Docker daemon.
+
+    Commands are pinned to the cores of their container, but the memory limit is not enforced.
+    """
+
+    python = (sys.executable,)
+
+    def __init__(self):
+        self.roots = {}
+        self.cpusets = {}
+
+    def start(self, image, cpuset, memory):
+        container = f"local-{uuid.uuid4().hex[:12]}"
+        self.roots[container] = Path(tempfile.mkdtemp(prefix=f"{container}-"))
+        self.cpusets[container] = {int(cpu) for cpu in cpuset.split(",")} if cpuset else None
+        return container
+
+    def mkdir(self, container, path):
+        Path(self.path(container, path)).mkdir(parents=True, exist_ok=True)
+
+    def remove(self, container, path):
+        path = Path(self.path(container, path))
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink(missing_ok=True)
+
+    def copy_in(self, container, src, dst):
+        dst = Path(self.path(container, dst))
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if dst.is_dir():
+            # like `docker cp`, into an existing folder
+            dst = dst / Path(src).name
+        if Path(src).is_dir():
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy(src, dst)
+
+    def run(self, container, command, env=None, workdir=None, timeout=None):
+        cpuset = self.cpusets[container]
+        cwd = self.path(container, workdir) if workdir else self.roots[container]
+        return measure(command, env=env, cwd=cwd, timeout=timeout, cpu=cpuset)
+
+    def stop(self, container):
+        shutil.rmtree(self.roots.pop(container), ignore_errors=True)
+        self.cpusets.pop(container, None)
+
+    def path(self, container, path):
+        return str(self.roots[container] / str(path).lstrip("/"))
+
+
+def split_cores(size, cpus_per_container=1):
+    """
+    Split the available cores in `size` disjoint cpusets, like `0,1` for docker `--cpuset-cpus`.
+
+    If there are not enough cores, the cpusets wrap around and share cores.
+    """
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if len(cores) < size * cpus_per_container:
+        logger.warning(f"Only {len(cores)} core(s) for {size} container(s), containers will share cores")
+    cpusets = []
+    for i in range(size):
+        cpuset = [cores[(i * cpus_per_container + j) % len(cores)] for j in range(cpus_per_container)]
+        cpusets.append(",".join(str(cpu) for cpu in sorted(set(cpuset))))
+    return cpusets
+
+
+class ContainerPool:
+    """
+    Pool of long-lived containers, each pinned to its own cores with a fixed memory limit.
+
+    Solutions and data are copied in once per container, and every run is a `docker exec` in a free container
+    instead of a new `docker run`.
+
+    Use as a context manager, so the containers are stopped afterwards:
+
+        with ContainerPool(DockerRuntime(), "local_combio_project", size=4) as pool:
+            sample = pool.run(solution, testfile, timeout=30)
+    """
+
+    def __init__(self, runtime, image, size, cpus_per_container=1, memory="2g"):
+        self.runtime = runtime
+        self.image = image
+        self.size = size
+        self.cpus_per_container = cpus_per_container
+        self.memory = memory
+        self.containers = []
+        self._free: queue.Queue[str] = queue.Queue()
+        # what has been copied in to each container, by content hash
+        self._copied = {}
+
+    def __enter__(self):
+        for cpuset in split_cores(self.size, self.cpus_per_container):
+            container = self.runtime.start(self.image, cpuset, self.memory)
+            logger.info(f"Started container {container} on cores {cpuset}")
+            self.containers.append(container)
+            self._copied[container] = set()
+            self._free.put(container)
+        return self
+
+    def __exit__(self, *exc):
+        for container in self.containers:
+            self.runtime.stop(container)
+        self.containers = []
+
+    @contextmanager
+    def acquire(self):
+        """Wait for a free container and hold it."""
+        container = self._free.get()
+        try:
+            yield container
+        finally:
+            self._free.put(container)
+
+    def _copy_in(self, container, src, dst, digest):
+        if (dst, digest) not in self._copied[container]:
+            if any(copied == dst for copied, _ in self._copied[container]):
+                # a changed solution, replace its earlier copy
+                self.runtime.remove(container, dst)
+                self._copied[container] = {(copied, d) for copied, d in self._copied[container] if copied != dst}
+            self.runtime.copy_in(container, src, dst)
+            self._copied[container].add((dst, digest))
+
+    def _stage(self, container, solution, testfile):
+        """Copy the solution and the data of the test file in, and return the environment and working directory."""
+        destination = f"/submission/{solution.name}"
+        self._copy_in(container, solution, destination, hash_tree(solution))
+        data_digest = hash_data(testfile)
+        workdir = f"/data/{data_digest[:16]}"
+        if (workdir, data_digest) not in self._copied[container]:
+            self.runtime.mkdir(container, workdir)
+            self._copied[container].add((workdir, data_digest))
+        for path in testfile.parent.glob("*"):
+            if path.is_dir() or path.suffix != ".py":
+                self._copy_in(container, path, f"{workdir}/{path.name}", data_digest)
+        src = f"{destination}/src" if solution.is_dir() else "/submission"
+        env = {"PYTHONPATH": self.runtime.path(container, src)}
+        if "PYTHONHASHSEED" in os.environ:
+            # the hash seed of `benchie.calibration.set_hash_seed`
+            env["PYTHONHASHSEED"] = os.environ["PYTHONHASHSEED"]
+        return env, workdir
+
+    def run(self, solution, testfile, timeout=None):
+        """Run the test file once on a solution in a free container and return the measured run."""
+        with self.acquire() as container:
+            env, workdir = self._stage(container, solution, testfile)
+            command = [*self.runtime.python, "-c", create_command(solution, testfile)]
+            # DANGER: arbitrary code run, only run on valid Dodona code!
+            return self.runtime.run(container, command, env=env, workdir=workdir, timeout=timeout)
@@ -0,0 +1,276 @@
+"""
+Daemon mode of the benchmark loop, triggered by notifications instead of sleeping between polls.
+
+Notifications come from a small local HTTP endpoint, e.g. from a webhook, and from a watch on the solutions
+folder. Notifications that arrive close together are coalesced into one cycle. Polling remains as a fallback,
+with an interval that backs off while nothing changes:
+
+    curl -X POST localhost:8765/notify -d '{"solutions": ["solution_1"]}'
+
+`benchie fetch_subgit` and `benchie fetch_classroom` notify the daemon of the solution folders they synced with
+`--notify http://localhost:8765`.
+"""
+
+import http.client
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from benchie.cache import IGNORED_NAMES
+
+
+class Changes:
+    """Coalesced notifications: the changed solutions, or None for all, and whether to fetch first."""
+
+    def __init__(self):
+        self.solutions = set()
+        self.fetch = False
+
+
+class Trigger:
+    """Notifications of changes, coalesced until no new notification arrived for `debounce` seconds."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = None
+        self._first = self._last = 0.0
+        self.closed = False
+
+    def notify(self, solutions=None, fetch=True):
+        """Notify changed solutions, or None for all solutions, e.g. after a new submission on Dodona."""
+        with self._condition:
+            now = time.monotonic()
+            if self._pending is None:
+                self._pending = Changes()
+                self._first = now
+            if solutions is None or self._pending.solutions is None:
+                self._pending.solutions = None
+            else:
+                self._pending.solutions.update(solutions)
+            self._pending.fetch |= fetch
+            self._last = now
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def wait(self, timeout, debounce=5.0, max_delay=None):
+        """
+        Wait for notifications.
+
+        Args:
+            timeout (float): Maximum time in seconds to wait for a first notification.
+            debounce (float): Time in seconds without new notifications before they are returned.
+            max_delay (float): Maximum time in seconds to coalesce notifications, by default 10 times `debounce`.
+
+        Returns
+        -------
+            Changes: The coalesced notifications, or None after the timeout or when closed.
+        """
+        max_delay = 10 * debounce if max_delay is None else max_delay
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._pending is None and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            while not self.closed:
+                now = time.monotonic()
+                quiet = min(self._last + debounce, self._first + max_delay) - now
+                if quiet <= 0:
+                    break
+                self._condition.wait(quiet)
+            if self.closed:
+                return None
+            changes, self._pending = self._pending, None
+            return changes
+
+
+class Backoff:
+    """
+    Interval of the fallback polling, doubled after every poll without changes, up to a maximum.
+
+    >>> backoff = Backoff(60, 600)
+    >>> backoff.update(False), backoff.update(False), backoff.update(True)
+    (120, 240, 60)
+    """
+
+    def __init__(self, minimum, maximum, factor=2):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.interval = minimum
+
+    def update(self, changed):
+        self.interval = self.minimum if changed else min(self.interval * self.factor, self.maximum)
+        return self.interval
+
+    def reset(self):
+        self.interval = self.minimum
+
+
+class _NotifyHandler(BaseHTTPRequestHandler):
+    server: "NotifyServer"
+
+    def log_message(self, fmt, *args):
+        logger.debug(f"{self.address_string()} {fmt % args}")
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": "not found"})
+        return self._reply(200, {"ok": True})
+
+    def do_POST(self):
+        if self.path != "/notify":
+            return self._reply(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            solutions = body.get("solutions")
+            fetch = body.get("fetch", True)
+        except (ValueError, AttributeError) as e:
+            return self._reply(400, {"error": str(e)})
+        if solutions is not None and not (isinstance(solutions, list) and all(isinstance(s, str) for s in solutions)):
+            return self._reply(400, {"error": "solutions should be a list of names"})
+        if not isinstance(fetch, bool):
+            return self._reply(400, {"error": "fetch should be true or false"})
+        logger.info(f"Notified of changed solutions: {solutions or 'all'}")
+        self.server.trigger.notify(solutions, fetch=fetch)
+        return self._reply(202, {"queued": True})
+
+
+class NotifyServer(ThreadingHTTPServer):
+    """HTTP server of the notifications, which it passes on to its trigger."""
+
+    def __init__(self, address, trigger):
+        super().__init__(address, _NotifyHandler)
+        self.trigger = trigger
+
+
+def start_notify_server(trigger, host="127.0.0.1", port=8765):
+    """
+    Serve `POST /notify` with an optional JSON body `{"solutions": [...], "fetch": true}` in a background thread.
+
+    Returns
+    -------
+        NotifyServer: The server, call `shutdown` to stop it.
+    """
+    server = NotifyServer((host, port), trigger)
+    threading.Thread(target=server.serve_forever, daemon=True, name="benchie-notify").start()
+    logger.info(f"Listening for notifications on http://{host}:{server.server_address[1]}/notify")
+    return server
+
+
+def notify(url, solutions, fetch=False):
+    """
+    Notify a daemon at `url`, e.g. `http://127.0.0.1:8765`, of changed solutions, by name.
+
+    The solutions are already local after a sync, so by default the daemon does not fetch first.
+
+    Returns
+    -------
+        int: The HTTP status of the notification.
+    """
+    parts = urlsplit(url)
+    connection_type = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    connection = connection_type(parts.netloc, timeout=10)
+    body = json.dumps({"solutions": sorted(solutions), "fetch": fetch})
+    try:
+        connection.request("POST", f"{parts.path.rstrip('/')}/notify", body, {"Content-Type": "application/json"})
+        status = connection.getresponse().status
+    finally:
+        connection.close()
+    if status != 202:
+        logger.warning(f"Notifying {url} failed with HTTP status {status}")
+    return status
+
+
+def scan(solutions_path):
+    """Number of files, total size and last modification time of every solution, a file or a folder."""
+    snapshot = {}
+    for path in solutions_path.iterdir():
+        if path.name in IGNORED_NAMES or not (path.is_dir() or path.suffix == ".py"):
+            continue
+        files = [path] if path.is_file() else path.rglob("*")
+        stats = [
+            f.stat()
+            for f in files
+            if f.is_file() and f.suffix != ".pyc" and not IGNORED_NAMES.intersection(f.relative_to(path).parts)
+        ]
+        snapshot[path.stem] = (
+            len(stats),
+            sum(s.st_size for s in stats),
+            max((s.st_mtime_ns for s in stats), default=0),
+        )
+    return snapshot
+
+
+class SolutionsWatcher(threading.Thread):
+    """Watch the solutions folder by scanning it every `interval` seconds and notify the changed solutions."""
+
+    def __init__(self, trigger, solutions_path, interval=1.0):
+        super().__init__(daemon=True, name="benchie-watch")
+        self.trigger = trigger
+        self.solutions_path = solutions_path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        snapshot = scan(self.solutions_path) if self.solutions_path.exists() else {}
+        while not self.stopped.wait(self.interval):
+            if not self.solutions_path.exists():
+                continue
+            new = scan(self.solutions_path)
+            changed = {name for name in new.keys() | snapshot.keys() if new.get(name) != snapshot.get(name)}
+            snapshot = new
+            if changed:
+                logger.info(f"Changed solutions: {sorted(changed)}")
+                # the solutions are already local, no need to fetch
+                self.trigger.notify(changed, fetch=False)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def serve(cycle, trigger, backoff, debounce=5.0):
+    """
+    Run benchmark cycles on notifications, and poll when nothing is notified, until the trigger is closed.
+
+    Args:
+        cycle (Callable): Run a cycle with the changed solutions, or None for all, and whether to fetch first.
+            Returns whether anything changed, so the polling backs off while nothing does.
+        trigger (Trigger): The notifications.
+        backoff (Backoff): Interval of the fallback polling.
+        debounce (float): Time in seconds without new notifications before a cycle starts.
+    """
+    while not trigger.closed:
+        changes = trigger.wait(backoff.interval, debounce)
+        if trigger.closed:
+            break
+        try:
+            if changes is None:
+                logger.info(f"No notifications for {backoff.interval} seconds, polling")
+                changed = cycle(None, True)
+                logger.info(f"Next poll in at most {backoff.update(bool(changed))} seconds")
+            else:
+                cycle(changes.solutions, changes.fetch)
+                backoff.reset()
+        except Exception:
+            # a failed cycle, e.g. when Dodona is unreachable, does not stop the daemon
+            logger.exception("Benchmark cycle failed")
+            backoff.update(False)
@@ -0,0 +1,566 @@
+"""
+Distributed benchmarks: a coordinator shards the solutions x datasets x benchmark options over workers.
+
+The coordinator puts a job for every solution, dataset and benchmark option on a queue in a SQLite database.
+Workers, on other cores or on other nodes with the database, the solutions and the data on a shared file system,
+claim a job, run it with `benchie.benchmark.benchmark` in their own output folder, and store its outputs, tagged with
+the fingerprint of their host. The coordinator then assembles the outputs of all jobs into the usual output folder
+of every dataset and writes the tables:
+
+    benchie coordinator --queue queue.sqlite -e global_alignment -b hyperfine -b memray_tracker
+    benchie worker --queue queue.sqlite  # on every core or node
+
+Every worker claims a core of its node in the database, or takes the cores given with `--cpu`, and pins itself and
+so all the runs of its jobs to them, so the workers on a node never time their solutions on the same core.
+
+A worker renews the lease of its job with a heartbeat while it runs. The coordinator puts the jobs without a
+heartbeat for longer than the lease, e.g. of a crashed worker, back on the queue, and only the worker that holds a
+job can complete it.
+
+Racing compares all solutions with each other, so it can not be sharded and is skipped.
+"""
+
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+
+from benchie.benchmark import TIMING_OUTPUTS, BenchmarkOption, benchmark
+from benchie.complexity import write_complexity
+from benchie.history import host_fingerprint
+from benchie.leaderboard import write_leaderboard
+from benchie.reporting import postprocess_output
+from benchie.runtime import available_cores, hyperfine_markdown
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    fingerprint TEXT PRIMARY KEY,
+    info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    batch INTEGER NOT NULL,
+    solution TEXT NOT NULL,
+    testfile TEXT NOT NULL,
+    options TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    host TEXT REFERENCES hosts (fingerprint),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed REAL,
+    heartbeat REAL,
+    finished REAL,
+    files TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS cores (
+    node TEXT NOT NULL,
+    core INTEGER NOT NULL,
+    worker TEXT NOT NULL,
+    PRIMARY KEY (node, core)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch, status);
+"""
+
+# options that run a solution on its own, one job each, in the order their outputs take precedence
+ENGINE_OPTIONS = [
+    BenchmarkOption.HYPERFINE.value,
+    BenchmarkOption.FORKSERVER.value,
+    BenchmarkOption.ADAPTIVE.value,
+    BenchmarkOption.MEMRAY_TRACKER.value,
+    BenchmarkOption.MEMRAY_IMPORTS.value,
+    BenchmarkOption.SCALENE.value,
+]
+# options that change how every job runs
+MODIFIER_OPTIONS = [BenchmarkOption.RSS.value, BenchmarkOption.RESOURCES.value, BenchmarkOption.INTERFERENCE.value]
+# suffixes of the outputs of a job that are sent back to the coordinator
+OUTPUT_SUFFIXES = {".json", ".txt"}
+
+
+def expand_jobs(solutions, testfiles, benchmark_options):
+    """
+    The matrix of solutions, datasets and engine options, as jobs with the options to run.
+
+    Without engine options, every solution only runs the pretest on every dataset.
+
+    >>> [options for *_, options in expand_jobs(["a"], ["data_01.py"], ["hyperfine", "rss", "memray_tracker"])]
+    [['hyperfine', 'rss'], ['memray_tracker', 'rss']]
+    """
+    if BenchmarkOption.RACING.value in benchmark_options:
+        logger.warning("Racing compares all solutions with each other, it can not be distributed, skipping.")
+    engines = [option for option in ENGINE_OPTIONS if option in benchmark_options]
+    modifiers = [option for option in MODIFIER_OPTIONS if option in benchmark_options]
+    job_options = [[engine, *modifiers] for engine in engines] or [modifiers]
+    return [
+        (solution, testfile, list(options))
+        for testfile in testfiles
+        for solution in solutions
+        for options in job_options
+    ]
+
+
+class JobQueue:
+    """
+    Queue of benchmark jobs in a SQLite database, shared by the coordinator and the workers.
+
+    Args:
+        path (str): Path to the database, created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # transactions are explicit, see `_transaction`, and workers wait for each other's claims
+        self.connection = sqlite3.connect(self.path, isolation_level=None, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def _transaction(self):
+        # take the write lock at the start, so two workers never claim the same job
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def submit(self, jobs, settings):
+        """
+        Put jobs on the queue as a new batch.
+
+        Args:
+            jobs (list[tuple]): The solution, the test file and the options of every job, see `expand_jobs`.
+            settings (dict): Keyword arguments of `benchie.benchmark.benchmark` for every job, e.g. the timeout.
+
+        Returns
+        -------
+            int: The id of the batch.
+        """
+        with self._transaction():
+            batch = self.connection.execute("SELECT COALESCE(MAX(batch), 0) + 1 FROM jobs").fetchone()[0]
+            self.connection.executemany(
+                "INSERT INTO jobs (batch, solution, testfile, options, settings) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        batch,
+                        str(Path(solution).resolve()),
+                        str(Path(testfile).resolve()),
+                        json.dumps(options),
+                        json.dumps(settings),
+                    )
+                    for solution, testfile, options in jobs
+                ],
+            )
+        logger.info(f"Submitted batch {batch} with {len(jobs)} job(s)")
+        return batch
+
+    def claim(self, worker, host):
+        """Claim the oldest pending job, or None when no job is pending."""
+        with self._transaction():
+            row = self.connection.execute(
+                "SELECT id, solution, testfile, options, settings FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self.connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, host = ?, claimed = ?, heartbeat = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker, host, now, now, row[0]),
+            )
+        job_id, solution, testfile, options, settings = row
+        return {
+            "id": job_id,
+            "solution": Path(solution),
+            "testfile": Path(testfile),
+            "options": json.loads(options),
+            "settings": json.loads(settings),
+        }
+
+    def register_host(self, fingerprint, info):
+        with self._transaction():
+            self.connection.execute(
+                "INSERT OR IGNORE INTO hosts (fingerprint, info) VALUES (?, ?)", (fingerprint, json.dumps(info))
+            )
+
+    def claim_core(self, node, worker, candidates):
+        """
+        Claim the first of the `candidates` cores of a node that no other worker on it holds, or None if all are held.
+
+        The cores of workers that no longer run, e.g. that crashed, are released first. Worker names are
+        `<node>:<pid>`, see `run_worker`.
+        """
+        with self._transaction():
+            held = dict(self.connection.execute("SELECT core, worker FROM cores WHERE node = ?", (node,)).fetchall())
+            for core, holder in list(held.items()):
+                if holder != worker and not _is_running(int(holder.rpartition(":")[2])):
+                    self.connection.execute("DELETE FROM cores WHERE node = ? AND core = ?", (node, core))
+                    held.pop(core)
+            core = next((core for core in candidates if held.get(core, worker) == worker), None)
+            if core is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO cores (node, core, worker) VALUES (?, ?, ?)", (node, core, worker)
+                )
+        return core
+
+    def release_cores(self, node, worker):
+        with self._transaction():
+            self.connection.execute("DELETE FROM cores WHERE node = ? AND worker = ?", (node, worker))
+
+    def _update_running(self, job_id, worker, assignments, parameters):
+        # only the worker that holds a job may update it, not a worker whose job was requeued in the meantime
+        with self._transaction():
+            cursor = self.connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND worker = ? AND status = 'running'",  # noqa: S608
+                (*parameters, job_id, worker),
+            )
+        if not cursor.rowcount:
+            logger.warning(f"Job {job_id} is no longer held by {worker}, it was requeued")
+        return cursor.rowcount == 1
+
+    def renew(self, job_id, worker):
+        """Renew the lease of a running job, returns whether the worker still holds it."""
+        return self._update_running(job_id, worker, "heartbeat = ?", (time.time(),))
+
+    def complete(self, job_id, worker, files):
+        """Store the outputs of a job, by their path relative to its output folder, returns whether it was stored."""
+        return self._update_running(
+            job_id, worker, "status = 'done', finished = ?, files = ?", (time.time(), json.dumps(files))
+        )
+
+    def fail(self, job_id, worker, error, max_attempts=2):
+        """Put a failed job back on the queue, or mark it as failed after `max_attempts` attempts."""
+        return self._update_running(
+            job_id,
+            worker,
+            "status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, error = ?, finished = ?",
+            (max_attempts, error, time.time()),
+        )
+
+    def requeue_stale(self, lease):
+        """Put the running jobs without a heartbeat for longer than `lease` seconds, e.g. of a crashed worker, back."""
+        with self._transaction():
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'pending', worker = NULL WHERE status = 'running' AND heartbeat < ?",
+                (time.time() - lease,),
+            )
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} stale job(s)")
+        return cursor.rowcount
+
+    def counts(self, batch):
+        """Number of jobs of a batch by status."""
+        rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status", (batch,))
+        return dict(rows.fetchall())
+
+    def results(self, batch):
+        """The finished jobs of a batch, with their outputs and host."""
+        rows = self.connection.execute(
+            "SELECT solution, testfile, options, status, host, files FROM jobs WHERE batch = ? ORDER BY id", (batch,)
+        )
+        return [
+            {
+                "solution": Path(solution),
+                "testfile": Path(testfile),
+                "options": json.loads(options),
+                "status": status,
+                "host": host,
+                "files": json.loads(files) if files else {},
+            }
+            for solution, testfile, options, status, host, files in rows.fetchall()
+        ]
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # a process of another user
+        return True
+    return True
+
+
+def collect_outputs(output):
+    """The text outputs of a job, by their path relative to its output folder, e.g. `scalene/a_scalene.json`."""
+    files = {}
+    for path in [*output.glob("*"), *output.glob("scalene/*")]:
+        if path.is_file() and path.suffix in OUTPUT_SUFFIXES:
+            files[path.relative_to(output).as_posix()] = path.read_text(encoding="utf8")
+    return files
+
+
+class Heartbeat(threading.Thread):
+    """Renew the lease of a running job every `interval` seconds, until stopped or the lease is lost."""
+
+    def __init__(self, queue_path, job_id, worker, interval=60.0):
+        super().__init__(daemon=True, name="benchie-heartbeat")
+        self.queue_path = queue_path
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        # a SQLite connection can not be shared between threads
+        with JobQueue(self.queue_path) as queue:
+            while not self.stopped.wait(self.interval) and queue.renew(self.job_id, self.worker):
+                pass
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job, workdir):
+    """Run a job in its own output folder and return its outputs."""
+    output = Path(workdir) / f"job_{job['id']}"
+    try:
+        benchmark(
+            job["testfile"],
+            output=output,
+            solutions=[job["solution"]],
+            benchmark_options=job["options"],
+            **{"timeout": 30, "disable_pretest": False, **job["settings"]},
+        )
+        return collect_outputs(output)
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+
+def pin_worker(queue, node, worker, cores=None):
+    """
+    Pin the worker, and so every run of its jobs, to the given `cores` or to a free core of its node.
+
+    Returns
+    -------
+        set[int]: The cores of the worker, or None if they could not be claimed.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("CPU affinity is not supported, the workers on this node may share cores")
+        return set()
+    # leave the first core free for the OS, like `available_cores`
+    candidates = list(cores or available_cores(max(len(os.sched_getaffinity(0)) - 1, 1)))
+    claimed = set()
+    for core in candidates:
+        if queue.claim_core(node, worker, [core]) is None:
+            if cores:
+                logger.warning(f"Core {core} of {node} is already held by another worker")
+            continue
+        claimed.add(core)
+        if not cores:
+            break
+    if not claimed:
+        return None
+    # the threads and processes that the worker starts from now on inherit its affinity
+    os.sched_setaffinity(0, claimed)
+    logger.info(f"Worker {worker} runs on core(s) {sorted(claimed)}")
+    return claimed
+
+
+def run_worker(queue_path, workdir=None, wait=False, poll=1.0, heartbeat=60.0, cores=None):
+    """
+    Claim and run jobs until the queue is empty, or forever with `wait`.
+
+    Args:
+        queue_path (str): Path to the queue database.
+        workdir (str): Folder for the outputs of the jobs, a temporary folder by default.
+        wait (bool): Keep waiting for new jobs when the queue is empty.
+        poll (float): Interval in seconds to check for new jobs with `wait`.
+        heartbeat (float): Interval in seconds to renew the lease of a running job, shorter than the lease of the
+            coordinator.
+        cores (list[int]): Cores to run the jobs on, a free core of the node claimed in the queue by default.
+
+    Returns
+    -------
+        int: The number of jobs this worker ran.
+    """
+    fingerprint, info = host_fingerprint()
+    node = platform.node()
+    worker = f"{node}:{os.getpid()}"
+    ran = 0
+    with JobQueue(queue_path) as queue, tempfile.TemporaryDirectory(dir=workdir) as jobs_dir:
+        queue.register_host(fingerprint, info)
+        if pin_worker(queue, node, worker, cores) is None:
+            logger.error(f"All cores of {node} are held by other workers, start fewer workers or give them --cpu")
+            return ran
+        try:
+            ran = _run_jobs(queue, worker, fingerprint, jobs_dir, wait, poll, heartbeat)
+        finally:
+            queue.release_cores(node, worker)
+    logger.info(f"Worker {worker} ran {ran} job(s)")
+    return ran
+
+
+def _run_jobs(queue, worker, fingerprint, jobs_dir, wait, poll, heartbeat):
+    ran = 0
+    while True:
+        job = queue.claim(worker, fingerprint)
+        if job is None:
+            if not wait:
+                break
+            time.sleep(poll)
+            continue
+        logger.info(f"Worker {worker} runs '{job['solution'].stem}' on {job['testfile'].stem}: {job['options']}")
+        beat = Heartbeat(queue.path, job["id"], worker, heartbeat)
+        beat.start()
+        try:
+            files = run_job(job, jobs_dir)
+        except Exception as e:
+            logger.exception(f"Job {job['id']} failed")
+            queue.fail(job["id"], worker, repr(e))
+        else:
+            queue.complete(job["id"], worker, files)
+        finally:
+            beat.stop()
+        ran += 1
+    return ran
+
+
+def _merge_results(merged, name, content, host):
+    """Merge the `results` of a JSON output of a dataset, the first result of every command wins."""
+    results = json.loads(content).get("results")
+    if not isinstance(results, list):
+        return False
+    for result in results:
+        merged.setdefault(name, {}).setdefault(result["command"], {**result, "host": host})
+    return True
+
+
+def assemble(results, output, testfiles, solutions):
+    """
+    Write the outputs of the jobs to the output folder of every dataset, as if it ran on a single host.
+
+    The results of the timing and resource outputs are merged and tagged with the host that ran them. The per
+    solution outputs, like the memray peaks, are copied. Solutions without results on a dataset count as failed.
+    """
+    names = [Path(solution).stem for solution in solutions]
+    order = {name: i for i, name in enumerate(names)}
+    # the outputs of the first engine take precedence, e.g. the resources of the hyperfine runs over the pretest
+    priority = {option: i for i, option in enumerate(ENGINE_OPTIONS)}
+    results = sorted(
+        results, key=lambda r: priority.get(r["options"][0], len(priority)) if r["options"] else len(priority)
+    )
+    for testfile in testfiles:
+        name = Path(testfile).stem
+        output_data = Path(output) / name
+        if output_data.exists():
+            shutil.rmtree(output_data)
+        output_data.mkdir(parents=True)
+        merged: dict[str, dict[str, dict]] = {}
+        status = dict.fromkeys(names, "failed")
+        for result in results:
+            if result["testfile"].stem != name or result["status"] != "done":
+                continue
+            for file_name, content in result["files"].items():
+                if file_name == f"{name}_status.json":
+                    job_status = json.loads(content)
+                    status.update({k: v for k, v in job_status.items() if status.get(k) != "ok"})
+                elif not (
+                    file_name.startswith(f"{name}_")
+                    and file_name.endswith(".json")
+                    and _merge_results(merged, file_name, content, result["host"])
+                ):
+                    # the outputs of a single solution, e.g. its memray peak
+                    (output_data / file_name).parent.mkdir(exist_ok=True)
+                    (output_data / file_name).write_text(content, encoding="utf8")
+        for file_name, by_command in merged.items():
+            ordered = sorted(by_command.values(), key=lambda c: order.get(c["command"], len(order)))
+            (output_data / file_name).write_text(json.dumps({"results": ordered}, indent=2), encoding="utf8")
+            if file_name == TIMING_OUTPUTS[BenchmarkOption.HYPERFINE.value].format(name):
+                (output_data / f"{name}_benchmark.md").write_text(hyperfine_markdown(ordered), encoding="utf8")
+        (output_data / f"{name}_status.json").write_text(json.dumps(status, indent=2), encoding="utf8")
+        postprocess_output(Path(testfile), output_data)
+    write_complexity(Path(output), [Path(testfile) for testfile in testfiles])
+    write_leaderboard(Path(output), [Path(testfile) for testfile in testfiles], names)
+
+
+def coordinate(
+    queue_path, output, testfiles, solutions, benchmark_options, settings=None, poll=1.0, lease=300, timeout=None
+):
+    """
+    Submit the jobs of all solutions and datasets, wait for the workers to run them and assemble their outputs.
+
+    Args:
+        queue_path (str): Path to the queue database.
+        output (Path): Output folder of the exercise, with an output folder per dataset.
+        testfiles (list[Path]): The test files of the datasets.
+        solutions (list[Path]): The solutions.
+        benchmark_options (list[str]): The benchmark options, see `BenchmarkOption`.
+        settings (dict): Keyword arguments of `benchie.benchmark.benchmark` for every job, e.g. the timeout.
+        poll (float): Interval in seconds to check the progress of the workers.
+        lease (float): Time in seconds without a heartbeat after which a running job is assumed lost and put back
+            on the queue, longer than the heartbeat interval of the workers.
+        timeout (float): Maximum time in seconds to wait for the workers, or None to wait until all jobs finished.
+
+    Returns
+    -------
+        dict: The number of jobs by status.
+    """
+    with JobQueue(queue_path) as queue:
+        batch = queue.submit(expand_jobs(solutions, testfiles, benchmark_options), settings or {})
+        start = time.monotonic()
+        while True:
+            counts = queue.counts(batch)
+            if not counts.get("pending") and not counts.get("running"):
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                logger.warning(f"Stopped waiting for the workers after {timeout} seconds: {counts}")
+                break
+            queue.requeue_stale(lease)
+            time.sleep(poll)
+        logger.info(f"Batch {batch} finished: {counts}")
+        assemble(queue.results(batch), output, testfiles, solutions)
+    return counts
+
+
+def main(
+    output,
+    data,
+    solutions,
+    exercise_name,
+    queue,
+    benchmark_options,
+    timeout,
+    disable_pretest,
+    subset=None,
+    subset_data=None,
+    *args,
+    **kwargs,
+):
+    """Coordinate a distributed benchmark of all solutions of an exercise on all its datasets, like `benchie.main`."""
+    data = Path(data).resolve() / exercise_name
+    output = Path(output).resolve() / exercise_name
+    output.mkdir(exist_ok=True, parents=True)
+    solutions_path = Path(solutions).resolve() / exercise_name
+    all_solutions = [
+        p for p in solutions_path.iterdir() if (p.is_dir() and p.name != "__pycache__") or p.suffix == ".py"
+    ][:subset]
+    testfiles = sorted(data.glob("data_*.py"))[:subset_data] + sorted(data.glob("*.sh"))
+    if not all_solutions or not testfiles:
+        logger.info("No solutions or no data to process")
+        return None
+    settings = {"timeout": timeout, "disable_pretest": disable_pretest, **kwargs}
+    return coordinate(queue, output, testfiles, all_solutions, list(benchmark_options), settings=settings)
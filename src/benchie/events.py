@@ -0,0 +1,183 @@
+"""
+Progress events and metrics of a benchmark, for monitoring the benchmark loop.
+
+The global `events` stream is disabled until it is configured, like in `benchie.main`:
+
+    events.configure(events_path="events.jsonl", metrics_path="/var/lib/node_exporter/benchie.prom")
+    with events.stage("fetch", exercise="global_alignment"):
+        ...
+    events.run("pretest", "solution_1", "data_01", outcome(exit_code), duration=wall)
+
+Every event is appended as a JSON line to `events_path`. The counters, the histogram of the stage durations and the
+time of the last successful cycle are written to `metrics_path` in the Prometheus text format, for the textfile
+collector of the node exporter.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# upper bounds in seconds of the buckets of the stage duration histogram
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+
+def outcome(exit_code):
+    """
+    Outcome of a run with an exit code, which is None after a timeout.
+
+    >>> outcome(0), outcome(1), outcome(None)
+    ('ok', 'failed', 'timeout')
+    """
+    if exit_code is None:
+        return "timeout"
+    return "ok" if exit_code == 0 else "failed"
+
+
+def _labels(labels):
+    """
+    Prometheus labels, with escaped values.
+
+    >>> _labels({"stage": 'a"b'})
+    '{stage="a\\\\"b"}'
+    """
+    if not labels:
+        return ""
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(escaped.items())) + "}"
+
+
+class EventStream:
+    """JSON lines event stream and Prometheus metrics, see the module documentation."""
+
+    def __init__(self):
+        self.events_path = None
+        self.metrics_path = None
+        # runs from parallel jobs report at the same time
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def configure(self, events_path=None, metrics_path=None):
+        self.events_path = Path(events_path) if events_path else None
+        self.metrics_path = Path(metrics_path) if metrics_path else None
+        for path in (self.events_path, self.metrics_path):
+            if path:
+                path.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.events_path or self.metrics_path)
+
+    def emit(self, event, **fields):
+        """Append an event to the stream."""
+        if not self.events_path:
+            return
+        line = json.dumps({"time": time.time(), "event": event, **fields}, default=str)
+        with self._lock, open(self.events_path, "a", encoding="utf8") as fh:
+            fh.write(line + "\n")
+
+    @contextmanager
+    def stage(self, stage, **fields):
+        """Emit the start and the finish of a stage, with its duration and outcome, e.g. `error` on an exception."""
+        self.emit("stage_start", stage=stage, **fields)
+        start = time.perf_counter()
+        result = "ok"
+        try:
+            yield
+        except BaseException:
+            result = "error"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.emit("stage_finish", stage=stage, duration=duration, outcome=result, **fields)
+            if self.enabled:
+                with self._lock:
+                    self._observe("benchie_stage_duration_seconds", {"stage": stage}, duration)
+                    self._inc("benchie_stages_total", {"stage": stage, "outcome": result})
+                self.write_metrics()
+
+    def run(self, engine, solution, dataset, result, duration=None, count=1):
+        """Count `count` runs of a solution on a dataset with an outcome, see `outcome`."""
+        self.emit(
+            "run", engine=engine, solution=solution, dataset=dataset, outcome=result, duration=duration, count=count
+        )
+        if not self.enabled:
+            return
+        with self._lock:
+            self._inc("benchie_runs_total", {"engine": engine, "outcome": result}, count)
+            if result == "timeout":
+                self._inc("benchie_timeouts_total", {"engine": engine}, count)
+            elif result == "failed":
+                self._inc("benchie_failures_total", {"engine": engine}, count)
+        self.write_metrics()
+
+    def queue(self, stage, depth):
+        """Number of items, e.g. solutions or datasets, that still have to run in a stage."""
+        self.emit("queue", stage=stage, depth=depth)
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[("benchie_queue_depth", _labels({"stage": stage}))] = depth
+        self.write_metrics()
+
+    def cycle_succeeded(self, **fields):
+        """Mark the end of a successful cycle of the benchmark loop."""
+        now = time.time()
+        self.emit("cycle_succeeded", **fields)
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[("benchie_last_successful_cycle_timestamp_seconds", "")] = now
+            self._inc("benchie_cycles_total", {})
+        self.write_metrics()
+
+    def _inc(self, name, labels, value=1):
+        key = (name, _labels(labels))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.setdefault(key, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    def metrics(self):
+        """The metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines.extend(
+                        f"{name}{labels} {value}" for (n, labels), value in sorted(values.items()) if n == name
+                    )
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), histogram in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    labels = dict(labels)
+                    for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {count}")
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {histogram['count']}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        """Write the metrics file, atomically, so the collector never reads a half-written file."""
+        if not self.metrics_path:
+            return
+        tmp = self.metrics_path.with_name(f".{self.metrics_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(self.metrics(), encoding="utf8")
+        tmp.replace(self.metrics_path)
+
+
+events = EventStream()
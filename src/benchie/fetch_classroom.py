@@ -3,8 +3,10 @@ from pathlib import Path
 
 from loguru import logger
 
+from benchie.git_sync import sync
 
-def main(solutions, task_id, force, subset):
+
+def main(solutions, task_id, force, subset, jobs=8):
     solutions = Path(solutions).resolve()
     solutions.mkdir(parents=True, exist_ok=True)
 
@@ -28,38 +30,5 @@ def main(solutions, task_id, force, subset):
     # the repo url is the last element, first is the id
     output = {x[0]: x[-1] for x in output}
     logger.info(output)
-    for k, v in output.items():
-        folder_name = "solution_" + k
-        path = Path(solutions / folder_name).resolve()
-        if not force and path.exists():
-            logger.info(f"Updating {k}")
-            subprocess.run(["git", "checkout", "main"], cwd=solutions / folder_name)
-            subprocess.run(
-                [
-                    "git",
-                    "pull",
-                ],
-                cwd=solutions / folder_name,
-            )
-        else:
-            # remove dir if it exists
-            if path.exists():
-                output = subprocess.run(
-                    [
-                        "rm",
-                        "-rf",
-                        folder_name,
-                    ],
-                    cwd=solutions,
-                )
-            logger.info(f"Cloning {k}")
-            output = subprocess.run(
-                [
-                    "git",
-                    "clone",
-                    "--depth=1",
-                    v,
-                    folder_name,
-                ],
-                cwd=solutions,
-            )
+    # only the repositories whose remote head moved are fetched
+    return sync(output, solutions, branch="main", force=force, jobs=jobs)
@@ -1,9 +1,14 @@
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import requests
 from loguru import logger
 
+# name of the file in the solutions folder to keep the responses and their validators in between fetches
+CACHE_NAME = "dodona_cache.json"
+
 
 def refresh(course_id, exercise_id, solutions, token) -> bool:
     logger.info("Refreshing submissions")
@@ -19,106 +24,244 @@ def refresh(course_id, exercise_id, solutions, token) -> bool:
     #     # token location
     #     token,
     # ])
-    returncode = main(solutions, course_id=course_id, exercise_id=exercise_id, token=token)
+    try:
+        returncode = main(solutions, course_id=course_id, exercise_id=exercise_id, token=token)
+    except requests.RequestException as e:
+        # e.g. Dodona is down or stalls, try again in the next cycle
+        logger.error(f"Fetching the submissions failed: {e!r}")
+        return False
     # 0 means new data has been copied, so a real refresh
     return returncode == 0
 
 
-def get(url, token="token"):
-    token = Path(token)
-    token = token.read_text()
-    headers = {"Accept": "application/json", "Authorization": token}
-    logger.debug(url)
-    resp = requests.get(url, headers=headers)
-    return resp.json()
+class Dodona:
+    """
+    Client of the Dodona API with a single pooled session for concurrent requests.
+
+    The token is read once. Every response is cached by URL with its `ETag` and `Last-Modified` validators, so a
+    request in a later fetch is conditional and an unchanged resource is not sent again. A URL is requested at
+    most once per client.
+
+    Args:
+        token (str): Path to the file with the Dodona token.
+        base (str): Base URL of the API.
+        jobs (int): Maximum number of concurrent requests.
+        cache_path (Path): JSON file to keep the cache in between fetches, or None to only cache in memory.
+        timeout (float): Timeout in seconds to connect and between the bytes of a response, so a stalled request
+            raises `requests.Timeout` instead of hanging the fetch.
+    """
+
+    def __init__(self, token="token", base="https://dodona.be/", jobs=8, cache_path=None, timeout=30):  # noqa: S107
+        self.base = base
+        self.jobs = jobs
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Accept": "application/json", "Authorization": Path(token).read_text().strip()})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=jobs)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.cache = {}
+        if self.cache_path and self.cache_path.exists():
+            with self.cache_path.open("r", encoding="UTF-8") as fh:
+                self.cache = json.load(fh)
+        # responses of this client, not requested again
+        self._fetched = {}
+        self._lock = threading.Lock()
+        # number of requests answered with 304 Not Modified
+        self.not_modified = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
+    def close(self):
+        self.session.close()
+        if self.cache_path:
+            with self.cache_path.open("w", encoding="UTF-8") as fh:
+                json.dump(self.cache, fh)
 
-def query(path, base="https://dodona.be/"):
-    return get(base + path)
+    def get(self, url):
+        with self._lock:
+            if url in self._fetched:
+                return self._fetched[url]
+            cached = self.cache.get(url)
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        logger.debug(url)
+        resp = self.session.get(url, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304 and cached:
+            with self._lock:
+                self.not_modified += 1
+                self._fetched[url] = cached["body"]
+            return cached["body"]
+        resp.raise_for_status()
+        body = resp.json()
+        with self._lock:
+            self._fetched[url] = body
+            if "ETag" in resp.headers or "Last-Modified" in resp.headers:
+                self.cache[url] = {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "body": body,
+                }
+        return body
 
+    def query(self, path):
+        return self.get(self.base + path)
 
-def fetch_correct(course, exercise, page):
-    return query(
+    def map(self, fn, items):
+        """Apply `fn` to every item with at most `jobs` concurrent requests, in order."""
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            return list(executor.map(fn, items))
+
+
+def fetch_correct(client, course, exercise, page):
+    return client.query(
         f"courses/{course}/activities/{exercise}/submissions/?most_recent_per_user=true&status=correct&page={page}"
     )
 
 
-def write_submissions(fetched, solutions_path):
-    for k, v in fetched.items():
-        submission = get(v["url"])
-        name = f"solution_{k}.py"
-        path = solutions_path / name
-        # print(submission.code)
-        path.write_text(submission["code"])
+def fetch_all_correct(client, course, exercise, max_pages=10):
+    """Fetch the pages of correct submissions, `jobs` pages at a time, up to the first empty page."""
+    submissions = []
+    for start in range(0, max_pages, client.jobs):
+        pages = range(start, min(start + client.jobs, max_pages))
+        logger.info(f"Pages {pages.start}-{pages.stop - 1}")
+        for fetched in client.map(lambda page: fetch_correct(client, course, exercise, page), pages):
+            if not fetched:
+                return submissions
+            # copies, the cached pages are not extended in place
+            submissions.extend(dict(s) for s in fetched)
+    return submissions
+
+
+def write_if_changed(path, text):
+    """Write a file only if its content changed, so unchanged files keep their modification time."""
+    if path.exists() and path.read_text(encoding="UTF-8") == text:
+        return False
+    path.write_text(text, encoding="UTF-8")
+    return True
+
+
+def write_submissions(client, fetched, solutions_path):
+    """
+    Write the code of the submissions and remove the solutions that are no longer fetched.
+
+    Returns
+    -------
+        int: The number of written or removed files.
+    """
+    names = [f"solution_{k}.py" for k in fetched]
+    submissions = client.map(lambda v: client.get(v["url"]), fetched.values())
+    changed = sum(write_if_changed(solutions_path / n, s["code"]) for n, s in zip(names, submissions))
+    for s in solutions_path.glob("solution_*.py"):
+        if s.name not in names:
+            s.unlink()
+            changed += 1
+    return changed
 
 
-def reduced_result(url):
-    o = get(url)
+def _user_id(user):
+    """
+    Id of the Dodona user of a submission, from the user or the URL of the user.
+
+    >>> _user_id({"id": 7, "name": "a"}), _user_id("https://dodona.be/nl/users/7.json"), _user_id({"name": "a"})
+    ('7', '7', None)
+    """
+    if isinstance(user, dict):
+        return str(user["id"]) if "id" in user else None
+    return str(user).rstrip("/").rpartition("/")[2].removesuffix(".json") if user else None
+
+
+def student_ids(solutions_path):
+    """
+    The Dodona user of every fetched solution, by solution name.
+
+    A new submission of a student replaces their solution with a file named after the new submission, the user
+    stays the same.
+
+    Returns
+    -------
+        dict[str, str]: The user as `user_<id>` by solution name, empty if the solutions were not fetched from Dodona.
+    """
+    students_path = Path(solutions_path) / "students.json"
+    if not students_path.exists():
+        return {}
+    with students_path.open("r", encoding="UTF-8") as fh:
+        students = json.load(fh)
+    users = {submission_id: _user_id(submission.get("user")) for submission_id, submission in students.items()}
+    return {f"solution_{submission_id}": f"user_{user}" for submission_id, user in users.items() if user is not None}
+
+
+def reduced_result(client, url):
+    o = client.get(url)
     result = json.loads(o["result"])
     try:
         reduced_result = result["groups"][-1]
         del result["groups"]
         result["groups"] = reduced_result
     except KeyError:
-        logger.info("Fail for {url}")
+        logger.info(f"Fail for {url}")
     return result
 
 
-def main(solutions, course_id, exercise_id, max_pages=10, force=False, *args, **kwargs):
+def main(
+    solutions,
+    course_id,
+    exercise_id,
+    max_pages=10,
+    force=False,
+    token="token",
+    jobs=8,
+    base="https://dodona.be/",
+    timeout=30,
+    *args,
+    **kwargs,
+):
     logger.info("Start fetching...")
     solutions = Path(solutions).resolve()
     solutions.mkdir(exist_ok=True)
-    new_fetch = []
-    fetched = {}
-    users = set()
-    page = 0
-    # loop over all solutions through pagination
-    while page == 0 or (len(new_fetch) > 0 and page < max_pages):
-        logger.info(f"Page {page}")
-        new_fetch = fetch_correct(course_id, exercise_id, page)
-        # add new submissions to the set of submissions with user id as key
-        for s in new_fetch:
-            user_id = str(s["id"])
-            users.add(user_id)
-            fetched[user_id] = s
-        page += 1
-    logger.debug(new_fetch)
-    logger.debug(fetched)
-
-    # load old submissions
-    students_path = solutions / "students.json"
-    if students_path.exists():
-        with students_path.open("r", encoding="UTF-8") as fh:
-            old_students = json.load(fh)
-        old_set = set(old_students.keys())
-    else:
-        old_set = set()
-
-    # set of new submissions
-    new_set = set(fetched.keys())
-
-    # difference between old and new submissions
-    diff = new_set - old_set
-    if diff or force:
-        logger.info(f"{len(diff)} new submission(s) detected!")
-
-        if solutions.exists():
-            # remove all solutions, but not the previous .json file
-            for s in solutions.glob("solution_*.py"):
-                s.unlink()
-
-        # extend all fetched submissions with more information
-        for v in fetched.values():
-            user = get(v["user"])
-            # edit in place
-            v["user"] = user
-            v["result"] = reduced_result(v["url"])
-
-        # update the students.json file with new submissions
-        with students_path.open("w", encoding="UTF-8") as fh:
-            json.dump(fetched, fh, indent=4)
-        write_submissions(fetched, solutions)
-        return 0
-    else:
-        logger.info("No new submissions detected")
-        return 1
+    with Dodona(token, base=base, jobs=jobs, cache_path=solutions / CACHE_NAME, timeout=timeout) as client:
+        # add the submissions to the set of submissions with user id as key
+        fetched = {str(s["id"]): s for s in fetch_all_correct(client, course_id, exercise_id, max_pages)}
+        logger.debug(fetched)
+
+        # load old submissions
+        students_path = solutions / "students.json"
+        if students_path.exists():
+            with students_path.open("r", encoding="UTF-8") as fh:
+                old_students = json.load(fh)
+            old_set = set(old_students.keys())
+        else:
+            old_set = set()
+
+        # set of new submissions
+        new_set = set(fetched.keys())
+
+        # difference between old and new submissions
+        diff = new_set - old_set
+        if diff or force:
+            logger.info(f"{len(diff)} new submission(s) detected!")
+
+            # extend all fetched submissions with more information, the result and the code share their url
+            def extend(v):
+                # edit in place
+                v["user"] = client.get(v["user"])
+                v["result"] = reduced_result(client, v["url"])
+
+            client.map(extend, fetched.values())
+
+            # update the students.json file with new submissions
+            write_if_changed(students_path, json.dumps(fetched, indent=4))
+            changed = write_submissions(client, fetched, solutions)
+            logger.info(f"{changed} solution(s) changed, {client.not_modified} request(s) not modified")
+            return 0
+        else:
+            logger.info("No new submissions detected")
+            return 1
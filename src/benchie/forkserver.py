@@ -0,0 +1,190 @@
+"""
+Time the test file call of a solution in forked children of a warm interpreter.
+
+The server imports the solution once and forks a fresh child for every repetition, so only the call itself is
+timed and not the interpreter startup or the imports. This file only uses the standard library, so it can run
+as a script with the interpreter and PYTHONPATH of the solution.
+"""
+
+import argparse
+import json
+import os
+import signal
+import statistics
+import struct
+import subprocess
+import sys
+import time
+import traceback
+from pathlib import Path
+
+
+def _wait(pid, timeout):
+    """
+    Wait for a child, kill it after `timeout` seconds. Returns the wait status and resource usage.
+
+    The server blocks until the child exits, a `SIGALRM` kills the child at the deadline, so it does not wake up
+    during the timed run. Only call it from the main thread, which handles the signals.
+    """
+    if timeout is None:
+        _, status, rusage = os.wait4(pid, 0)
+        return status, rusage
+
+    def kill(signum, frame):
+        os.kill(pid, signal.SIGKILL)
+
+    previous = signal.signal(signal.SIGALRM, kill)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        # retried after the handler, until the killed child is reaped
+        _, status, rusage = os.wait4(pid, 0)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+    return status, rusage
+
+
+def run_child(code, namespace, timeout=None):
+    """
+    Fork a child that runs `code` once.
+
+    Returns
+    -------
+        tuple[int, int, float, float]: Time of the call in ns, exit code, user and system time of the child in s.
+    """
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        exit_code = 0
+        start = time.perf_counter_ns()
+        try:
+            exec(code, namespace)  # noqa: S102
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        elapsed = time.perf_counter_ns() - start
+        os.write(w, struct.pack("q", elapsed))
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+    os.close(w)
+    status, rusage = _wait(pid, timeout)
+    data = os.read(r, 8)
+    os.close(r)
+    exit_code = os.waitstatus_to_exitcode(status)
+    elapsed = struct.unpack("q", data)[0] if len(data) == 8 else -1
+    return elapsed, exit_code, rusage.ru_utime, rusage.ru_stime
+
+
+def summarize(name, times_ns, exit_codes, user, system):
+    """
+    Summarize the runs of a command like a hyperfine JSON export result, with times in seconds.
+
+    >>> r = summarize("a", [1_000_000, 3_000_000], [0, 0], [0.1, 0.1], [0.0, 0.0])
+    >>> r["mean"], r["min"], r["max"], r["times_ns"]
+    (0.002, 0.001, 0.003, [1000000, 3000000])
+    """
+    times = [t / 1e9 for t in times_ns]
+    return {
+        "command": name,
+        "mean": statistics.mean(times) if times else float("nan"),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "median": statistics.median(times) if times else float("nan"),
+        "user": statistics.mean(user) if user else 0.0,
+        "system": statistics.mean(system) if system else 0.0,
+        "min": min(times) if times else float("nan"),
+        "max": max(times) if times else float("nan"),
+        "times": times,
+        "times_ns": list(times_ns),
+        "exit_codes": exit_codes,
+    }
+
+
+def serve(name, setup, stmt, warmup, runs, timeout=None):
+    """
+    Run `setup` once, then time `stmt` in `warmup` + `runs` forked children.
+
+    Returns
+    -------
+        dict: The hyperfine compatible result of the measured runs.
+    """
+    namespace = {"__name__": "__main__"}
+    exec(setup, namespace)  # noqa: S102
+    code = compile(stmt, "<testfile>", "exec")
+    times_ns, exit_codes, user, system = [], [], [], []
+    for i in range(warmup + runs):
+        elapsed, exit_code, utime, stime = run_child(code, namespace, timeout=timeout)
+        if i < warmup:
+            continue
+        exit_codes.append(exit_code)
+        # a failed run has no meaningful time, like hyperfine --ignore-failure keeps it out of the statistics
+        if exit_code == 0 and elapsed >= 0:
+            times_ns.append(elapsed)
+            user.append(utime)
+            system.append(stime)
+    return summarize(name, times_ns, exit_codes, user, system)
+
+
+def run_forkserver(name, setup, stmt, json_path, warmup, runs, timeout=None, env=None, cwd=None, cpu=None):
+    """
+    Start a forkserver for a single solution in a new interpreter and write its result to `json_path`.
+
+    With `cpu`, the server and the children it forks are pinned to that core. With `timeout`, every run is killed
+    after `timeout` seconds, and the server after the timeout of the setup and all runs.
+    """
+    # run the file with -c, so its folder does not shadow solution modules like `utils` on sys.path
+    path = str(Path(__file__).resolve())
+    command = [
+        sys.executable,
+        "-c",
+        f"import runpy; runpy.run_path({path!r}, run_name='__main__')",
+        "--name",
+        name,
+        "--setup",
+        setup,
+        "--stmt",
+        stmt,
+        "--warmup",
+        str(warmup),
+        "--runs",
+        str(runs),
+        "--json",
+        str(json_path),
+    ]
+    if timeout is not None:
+        command += ["--timeout", str(timeout)]
+    process = subprocess.Popen(command, env=env, cwd=cwd)  # noqa: S603
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        # not a preexec_fn, which is not safe in the threads that run the servers
+        os.sched_setaffinity(process.pid, {cpu})
+    # the setup, e.g. the imports of the solution, can hang as well
+    limit = None if timeout is None else timeout * (warmup + runs + 1)
+    try:
+        returncode = process.wait(timeout=limit)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        raise
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+    return returncode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--name", required=True)
+    parser.add_argument("--setup", required=True)
+    parser.add_argument("--stmt", required=True)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--json", required=True)
+    args = parser.parse_args(argv)
+    result = serve(args.name, args.setup, args.stmt, args.warmup, args.runs, timeout=args.timeout)
+    Path(args.json).write_text(json.dumps({"results": [result]}, indent=2), encoding="utf8")
+    return 0 if result["times"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
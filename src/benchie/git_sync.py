@@ -0,0 +1,100 @@
+"""
+Sync the git repositories of the solutions of students, e.g. from subgit or GitHub Classroom.
+
+The remote head of every repository is first compared with the local checkout with `git ls-remote`, so only the
+repositories that moved are fetched. Both steps run in a bounded pool of concurrent git processes:
+
+    changed = sync({"alice": "git@github.com:org/alice.git"}, Path("solutions"), branch="main", jobs=8)
+
+`changed` is the set of solution folders that were cloned or updated, for the later stages to limit their work to.
+"""
+
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+
+def _git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)  # noqa: S603, S607
+
+
+def remote_head(url, branch=None):
+    """Commit of a branch, or the HEAD, of a remote repository, or None when the remote can not be read."""
+    ref = f"refs/heads/{branch}" if branch else "HEAD"
+    process = _git("ls-remote", url, ref)
+    if process.returncode != 0:
+        logger.warning(f"Failed to read {url}: {process.stderr.strip()}")
+        return None
+    for line in process.stdout.splitlines():
+        sha, name = line.split()
+        if name == ref:
+            return sha
+    logger.warning(f"No {ref} in {url}")
+    return None
+
+
+def local_head(path):
+    """Commit of the checkout of a repository, or None without a checkout."""
+    if not (path / ".git").exists():
+        return None
+    process = _git("rev-parse", "HEAD", cwd=path)
+    return process.stdout.strip() if process.returncode == 0 else None
+
+
+def clone(path, url, branch=None):
+    """Shallow clone of a repository, replacing the folder if it exists."""
+    logger.info(f"Cloning {path.name}")
+    if path.exists():
+        shutil.rmtree(path)
+    branch_args = ["--branch", branch] if branch else []
+    process = _git("clone", "--depth=1", *branch_args, url, path.name, cwd=path.parent)
+    if process.returncode != 0:
+        logger.warning(f"Failed to clone {url}: {process.stderr.strip()}")
+    return process.returncode == 0
+
+
+def update(path, url, branch=None):
+    """Update a shallow checkout to the remote head, the checkout is a mirror so local changes are discarded."""
+    logger.info(f"Updating {path.name}")
+    process = _git("fetch", "--depth=1", url, branch or "HEAD", cwd=path)
+    if process.returncode == 0:
+        process = _git("reset", "--hard", "FETCH_HEAD", cwd=path)
+    if process.returncode != 0:
+        logger.warning(f"Failed to update {path.name}: {process.stderr.strip()}")
+    return process.returncode == 0
+
+
+def sync(repos, solutions, branch=None, force=False, jobs=8):
+    """
+    Clone or update the repositories whose remote head moved.
+
+    Args:
+        repos (dict[str, str]): The URL of the repository of every student, by id.
+        solutions (Path): The folder with a `solution_<id>` folder per student.
+        branch (str): The branch to check out, or None for the default branch of the remote.
+        force (bool): Clone every repository again.
+        jobs (int): Maximum number of concurrent git processes.
+
+    Returns
+    -------
+        set[Path]: The solution folders that were cloned or updated.
+    """
+    solutions = Path(solutions).resolve()
+    solutions.mkdir(parents=True, exist_ok=True)
+    paths = {k: solutions / f"solution_{k}" for k in repos}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        remote = dict(zip(repos, executor.map(lambda k: remote_head(repos[k], branch), repos)))
+        stale = [k for k in repos if remote[k] and (force or local_head(paths[k]) != remote[k])]
+        logger.info(f"{len(stale)} of {len(repos)} repositories changed")
+
+        def fetch(k):
+            path = paths[k]
+            if not force and local_head(path):
+                return update(path, repos[k], branch)
+            return clone(path, repos[k], branch)
+
+        done = list(executor.map(fetch, stale))
+    return {paths[k] for k, ok in zip(stale, done) if ok}
@@ -0,0 +1,323 @@
+"""
+History of all benchmark results in a SQLite database, across the iterations of a benchmark loop.
+
+The output folder of a dataset only holds the results of the last iteration, as `benchmark` clears it before every
+run. After every dataset, `History.record` stores its results, with the raw samples, the hash of every solution and
+a fingerprint of the host, so results can be compared over time and between machines.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import time
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+from loguru import logger
+
+from benchie.cache import hash_data, hash_tree
+from benchie.reporting import TIMING_ENGINES, format_size, key_by_memory
+
+# timing outputs of a dataset per engine, relative to the test file name
+ENGINE_FILES = {
+    "hyperfine": "{}_benchmark.json",
+    **{engine: f"{{}}_{engine}.json" for engine in TIMING_ENGINES},
+    "pretest": "{}_pretest.json",
+}
+# peak memory outputs of a solution per engine, relative to the solution name
+MEMORY_FILES = {"memray": "{}_memray.txt", "memray_imports": "{}_memray_imports.txt"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    fingerprint TEXT PRIMARY KEY,
+    info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS iterations (
+    id INTEGER PRIMARY KEY,
+    exercise TEXT NOT NULL,
+    host TEXT NOT NULL REFERENCES hosts (fingerprint),
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    iteration INTEGER NOT NULL REFERENCES iterations (id),
+    solution TEXT NOT NULL,
+    solution_hash TEXT,
+    dataset TEXT NOT NULL,
+    data_hash TEXT,
+    engine TEXT NOT NULL,
+    mean REAL,
+    median REAL,
+    stddev REAL,
+    min REAL,
+    max REAL,
+    peak_memory REAL,
+    result TEXT,
+    timestamp REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    result INTEGER NOT NULL REFERENCES results (id),
+    run INTEGER NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (result, run)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS calibrations (
+    iteration INTEGER PRIMARY KEY REFERENCES iterations (id),
+    speed_factor REAL NOT NULL,
+    noise_floor REAL NOT NULL,
+    calibration TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_solution ON results (solution, engine, dataset, iteration);
+CREATE INDEX IF NOT EXISTS results_by_dataset ON results (dataset, engine, iteration);
+"""
+
+
+def _filters(dataset=None, exercise=None):
+    """
+    Conditions on the results `r` and their iterations `i` for a dataset and an exercise, with their parameters.
+
+    >>> _filters("data_01", "global_alignment")
+    (' AND r.dataset = ? AND i.exercise = ?', ['data_01', 'global_alignment'])
+    """
+    conditions = {"r.dataset": dataset, "i.exercise": exercise}
+    filters = "".join(f" AND {column} = ?" for column, value in conditions.items() if value)
+    return filters, [value for value in conditions.values() if value]
+
+
+@cache
+def host_fingerprint():
+    """
+    Fingerprint of the host and the Python that runs the benchmarks, so results from different machines are not mixed.
+
+    Returns
+    -------
+        tuple[str, dict]: The fingerprint and the host information it hashes.
+    """
+    cpu = platform.processor()
+    cpuinfo = Path("/proc/cpuinfo")
+    if cpuinfo.exists():
+        for line in cpuinfo.read_text().splitlines():
+            if line.startswith("model name"):
+                cpu = line.partition(":")[2].strip()
+                break
+    info = {
+        "node": platform.node(),
+        "system": platform.system(),
+        "release": platform.release(),
+        "machine": platform.machine(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    return hashlib.sha256(json.dumps(info, sort_keys=True).encode()).hexdigest()[:16], info
+
+
+class History:
+    """
+    SQLite store of the results of every iteration.
+
+        history = History("history.sqlite")
+        iteration = history.start_iteration("global_alignment")
+        history.record(iteration, testfile, output, solutions)
+        history.median_time("student_1", exercise="global_alignment", last=20)
+
+    The datasets, like `data_01`, and the solutions, like `student_1`, repeat across exercises, so the queries filter
+    on the exercise of the iteration.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # transactions are explicit, see `_transaction`
+        self.connection = sqlite3.connect(self.path, isolation_level=None)
+        # readers, like a report, do not block the benchmark loop
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        # take the write lock at the start, so concurrent writers wait instead of failing halfway
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def start_iteration(self, exercise):
+        """Add an iteration of the benchmark loop on this host and return its id."""
+        fingerprint, info = host_fingerprint()
+        with self._transaction():
+            self.connection.execute(
+                "INSERT OR IGNORE INTO hosts (fingerprint, info) VALUES (?, ?)", (fingerprint, json.dumps(info))
+            )
+            cursor = self.connection.execute(
+                "INSERT INTO iterations (exercise, host, started) VALUES (?, ?, ?)",
+                (exercise, fingerprint, time.time()),
+            )
+        return cursor.lastrowid
+
+    def record(self, iteration, testfile, output, solutions):
+        """
+        Store the results of all engines and the memory peaks of a dataset in one transaction.
+
+        Args:
+            iteration (int): The iteration, see `start_iteration`.
+            testfile (Path): The test file of the dataset.
+            output (Path): The output folder of the dataset.
+            solutions (list[Path]): The solutions, to hash the ones with results.
+
+        Returns
+        -------
+            int: The number of stored results.
+        """
+        dataset = testfile.stem
+        data_hash = hash_data(testfile)
+        hashes = {solution.stem: hash_tree(solution) for solution in solutions}
+        now = time.time()
+        rows = []
+        samples = []
+        for engine, output_name in ENGINE_FILES.items():
+            json_path = output / output_name.format(dataset)
+            if not json_path.exists():
+                continue
+            for c in json.loads(json_path.read_text(encoding="utf8"))["results"]:
+                result = {k: v for k, v in c.items() if k != "times"}
+                row = [
+                    c["command"],
+                    engine,
+                    c.get("mean"),
+                    c.get("median"),
+                    c.get("stddev"),
+                    c.get("min"),
+                    c.get("max"),
+                    c.get("peak_rss"),
+                    json.dumps(result),
+                ]
+                rows.append(row)
+                samples.append(c.get("times") or [])
+        for engine, output_name in MEMORY_FILES.items():
+            for solution in hashes:
+                path = output / output_name.format(solution)
+                if path.exists():
+                    peak = key_by_memory(path.read_text())
+                    # MB to bytes
+                    peak_memory = peak * 1e6 if peak != float("inf") else None
+                    rows.append([solution, engine, None, None, None, None, None, peak_memory, None])
+                    samples.append([])
+        with self._transaction():
+            # number the results up front, so all results and samples are inserted in two batches
+            (first_id,) = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM results").fetchone()
+            ids = range(first_id, first_id + len(rows))
+            self.connection.executemany(
+                "INSERT INTO results (id, iteration, solution, solution_hash, dataset, data_hash, engine, mean, median,"
+                " stddev, min, max, peak_memory, result, timestamp)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (result_id, iteration, row[0], hashes.get(row[0]), dataset, data_hash, *row[1:], now)
+                    for result_id, row in zip(ids, rows)
+                ],
+            )
+            self.connection.executemany(
+                "INSERT INTO samples (result, run, time) VALUES (?, ?, ?)",
+                [(result_id, i, t) for result_id, times in zip(ids, samples) for i, t in enumerate(times)],
+            )
+        logger.debug(f"Stored {len(rows)} results of {dataset} in {self.path}")
+        return len(rows)
+
+    def record_calibration(self, iteration, calibration):
+        """Store the speed factor and the noise floor of the host during an iteration, see `benchie.calibration`."""
+        with self._transaction():
+            self.connection.execute(
+                "INSERT OR REPLACE INTO calibrations (iteration, speed_factor, noise_floor, calibration) "
+                "VALUES (?, ?, ?, ?)",
+                (iteration, calibration["speed_factor"], calibration["noise_floor"], json.dumps(calibration)),
+            )
+
+    def median_time(self, solution, dataset=None, engine="hyperfine", last=20, exercise=None):
+        """
+        Median of the timed runs of a solution over its last iterations with results of an engine on this host.
+
+        Returns
+        -------
+            float: The median time in seconds, or None without samples.
+        """
+        filters, parameters = _filters(dataset, exercise)
+        parameters = [solution, engine, *parameters, host_fingerprint()[0]]
+        query = f"""
+            SELECT s.time FROM samples s
+            JOIN results r ON s.result = r.id
+            JOIN iterations i ON r.iteration = i.id
+            WHERE r.solution = ? AND r.engine = ? {filters} AND i.host = ?
+            AND r.iteration IN (
+                SELECT DISTINCT r.iteration FROM results r
+                JOIN iterations i ON r.iteration = i.id
+                WHERE r.solution = ? AND r.engine = ? {filters} AND i.host = ?
+                ORDER BY r.iteration DESC LIMIT ?
+            )
+        """  # noqa: S608
+        parameters = [*parameters, *parameters, last]
+        times = [t for (t,) in self.connection.execute(query, parameters)]
+        return statistics.median(times) if times else None
+
+    def last_iteration(self, dataset, exercise=None):
+        """The last iteration with results of a dataset of an exercise, or None."""
+        filters, parameters = _filters(dataset, exercise)
+        query = f"SELECT MAX(r.iteration) FROM results r JOIN iterations i ON r.iteration = i.id WHERE 1 {filters}"  # noqa: S608
+        (iteration,) = self.connection.execute(query, parameters).fetchone()
+        return iteration
+
+    def timings(self, dataset, engine="hyperfine", iteration=None, exercise=None):
+        """
+        Results of an engine on a dataset, by default of the last iteration of the exercise, like a hyperfine JSON
+        export.
+
+        Returns
+        -------
+            dict: The results with their samples as `times`, or None without results.
+        """
+        iteration = iteration or self.last_iteration(dataset, exercise)
+        rows = self.connection.execute(
+            "SELECT id, result FROM results WHERE dataset = ? AND engine = ? AND iteration = ? ORDER BY id",
+            (dataset, engine, iteration),
+        ).fetchall()
+        if not rows:
+            return None
+        results = []
+        for result_id, result in rows:
+            c = json.loads(result)
+            c["times"] = [
+                t
+                for (t,) in self.connection.execute(
+                    "SELECT time FROM samples WHERE result = ? ORDER BY run", (result_id,)
+                )
+            ]
+            results.append(c)
+        return {"results": results}
+
+    def peaks(self, dataset, iteration=None, exercise=None):
+        """
+        Memray peaks of a dataset, by default of the last iteration of the exercise, like
+        `benchie.reporting.get_all_peak_memory`.
+
+        Returns
+        -------
+            tuple[dict, dict]: The formatted peaks with the imports and with the tracker per solution.
+        """
+        iteration = iteration or self.last_iteration(dataset, exercise)
+        peaks = {engine: {} for engine in MEMORY_FILES}
+        for solution, engine, peak_memory in self.connection.execute(
+            "SELECT solution, engine, peak_memory FROM results WHERE dataset = ? AND iteration = ? AND engine IN (?, ?)",
+            (dataset, iteration, *MEMORY_FILES),
+        ):
+            peaks[engine][solution] = format_size(peak_memory) if peak_memory is not None else None
+        return peaks["memray_imports"], peaks["memray"]
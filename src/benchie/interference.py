@@ -0,0 +1,314 @@
+"""
+Detect interference from other processes during the timed runs, and measure contaminated samples again.
+
+An `InterferenceMonitor` samples the host in a background thread while the benchmarks run. Every sample covers the
+interval since the previous sample:
+
+- `cpu_pressure`: fraction of the interval that some task waited for a CPU, from `/proc/pressure/cpu`
+- `io_pressure`: fraction of the interval that some task waited for I/O, from `/proc/pressure/io`
+- `external_cpu`: busy cores beyond the cores of the benchmark jobs, from `/proc/stat`
+- `runnable`: runnable tasks beyond the number of CPUs, from `/proc/loadavg`
+
+A run is contaminated when a sample that overlaps its window is above one of the `THRESHOLDS`, e.g. during a cron
+job or a `git push`. Kernels without pressure stall information only use `/proc/stat` and `/proc/loadavg`. The
+pressure is system-wide, so a solution that runs more threads than its core also counts as interference.
+
+    monitor = InterferenceMonitor(expected_cores=jobs).start()
+    ...  # benchmark, accounting the start and end of every run
+    results, report = remeasure(results, runs_by_name, monitor, measure)
+    monitor.stop()
+"""
+
+import json
+import statistics
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+
+PROC = Path("/proc")
+# a sample above any of these thresholds contaminates the runs it overlaps
+THRESHOLDS = {"cpu_pressure": 0.1, "io_pressure": 0.1, "external_cpu": 0.5, "runnable": 1}
+
+
+def _read(path):
+    try:
+        return path.read_text()
+    except OSError:
+        return ""
+
+
+def read_cpu_times(text=None):
+    """
+    Busy and total jiffies of all CPUs and the number of CPUs, from `/proc/stat`. Steal time counts as busy.
+
+    >>> read_cpu_times("cpu  10 0 5 80 5 0 0 0 0 0\\ncpu0 10 0 5 80 5 0 0 0 0 0\\nintr 1\\n")
+    (15, 100, 1)
+    """
+    text = _read(PROC / "stat") if text is None else text
+    lines = text.splitlines()
+    if not lines or not lines[0].startswith("cpu "):
+        return None
+    # user nice system idle iowait irq softirq steal, guest time is already in user and nice
+    jiffies = [int(x) for x in lines[0].split()[1:9]]
+    total = sum(jiffies)
+    n_cpus = sum(1 for line in lines[1:] if line.startswith("cpu"))
+    return total - jiffies[3] - jiffies[4], total, n_cpus
+
+
+def read_pressure(resource, text=None):
+    """
+    Total time in microseconds that some task stalled on a resource, from `/proc/pressure/<resource>`.
+
+    >>> read_pressure("cpu", "some avg10=0.15 avg60=2.96 avg300=4.47 total=99061284\\nfull avg10=0.00 total=0\\n")
+    99061284
+    """
+    text = _read(PROC / "pressure" / resource) if text is None else text
+    for line in text.splitlines():
+        if line.startswith("some "):
+            return int(line.rpartition("total=")[2])
+    return None
+
+
+def read_runnable(text=None):
+    """
+    Number of runnable tasks, including the reader, from `/proc/loadavg`.
+
+    >>> read_runnable("0.15 0.24 0.18 2/72 28294")
+    2
+    """
+    text = _read(PROC / "loadavg") if text is None else text
+    fields = text.split()
+    return int(fields[3].split("/")[0]) if len(fields) > 3 else None
+
+
+class InterferenceMonitor:
+    """
+    Sample the interference on the host in a background thread.
+
+    Every sample has the wall-clock `time` it was taken at, like the runs that `benchie.accounting` records, and the
+    metrics that could be read, see the module docstring.
+    """
+
+    def __init__(self, expected_cores=1, interval_ms=100):
+        self.expected_cores = expected_cores
+        self.interval = interval_ms / 1000
+        self.samples = []
+        self._last = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._read()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the samples."""
+        self._stop.set()
+        self._thread.join()
+        return self.snapshot()
+
+    def snapshot(self):
+        """Take a sample now, so the samples cover every run that ended, and return all samples."""
+        self._sample()
+        with self._lock:
+            return list(self.samples)
+
+    def _read(self):
+        state = {
+            "time": time.time(),
+            "cpu": read_cpu_times(),
+            "cpu_pressure": read_pressure("cpu"),
+            "io_pressure": read_pressure("io"),
+        }
+        last, self._last = self._last, state
+        return last, state
+
+    def _sample(self):
+        with self._lock:
+            last, state = self._read()
+            elapsed = state["time"] - last["time"]
+            if elapsed <= 0:
+                return
+            sample = {"time": state["time"]}
+            for resource in ("cpu_pressure", "io_pressure"):
+                if state[resource] is not None and last[resource] is not None:
+                    sample[resource] = (state[resource] - last[resource]) / 1e6 / elapsed
+            if state["cpu"] and last["cpu"] and state["cpu"][1] > last["cpu"][1]:
+                busy, total, n_cpus = state["cpu"]
+                busy_cores = (busy - last["cpu"][0]) / (total - last["cpu"][1]) * n_cpus
+                sample["external_cpu"] = max(0.0, busy_cores - self.expected_cores)
+            else:
+                # the jiffies did not advance yet, keep the baseline for the next sample
+                state["cpu"] = last["cpu"]
+            runnable = read_runnable()
+            if runnable is not None and state["cpu"]:
+                # the monitor itself is running while it reads
+                sample["runnable"] = max(0, runnable - 1 - state["cpu"][2])
+            self.samples.append(sample)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+
+def contamination(samples, start, end, thresholds=None):
+    """
+    Metrics above their threshold during a run, every sample covers the interval since the previous sample.
+
+    >>> samples = [{"time": 1.0}, {"time": 2.0, "cpu_pressure": 0.5}, {"time": 3.0, "io_pressure": 0.0}]
+    >>> contamination(samples, 1.5, 1.8), contamination(samples, 2.5, 2.8)
+    (['cpu_pressure'], [])
+    """
+    thresholds = THRESHOLDS if thresholds is None else thresholds
+    reasons = set()
+    previous = None
+    for sample in samples:
+        if previous is not None and sample["time"] > start and previous < end:
+            reasons.update(k for k, limit in thresholds.items() if sample.get(k) is not None and sample[k] > limit)
+        previous = sample["time"]
+    return sorted(reasons)
+
+
+def summarize_times(times):
+    """
+    Statistics of the times of a hyperfine result.
+
+    >>> summarize_times([1.0, 2.0, 3.0])
+    {'mean': 2.0, 'stddev': 1.0, 'median': 2.0, 'min': 1.0, 'max': 3.0}
+    """
+    return {
+        "mean": statistics.mean(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "median": statistics.median(times),
+        "min": min(times),
+        "max": max(times),
+    }
+
+
+def split_contaminated(result, runs, samples, thresholds=None):
+    """
+    Split the samples of a hyperfine result into clean and contaminated samples.
+
+    Args:
+        result (dict): Hyperfine result, with the `times` and `exit_codes` of the runs.
+        runs (list[dict]): Accounted runs in the same order, with their wall-clock `start` and `end`.
+        samples (list[dict]): Samples of an `InterferenceMonitor`.
+        thresholds (dict[str, float]): Thresholds of the metrics, `THRESHOLDS` by default.
+
+    Returns
+    -------
+        tuple[list, list[dict]]: The clean samples as `(time, exit_code)` pairs, and the contaminated runs with
+            their time, window and reasons.
+    """
+    times = result.get("times") or []
+    exit_codes = result.get("exit_codes") or [0] * len(times)
+    runs = [run for run in runs or [] if "start" in run]
+    if len(runs) != len(times):
+        logger.warning(f"Can not align the {len(times)} times of {result['command']} with {len(runs)} runs")
+        return list(zip(times, exit_codes)), []
+    clean, contaminated = [], []
+    for t, exit_code, run in zip(times, exit_codes, runs):
+        reasons = contamination(samples, run["start"], run["end"], thresholds)
+        if reasons:
+            contaminated.append({"time": t, "start": run["start"], "end": run["end"], "reasons": reasons})
+        else:
+            clean.append((t, exit_code))
+    return clean, contaminated
+
+
+def remeasure(results, runs_by_name, monitor, measure, retries=2, thresholds=None):
+    """
+    Discard the contaminated samples of the hyperfine results and measure them again.
+
+    Every retry measures as many new runs as there were contaminated runs, and its contaminated runs are discarded
+    as well. After `retries`, a solution keeps fewer samples, or its contaminated samples if none were clean.
+
+    Args:
+        results (list[dict]): Hyperfine results.
+        runs_by_name (dict[str, list[dict]]): Accounted runs of every solution, see `split_contaminated`.
+        monitor (InterferenceMonitor): Monitor that is sampling since before the first run.
+        measure (Callable): Called with the number of runs to measure per solution, returns the new hyperfine
+            result and the accounted runs per solution.
+        retries (int): Maximum number of times to measure the contaminated samples again.
+        thresholds (dict[str, float]): Thresholds of the metrics, `THRESHOLDS` by default.
+
+    Returns
+    -------
+        tuple[list[dict], dict]: The results with the clean samples and an `interference` summary, and the
+            contaminated runs per solution.
+    """
+    samples = monitor.snapshot()
+    clean, discarded = {}, {}
+    for result in results:
+        name = result["command"]
+        clean[name], discarded[name] = split_contaminated(result, runs_by_name.get(name), samples, thresholds)
+    pending = {name: len(runs) for name, runs in discarded.items() if runs}
+    remeasured = dict.fromkeys(pending, 0)
+    for attempt in range(1, retries + 1):
+        if not pending:
+            break
+        logger.warning(f"Measuring {sum(pending.values())} contaminated sample(s) again, attempt {attempt}")
+        measured = measure(pending)
+        samples = monitor.snapshot()
+        for name, (result, runs) in measured.items():
+            new_clean, new_discarded = split_contaminated(result, runs, samples, thresholds)
+            new_clean = new_clean[: pending[name]]
+            clean[name].extend(new_clean)
+            discarded[name].extend(new_discarded)
+            remeasured[name] += len(new_clean)
+            pending[name] -= len(new_clean)
+        pending = {name: n for name, n in pending.items() if n}
+
+    for result in results:
+        name = result["command"]
+        if not discarded[name]:
+            continue
+        summary = {"discarded": len(discarded[name]), "reasons": {}, "remeasured": remeasured[name]}
+        for run in discarded[name]:
+            for reason in run["reasons"]:
+                summary["reasons"][reason] = summary["reasons"].get(reason, 0) + 1
+        if clean[name]:
+            result["times"] = [t for t, _ in clean[name]]
+            result["exit_codes"] = [exit_code for _, exit_code in clean[name]]
+            result.update(summarize_times(result["times"]))
+        else:
+            logger.warning(f"No clean samples of {name}, keeping its contaminated samples")
+            summary["kept"] = True
+        result["interference"] = summary
+    return results, {name: runs for name, runs in discarded.items() if runs}
+
+
+def interference_note(results):
+    """
+    Markdown note with the number of discarded samples of every solution and why, empty without interference.
+
+    >>> interference_note([{"command": "a", "interference": {"discarded": 2, "reasons": {"cpu_pressure": 2}}}])
+    '\\n\\nDiscarded 2 contaminated sample(s): `a` 2 (cpu_pressure 2).\\n'
+    """
+    parts = []
+    for c in results:
+        summary = c.get("interference")
+        if summary and summary["discarded"]:
+            reasons = ", ".join(f"{reason} {n}" for reason, n in sorted(summary["reasons"].items()))
+            parts.append(f"`{c['command']}` {summary['discarded']} ({reasons})")
+    if not parts:
+        return ""
+    total = sum(c["interference"]["discarded"] for c in results if c.get("interference"))
+    return f"\n\nDiscarded {total} contaminated sample(s): {', '.join(parts)}.\n"
+
+
+def write_interference_json(json_path, samples, discarded, thresholds=None):
+    """Write the thresholds, the peak of every metric and the contaminated runs of every solution."""
+    metrics = sorted({k for sample in samples for k in sample if k != "time"})
+    report = {
+        "thresholds": THRESHOLDS if thresholds is None else thresholds,
+        "n_samples": len(samples),
+        "peaks": {k: max(s[k] for s in samples if k in s) for k in metrics},
+        "discarded": discarded,
+    }
+    Path(json_path).write_text(json.dumps(report, indent=2), encoding="utf8")
+    return report
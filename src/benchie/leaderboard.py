@@ -0,0 +1,155 @@
+"""
+Leaderboard of an exercise over all its datasets.
+
+On every dataset, the time and the peak memory of a solution are normalised to the best solution on that dataset,
+so 1 is the best and 2 is twice as slow. The score of a solution is the geometric mean of its normalised times and
+memory over all datasets, so every dataset weighs the same, whatever its size.
+
+A solution without results on a dataset, because it failed, timed out or was removed as invalid on an earlier
+dataset, is ranked after the solutions with results on more datasets.
+"""
+
+import csv
+import json
+import math
+
+from benchie.complexity import read_median_times, read_peak_memory
+
+
+def geometric_mean(values):
+    """
+    Geometric mean of positive values, or None without values.
+
+    >>> geometric_mean([1.0, 4.0])
+    2.0
+    """
+    if not values:
+        return None
+    return math.exp(sum(math.log(v) for v in values) / len(values))
+
+
+def normalise(values):
+    """
+    Values relative to the smallest value.
+
+    >>> normalise({"a": 2.0, "b": 1.0})
+    {'a': 2.0, 'b': 1.0}
+    """
+    best = min(values.values(), default=None)
+    return {k: v / best for k, v in values.items()} if best else {}
+
+
+def dataset_status(output_data, name, solution, times):
+    """Status of a solution on a dataset: `ok`, `timeout`, `failed`, or `not run` after failing an earlier one."""
+    if solution in times:
+        return "ok"
+    status_path = output_data / f"{name}_status.json"
+    status = json.loads(status_path.read_text(encoding="utf8")) if status_path.exists() else {}
+    return status.get(solution, "not run")
+
+
+def create_leaderboard(output, data_paths, solutions):
+    """
+    Rank the solutions of an exercise on their normalised time and memory over all datasets.
+
+    Args:
+        output (Path): The output folder of the exercise, with a folder per dataset.
+        data_paths (list[Path]): The test files of the datasets.
+        solutions (list[str]): The names of all solutions, also those without results.
+
+    Returns
+    -------
+        list[dict]: The solutions in order of their rank, with their scores and their status per dataset.
+    """
+    datasets = [path.stem for path in data_paths]
+    rows = {solution: {"command": solution, "time": [], "memory": [], "datasets": {}} for solution in solutions}
+    for name in datasets:
+        output_data = output / name
+        times, peak_rss = read_median_times(output_data, name)
+        memory = {}
+        for solution in times:
+            peak = read_peak_memory(output_data, solution) or peak_rss.get(solution)
+            if peak:
+                memory[solution] = peak
+        relative_times, relative_memory = normalise(times), normalise(memory)
+        for solution, row in rows.items():
+            row["datasets"][name] = dataset_status(output_data, name, solution, times)
+            if solution in relative_times:
+                row["time"].append(relative_times[solution])
+            if solution in relative_memory:
+                row["memory"].append(relative_memory[solution])
+    leaderboard = []
+    for row in rows.values():
+        time_score = geometric_mean(row.pop("time"))
+        memory_score = geometric_mean(row.pop("memory"))
+        scores = [s for s in (time_score, memory_score) if s is not None]
+        leaderboard.append({
+            **row,
+            "time_score": time_score,
+            "memory_score": memory_score,
+            "score": geometric_mean(scores),
+            "n_datasets": sum(status == "ok" for status in row["datasets"].values()),
+        })
+    # more completed datasets first, then the lowest score
+    leaderboard.sort(key=lambda r: (-r["n_datasets"], r["score"] if r["score"] is not None else math.inf))
+    for i, row in enumerate(leaderboard):
+        row["rank"] = i + 1
+    return leaderboard
+
+
+def _format(score):
+    return f"{score:.2f}" if score is not None else ""
+
+
+def create_leaderboard_table(leaderboard, n_datasets):
+    r"""
+    Markdown table of the leaderboard.
+
+    >>> create_leaderboard_table([{"rank": 1, "command": "a", "time_score": 1.0, "memory_score": 1.21, "score": 1.1,
+    ...     "n_datasets": 1, "datasets": {"data_01": "ok", "data_02": "timeout"}}], 2).splitlines()[2]
+    ' | 1 | `a` | 1.10 | 1.00 | 1.21 | 1/2 | data_02: timeout | '
+    """
+    d = " | "
+    header = ["Rank", "Command", "Score", "Time score", "Memory score", "Datasets", "Missing"]
+    output = [d + d.join(header) + d, d + d.join(["---:", ":---", "---:", "---:", "---:", "---:", ":---"]) + d]
+    for row in leaderboard:
+        missing = ", ".join(f"{name}: {status}" for name, status in row["datasets"].items() if status != "ok")
+        columns = [
+            str(row["rank"]),
+            f"`{row['command']}`",
+            _format(row["score"]),
+            _format(row["time_score"]),
+            _format(row["memory_score"]),
+            f"{row['n_datasets']}/{n_datasets}",
+            missing,
+        ]
+        output.append(d + d.join(columns) + d)
+    return "\n".join(output)
+
+
+def write_leaderboard(output, data_paths, solutions):
+    """
+    Write the leaderboard of an exercise to `leaderboard.md`, `leaderboard.csv` and `leaderboard.json`.
+
+    Returns
+    -------
+        list[dict]: The leaderboard, see `create_leaderboard`.
+    """
+    leaderboard = create_leaderboard(output, data_paths, solutions)
+    datasets = [path.stem for path in data_paths]
+    (output / "leaderboard.json").write_text(json.dumps({"datasets": datasets, "results": leaderboard}, indent=2))
+    (output / "leaderboard.md").write_text(create_leaderboard_table(leaderboard, len(datasets)))
+    with open(output / "leaderboard.csv", "w", newline="", encoding="utf8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["rank", "command", "score", "time_score", "memory_score", "n_datasets", *datasets])
+        for row in leaderboard:
+            writer.writerow([
+                row["rank"],
+                row["command"],
+                row["score"],
+                row["time_score"],
+                row["memory_score"],
+                row["n_datasets"],
+                *(row["datasets"][name] for name in datasets),
+            ])
+    return leaderboard
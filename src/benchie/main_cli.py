@@ -3,6 +3,9 @@ from loguru import logger
 
 from benchie import main as run_main
 from benchie.benchmark import BenchmarkOption
+from benchie.daemon import notify
+from benchie.distributed import main as coordinator_main
+from benchie.distributed import run_worker
 from benchie.fetch_classroom import main as fetch_classroom_main
 from benchie.fetch_subgit import main as fetch_subgit_main
 from benchie.fetch_submissions import main as fetch_main
@@ -67,8 +70,45 @@ def main_cli():
     is_flag=True,
     help="Disable the correctness test of the solutions before benchmarking.",
 )
+@click.option(
+    "--rss_interval_ms",
+    default=10,
+    type=int,
+    help="Interval in ms to sample the memory of the timed runs at, with `-b rss`.",
+)
+@click.option(
+    "--flamegraph",
+    is_flag=True,
+    help="Render a memray flamegraph of every solution, besides its peak memory.",
+)
+@click.option(
+    "--pretest_as_warmup",
+    is_flag=True,
+    help="Count the measured correctness test as the warmup run of the timed benchmarks.",
+)
 @click.option("-L", "--loop", is_flag=True, help="Run benchmark in infinite loop.")
 @click.option("--loop_timeout", default=10 * 60, type=int, help="Timeout for the loop in seconds.")
+@click.option(
+    "-D",
+    "--daemon",
+    is_flag=True,
+    help="Run a cycle on notifications to POST /notify instead of sleeping, polling with backoff as a fallback.",
+)
+@click.option("--notify_host", default="127.0.0.1", type=str, help="Daemon: host to listen for notifications on.")
+@click.option("--notify_port", default=8765, type=int, help="Daemon: port to listen for notifications on.")
+@click.option("--watch", is_flag=True, help="Daemon: run a cycle when the solutions folder changes.")
+@click.option(
+    "--debounce",
+    default=5.0,
+    type=float,
+    help="Daemon: seconds without new notifications before a cycle starts.",
+)
+@click.option(
+    "--poll_interval",
+    default=60,
+    type=int,
+    help="Daemon: minimum seconds between fallback polls, doubled up to --loop_timeout while nothing changes.",
+)
 @click.option(
     "-b",
     "--benchmark_options",
@@ -83,6 +123,79 @@ def main_cli():
     type=str,
     help="Docker image to use for benchmarking.",
 )
+@click.option(
+    "--docker_pool",
+    default=0,
+    type=int,
+    help="Number of long-lived containers, each pinned to its own cores, to run the docker image in.",
+)
+@click.option("--docker_memory", default="2g", type=str, help="Memory limit of every container in the pool.")
+@click.option("-j", "--jobs", default=1, type=int, help="Number of solutions to run at the same time.")
+@click.option(
+    "--cache_dir",
+    default=None,
+    type=click.Path(),
+    help="Folder to cache results in. Unchanged solutions are not benchmarked again.",
+)
+@click.option(
+    "--target_ci",
+    default=0.05,
+    type=float,
+    help="Adaptive benchmark: stop when the confidence interval of the mean is narrower than this, relative to the mean.",
+)
+@click.option(
+    "--time_budget",
+    default=10.0,
+    type=float,
+    help="Adaptive benchmark: maximum time in seconds to spend on each solution.",
+)
+@click.option("--min_runs", default=3, type=int, help="Hyperfine: minimum number of runs of every solution.")
+@click.option(
+    "--batch_size",
+    default=1,
+    type=int,
+    help="Hyperfine: number of solutions per hyperfine process, larger batches start fewer processes.",
+)
+@click.option(
+    "--history",
+    default=None,
+    type=click.Path(),
+    help="SQLite database to store the results of every iteration in, e.g. history.sqlite.",
+)
+@click.option(
+    "--events",
+    "events_path",
+    default=None,
+    type=click.Path(),
+    help="JSON lines file to append the progress events of the benchmark to, e.g. events.jsonl.",
+)
+@click.option(
+    "--metrics",
+    "metrics_path",
+    default=None,
+    type=click.Path(),
+    help="File to write Prometheus metrics to, for the textfile collector of the node exporter.",
+)
+@click.option(
+    "--calibration",
+    is_flag=True,
+    help="Calibrate the speed and noise floor of the host with reference workloads before and after every cycle.",
+)
+@click.option(
+    "--calibration_reference",
+    default=None,
+    type=click.Path(),
+    help="Calibration of the reference machine, written by the first host. Defaults to calibration_reference.json.",
+)
+@click.option("--normalise", is_flag=True, help="Also report the times normalised to the reference machine.")
+@click.option("--hash_seed", default="0", type=str, help="PYTHONHASHSEED of the solutions with --calibration.")
+@click.option("--race_rounds", default=5, type=int, help="Racing benchmark: number of rounds.")
+@click.option(
+    "--race_factor",
+    default=1.0,
+    type=float,
+    help="Racing benchmark: eliminate solutions that are this many times slower than the leader.",
+)
 def run(
     output,
     data,
@@ -98,11 +211,37 @@ def run(
     subset,
     subset_data,
     disable_pretest,
+    pretest_as_warmup,
+    flamegraph,
+    rss_interval_ms,
     loop,
     loop_timeout,
+    daemon,
+    notify_host,
+    notify_port,
+    watch,
+    debounce,
+    poll_interval,
     timeout,
     benchmark_options,
     docker_image,
+    docker_pool,
+    docker_memory,
+    jobs,
+    cache_dir,
+    target_ci,
+    time_budget,
+    min_runs,
+    batch_size,
+    history,
+    events_path,
+    metrics_path,
+    calibration,
+    calibration_reference,
+    normalise,
+    hash_seed,
+    race_rounds,
+    race_factor,
 ):
     args = {
         "output": output,
@@ -122,8 +261,34 @@ def run(
         "timeout": timeout,
         "loop": loop,
         "loop_timeout": loop_timeout,
+        "daemon": daemon,
+        "notify_host": notify_host,
+        "notify_port": notify_port,
+        "watch": watch,
+        "debounce": debounce,
+        "poll_interval": poll_interval,
         "benchmark_options": benchmark_options,
         "docker_image": docker_image,
+        "docker_pool": docker_pool,
+        "docker_memory": docker_memory,
+        "jobs": jobs,
+        "cache_dir": cache_dir,
+        "target_ci": target_ci,
+        "time_budget": time_budget,
+        "min_runs": min_runs,
+        "batch_size": batch_size,
+        "race_rounds": race_rounds,
+        "race_factor": race_factor,
+        "pretest_as_warmup": pretest_as_warmup,
+        "flamegraph": flamegraph,
+        "rss_interval_ms": rss_interval_ms,
+        "history": history,
+        "events_path": events_path,
+        "metrics_path": metrics_path,
+        "calibration": calibration,
+        "calibration_reference": calibration_reference,
+        "normalise": normalise,
+        "hash_seed": hash_seed,
     }
     logger.info(args)
     run_main(**args)
@@ -139,9 +304,18 @@ def run(
 )
 @click.option("-c", "--course_id", default="3363", help="Dodona course id.")
 @click.option("-e", "--exercise_id", default="1315421652", help="Dodona exercise id.")
+@click.option("-t", "--token", default="token", type=click.Path(), help="Dodona token location.")
 @click.option("-f", "--force", is_flag=True, help="Force write all submissions.")
-def fetch(solutions, course_id, exercise_id, force):
-    args = {"solutions": solutions, "course_id": course_id, "exercise_id": exercise_id, "force": force}
+@click.option("-j", "--jobs", default=8, type=int, help="Number of concurrent requests.")
+def fetch(solutions, course_id, exercise_id, token, force, jobs):
+    args = {
+        "solutions": solutions,
+        "course_id": course_id,
+        "exercise_id": exercise_id,
+        "token": token,
+        "force": force,
+        "jobs": jobs,
+    }
     logger.info(args)
     fetch_main(**args)
 
@@ -157,10 +331,14 @@ def fetch(solutions, course_id, exercise_id, force):
 @click.option("-i", "--task_id", default="2023-2024/combio/project", help="Subgit task id.")
 @click.option("-f", "--force", is_flag=True, help="Force write all submissions.")
 @click.option("-N", "--subset", default=None, type=int, help="Number of submissions to subset.")
-def fetch_subgit(solutions, task_id, force, subset):
-    args = {"solutions": solutions, "task_id": task_id, "force": force, "subset": subset}
+@click.option("-j", "--jobs", default=8, type=int, help="Number of concurrent git processes.")
+@click.option(
+    "--notify", "notify_url", default=None, help="URL of a benchie daemon to notify of the changed solutions."
+)
+def fetch_subgit(solutions, task_id, force, subset, jobs, notify_url):
+    args = {"solutions": solutions, "task_id": task_id, "force": force, "subset": subset, "jobs": jobs}
     logger.info(args)
-    fetch_subgit_main(**args)
+    _notify_changed(fetch_subgit_main(**args), notify_url)
 
 
 @click.command()
@@ -173,16 +351,85 @@ def fetch_subgit(solutions, task_id, force, subset):
 @click.option("-i", "--task_id", type=str, help="Classroom assignment id.")
 @click.option("-f", "--force", is_flag=True, help="Force write all submissions.")
 @click.option("-N", "--subset", default=None, type=int, help="Number of submissions to subset.")
-def fetch_classroom(solutions, task_id, force, subset):
-    args = {"solutions": solutions, "task_id": task_id, "force": force, "subset": subset}
+@click.option("-j", "--jobs", default=8, type=int, help="Number of concurrent git processes.")
+@click.option(
+    "--notify", "notify_url", default=None, help="URL of a benchie daemon to notify of the changed solutions."
+)
+def fetch_classroom(solutions, task_id, force, subset, jobs, notify_url):
+    args = {"solutions": solutions, "task_id": task_id, "force": force, "subset": subset, "jobs": jobs}
+    logger.info(args)
+    _notify_changed(fetch_classroom_main(**args), notify_url)
+
+
+def _notify_changed(changed, notify_url=None):
+    """Log the synced solution folders and notify a benchie daemon, so its next cycle benchmarks only those."""
+    names = sorted(path.name for path in changed)
+    logger.info(f"Changed solutions: {', '.join(names) or 'none'}")
+    if notify_url and names:
+        notify(notify_url, names)
+
+
+@click.command()
+@click.option(
+    "-o", "--output", default="output", type=click.Path(), help="Output folder to write benchmark result files."
+)
+@click.option("-d", "--data", default="data", type=click.Path(), help="Data folder to read input files from.")
+@click.option("-s", "--solutions", default="solutions", type=click.Path(), help="Folder to read submissions from.")
+@click.option("-e", "--exercise_name", default="global_alignment", help="Exercise name.")
+@click.option("-q", "--queue", default="queue.sqlite", type=click.Path(), help="SQLite database of the job queue.")
+@click.option(
+    "-b",
+    "--benchmark_options",
+    multiple=True,
+    default=[],
+    type=click.Choice([option.value for option in BenchmarkOption]),
+    help="Benchmarking options.",
+)
+@click.option("-T", "--timeout", default=30, type=int, help="Timeout for benchmarking.")
+@click.option("--disable_pretest", is_flag=True, help="Disable the correctness test of the solutions.")
+@click.option("-N", "--subset", default=None, type=int, help="Number of submissions to subset.")
+@click.option("--subset_data", default=None, type=int, help="Number of data files to subset.")
+def coordinator(
+    output, data, solutions, exercise_name, queue, benchmark_options, timeout, disable_pretest, subset, subset_data
+):
+    args = {
+        "output": output,
+        "data": data,
+        "solutions": solutions,
+        "exercise_name": exercise_name,
+        "queue": queue,
+        "benchmark_options": benchmark_options,
+        "timeout": timeout,
+        "disable_pretest": disable_pretest,
+        "subset": subset,
+        "subset_data": subset_data,
+    }
+    logger.info(args)
+    coordinator_main(**args)
+
+
+@click.command()
+@click.option("-q", "--queue", default="queue.sqlite", type=click.Path(), help="SQLite database of the job queue.")
+@click.option("-w", "--workdir", default=None, type=click.Path(), help="Folder for the outputs of the jobs.")
+@click.option("--wait", is_flag=True, help="Keep waiting for new jobs when the queue is empty.")
+@click.option(
+    "--cpu",
+    multiple=True,
+    type=int,
+    help="Core to run the jobs on, can be repeated. By default, a core of the node that no other worker holds.",
+)
+def worker(queue, workdir, wait, cpu):
+    args = {"queue_path": queue, "workdir": workdir, "wait": wait, "cores": list(cpu) or None}
     logger.info(args)
-    fetch_classroom_main(**args)
+    run_worker(**args)
 
 
 main_cli.add_command(run)
 main_cli.add_command(fetch)
 main_cli.add_command(fetch_subgit)
 main_cli.add_command(fetch_classroom)
+main_cli.add_command(coordinator)
+main_cli.add_command(worker)
 
 if __name__ == "__main__":
     main_cli()
@@ -0,0 +1,55 @@
+import signal
+import subprocess
+import time
+
+from loguru import logger
+
+from benchie.accounting import has_exited, reap
+from benchie.procfs import RssSampler, pin_to_core
+
+
+def measure(command, env=None, cwd=None, timeout=None, cpu=None, rss_interval_ms=None):
+    """
+    Run a command once and measure its wall time and the resources of the process and its reaped children.
+
+    Args:
+        command (list[str]): Command to run.
+        env (dict): Environment of the command.
+        cwd (Path): Working directory of the command.
+        timeout (float): Timeout in seconds, after which the command is killed.
+        cpu (int | set[int]): Core or cores to pin the command to, see `pin_to_core`.
+        rss_interval_ms (int): Interval to sample the memory of the process tree at, see `RssSampler`. No sampling
+            if None.
+
+    Returns
+    -------
+        dict: The `wall`, `user` and `system` time in seconds and the `exit_code`, which is None after a timeout,
+            with the other resources, see `benchie.accounting`. With sampling, also the sampled `rss` run.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=cwd)  # noqa: S603
+    pin_to_core(process.pid, cpu)
+    sampler = RssSampler(process.pid, interval_ms=rss_interval_ms).start() if rss_interval_ms else None
+    deadline = None if timeout is None else start + timeout
+    timed_out = False
+    # wait without reaping instead of Popen.wait, to get the resource usage and I/O of the child
+    while not has_exited(process.pid, block=deadline is None):
+        if deadline and time.perf_counter() > deadline:
+            logger.error(f"Timeout after {timeout} s while running {command[:2]}")
+            process.send_signal(signal.SIGKILL)
+            timed_out = True
+            deadline = None
+        time.sleep(0.0005)
+    wall = time.perf_counter() - start
+    runs = sampler.stop() if sampler else []
+    exit_code, resources = reap(process.pid)
+    # the process is reaped by wait4, let Popen know
+    process.returncode = exit_code
+    sample = {
+        "wall": wall,
+        **resources,
+        "exit_code": None if timed_out else process.returncode,
+    }
+    if sampler:
+        sample["rss"] = {k: v for k, v in runs[0].items() if k != "cmdlines"} if runs else None
+    return sample
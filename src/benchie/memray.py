@@ -1,79 +1,155 @@
-import gc
-import importlib
+import json
 import subprocess
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import memray
 from loguru import logger
 
-from benchie.reporting import get_peak_memory_flamegraph
+from benchie.reporting import format_size, key_by_memory
+from benchie.runtime import solution_env
+from benchie.staging import staged_workdir
+from benchie.utils import create_command
 
 
-def create_memray_command(path, testfile, interpreter="python"):
-    module = path.name.removesuffix(".py")
-    fn_command = testfile.read_text()
-    # command = f"""import {module}; {module}.global_alignment(\\'{str(testfile)}\\')"""
-    command = f"""import {module}; {module}.{fn_command}
+def create_tracker_command(command, memray_bin, memory_interval_ms=10):
+    """Python code that runs a command under the memray tracker, to run in a worker process."""
+    return f"""import memray
+with memray.Tracker(
+    file_name={str(memray_bin)!r}, native_traces=False, follow_fork=True, memory_interval_ms={memory_interval_ms}
+):
+    exec({command!r})
+"""
+
+
+def read_memray_stats(memray_bin):
     """
-    return command
+    Read the peak memory and the summary statistics of a memray capture file, without rendering a report.
+
+    Returns
+    -------
+        dict: The peak memory in bytes and formatted, the total number of allocations and the duration in seconds.
+    """
+    reader = memray.FileReader(memray_bin)
+    try:
+        metadata = reader.metadata
+    finally:
+        reader.close()
+    return {
+        "peak_memory": metadata.peak_memory,
+        "peak": format_size(metadata.peak_memory),
+        "total_allocations": metadata.total_allocations,
+        "duration": (metadata.end_time - metadata.start_time).total_seconds(),
+    }
 
 
 def run_memray(
-    output, solution, testfile, workdir, memray_executable=None, use_tracker=False, timeout=None, memory_interval_ms=10
+    output,
+    solution,
+    testfile,
+    workdir,
+    memray_executable=None,
+    use_tracker=False,
+    timeout=None,
+    memory_interval_ms=10,
+    flamegraph=False,
 ):
+    """
+    Profile the memory of a solution in a worker process and return its peak memory.
+
+    With `use_tracker`, only the call of the test file is tracked. Otherwise, the whole run is tracked, including
+    the imports. The peak is read from the capture file; the flamegraph is only rendered on request.
+
+    Returns
+    -------
+        str: The formatted peak memory, or None if the run failed.
+    """
     if memray_executable is None:
-        memray_executable = (sys.executable + " -m memray").split()
+        memray_executable = [sys.executable, "-m", "memray"]
     memray_bin = output / (solution.stem + "_memray.bin")
-    # DANGER: arbitrary code import, only run on valid Dodona code!
-    # set working dir to that of the solution file
-    # os.chdir(solution.parent)
-    memray_cmd = create_memray_command(solution, testfile)
-    logger.debug(f"Created memray command: {memray_cmd}")
-    if use_tracker:
-        importlib.reload(memray)
-        gc.collect()
-        with memray.Tracker(
-            file_name=memray_bin,
-            native_traces=False,
-            follow_fork=True,
-            memory_interval_ms=memory_interval_ms,
-        ):
-            try:
-                exec(memray_cmd)
-            except Exception as e:
-                print(e)  # Output: Command 'exit 1' returned non-zero exit status 1.
-    else:
-        logger.debug(f"Running memray on {solution}")
-        # create Python file in temp folder, run memray module on it
-        temp_dir = Path(tempfile.mkdtemp())
-        # copy over
-        py_file = temp_dir / (solution.stem + "_memray.py")
-        py_file.write_text(memray_cmd)
+    # memray does not overwrite capture files
+    memray_bin.unlink(missing_ok=True)
+    command = create_command(solution, testfile)
+    logger.debug(f"Created memray command: {command}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if use_tracker:
+            memray_command = [sys.executable, "-c", create_tracker_command(command, memray_bin, memory_interval_ms)]
+        else:
+            # create Python file in temp folder, run memray module on it
+            py_file = Path(temp_dir) / (solution.stem + "_memray.py")
+            py_file.write_text(command)
+            memray_command = [*memray_executable, "run", "-o", str(memray_bin), "--follow-fork", "-q", str(py_file)]
+        # DANGER: arbitrary code run, only run on valid Dodona code!
         try:
-            subprocess.run(
-                memray_executable + ["run", "-o", str(memray_bin), "--follow-fork", "-q", str(py_file)],
-                check=True,
-                timeout=timeout,
-                env={"PYTHONPATH": str(solution.parent)},
-            )
+            subprocess.run(memray_command, check=True, timeout=timeout, env=solution_env(solution), cwd=workdir)
         except subprocess.CalledProcessError as e:
             logger.error(f"Memray failed with {e}")
             return None
         except subprocess.TimeoutExpired:
             logger.error(f"Timeout while memory profiling '{solution.stem}'")
             return None
-    memray_flamegraph = output / (solution.stem + "_flamegraph.html")
-    subprocess.run(
-        memray_executable
-        + [
-            "flamegraph",
-            "-o",
-            str(memray_flamegraph),
-            str(memray_bin),
-        ]
-    )
-    # get peak memory
-    peak_memory = get_peak_memory_flamegraph(memray_flamegraph)
-    return peak_memory
+    stats = read_memray_stats(memray_bin)
+    (output / (solution.stem + "_memray_stats.json")).write_text(json.dumps(stats, indent=2))
+    if flamegraph:
+        memray_flamegraph = output / (solution.stem + "_flamegraph.html")
+        subprocess.run([*memray_executable, "flamegraph", "-f", "-o", str(memray_flamegraph), str(memray_bin)])
+    return stats["peak"]
+
+
+def run_memray_all(
+    output,
+    all_correct_solutions,
+    testfile,
+    use_tracker=True,
+    runs=3,
+    timeout=None,
+    memory_intervals=None,
+    jobs=1,
+    flamegraph=False,
+):
+    """
+    Profile the memory of all solutions, with up to `jobs` worker processes at the same time.
+
+    Every solution runs `runs` times, each in its own workdir, and the median peak memory is written to
+    `<solution>_memray.txt`, or `<solution>_memray_imports.txt` without `use_tracker`.
+
+    Returns
+    -------
+        dict: The median peak memory per solution.
+    """
+    memory_intervals = memory_intervals or {}
+    prefix = "memray" if use_tracker else "memray_imports"
+    tasks = [(solution, i) for solution in all_correct_solutions for i in range(runs)]
+
+    def run(task):
+        solution, i = task
+        i_output = output / (f"{prefix}_{i}" if runs > 1 else prefix)
+        i_output.mkdir(exist_ok=True)
+        logger.debug(f"Running memray on {solution}, {i}")
+        with staged_workdir(testfile.parent) as workdir:
+            return run_memray(
+                i_output,
+                solution,
+                testfile,
+                workdir,
+                use_tracker=use_tracker,
+                timeout=timeout,
+                memory_interval_ms=memory_intervals.get(solution, 10),
+                # the runs are alike, one flamegraph is enough
+                flamegraph=flamegraph and i == 0,
+            )
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        peaks = list(executor.map(run, tasks))
+
+    medians = {}
+    for solution in all_correct_solutions:
+        solution_peaks = [peak for (s, _), peak in zip(tasks, peaks) if s == solution]
+        # get median peak memory usage, with support for KB and MB
+        median_peak = sorted(solution_peaks, key=key_by_memory)[len(solution_peaks) // 2]
+        logger.info(f"Median peak memory usage of {solution.stem}: {median_peak}")
+        medians[solution] = median_peak
+        (output / f"{solution.stem}_{prefix}.txt").write_text(str(median_peak))
+    return medians
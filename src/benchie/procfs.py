@@ -0,0 +1,225 @@
+import contextlib
+import json
+import os
+import statistics
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+
+PROC = Path("/proc")
+
+
+def _read(path):
+    try:
+        return path.read_text()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        # the process exited in the meantime
+        return ""
+
+
+def _fields_kb(text, names):
+    """
+    Sum the kB fields with the given names in a /proc status or smaps_rollup file, in bytes.
+
+    >>> _fields_kb("VmRSS:\\t 1772 kB\\nPrivate_Clean:  10 kB\\nPrivate_Dirty:  5 kB\\n", ("Private_Clean", "Private_Dirty"))
+    15360
+    """
+    total = 0
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        if key in names:
+            total += int(value.split()[0]) * 1024
+    return total
+
+
+def process_info(pid):
+    """Parent pid and command name of a process, from `/proc/<pid>/stat`, or None if it exited."""
+    stat = _read(PROC / str(pid) / "stat")
+    if not stat:
+        return None
+    # the command name is between parentheses and may contain spaces
+    comm = stat[stat.index("(") + 1 : stat.rindex(")")]
+    ppid = int(stat[stat.rindex(")") + 2 :].split()[1])
+    return ppid, comm
+
+
+def children(pid):
+    """Pids of the direct children of a process, forked by any of its threads."""
+    tasks = PROC / str(pid) / "task"
+    if (tasks / str(pid) / "children").exists():
+        pids = []
+        for task in tasks.glob("*"):
+            pids.extend(int(child) for child in _read(task / "children").split())
+        return pids
+    # kernels without CONFIG_PROC_CHILDREN
+    pids = []
+    for entry in PROC.iterdir():
+        if entry.name.isdigit():
+            info = process_info(entry.name)
+            if info and info[0] == pid:
+                pids.append(int(entry.name))
+    return pids
+
+
+def process_tree(pid):
+    """Pids of a process and all its descendants."""
+    pids = [pid]
+    for parent in pids:
+        pids.extend(children(parent))
+    return pids
+
+
+def cmdline(pid):
+    """Command line of a process, with its arguments separated by spaces."""
+    return _read(PROC / str(pid) / "cmdline").replace("\0", " ").strip()
+
+
+def memory(pid, uss=True):
+    """
+    Resident set size and unique set size of a process in bytes.
+
+    The USS, the memory that only this process uses, comes from `smaps_rollup`, which costs more to read.
+    """
+    rss = _fields_kb(_read(PROC / str(pid) / "status"), ("VmRSS",))
+    if not uss:
+        return rss, 0
+    return rss, _fields_kb(_read(PROC / str(pid) / "smaps_rollup"), ("Private_Clean", "Private_Dirty"))
+
+
+class RssSampler:
+    """
+    Poll the memory of a process tree in a background thread while it runs.
+
+    Every `interval_ms`, the RSS and USS of all processes in the tree are summed. With `group_under`, the processes
+    are grouped by the child of the process with that command name they descend from, e.g. one group per run of a
+    hyperfine process, so every run gets its own timeline. Processes with `exclude` in their command line, like a
+    wrapper that starts the run, are left out of the memory but still group their descendants.
+
+        sampler = RssSampler(process.pid, interval_ms=10).start()
+        process.wait()
+        runs = sampler.stop()
+    """
+
+    def __init__(self, pid, interval_ms=10, group_under=None, uss=True, exclude=None):
+        self.pid = pid
+        self.exclude = exclude
+        self.interval = interval_ms / 1000
+        self.group_under = group_under
+        self.uss = uss
+        self.groups = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the runs, see `runs`."""
+        self._stop.set()
+        self._thread.join()
+        return self.runs()
+
+    def _group(self, pid, info):
+        if self.group_under is None:
+            return self.pid
+        while pid in info:
+            ppid = info[pid][0]
+            if ppid in info and info[ppid][1] == self.group_under:
+                return pid
+            pid = ppid
+        return None
+
+    def _sample(self):
+        t_ms = round((time.perf_counter() - self._start) * 1000)
+        info = {}
+        for pid in process_tree(self.pid):
+            pid_info = process_info(pid)
+            if pid_info:
+                info[pid] = pid_info
+        totals = {}
+        for pid in info:
+            group = self._group(pid, info)
+            if group is None:
+                continue
+            pid_cmdline = cmdline(pid)
+            if self.exclude and self.exclude in pid_cmdline:
+                continue
+            rss, uss = memory(pid, uss=self.uss)
+            if not rss:
+                # a zombie, or a kernel thread
+                continue
+            total = totals.setdefault(group, [0, 0])
+            total[0] += rss
+            total[1] += uss
+            self.groups.setdefault(group, {"cmdlines": set(), "timeline": []})["cmdlines"].add(pid_cmdline)
+        for group, (rss, uss) in totals.items():
+            self.groups[group]["timeline"].append([t_ms, rss // 1024, uss // 1024])
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def runs(self):
+        """
+        Sampled runs in the order they started.
+
+        Returns
+        -------
+            list[dict]: The peak RSS and USS in bytes, the timeline as `[ms, RSS kB, USS kB]` and the command lines
+                of every run.
+        """
+        runs = []
+        for group in self.groups.values():
+            timeline = group["timeline"]
+            if not timeline:
+                continue
+            runs.append({
+                "peak_rss": max(t[1] for t in timeline) * 1024,
+                "peak_uss": max(t[2] for t in timeline) * 1024,
+                "timeline": timeline,
+                "cmdlines": sorted(group["cmdlines"]),
+            })
+        return runs
+
+
+def summarize_rss(name, runs):
+    """Summarize the sampled runs of a solution, with the median of the peaks over the runs."""
+    return {
+        "command": name,
+        "peak_rss": statistics.median(run["peak_rss"] for run in runs) if runs else None,
+        "peak_uss": statistics.median(run["peak_uss"] for run in runs) if runs else None,
+        "n_runs": len(runs),
+        "runs": [{k: v for k, v in run.items() if k != "cmdlines"} for run in runs],
+    }
+
+
+def write_rss_json(json_path, runs_by_name):
+    """Write the sampled runs of all solutions to `<data>_rss.json`."""
+    results = [summarize_rss(name, runs) for name, runs in runs_by_name.items()]
+    json_path.write_text(json.dumps({"results": results}), encoding="utf8")
+    logger.info(f"Wrote RSS timelines of {len(results)} solution(s) to {json_path}")
+    return results
+
+
+def pin_to_core(pid, cpu):
+    """
+    Pin a running process to a core, or to a set of cores, the children it starts afterwards inherit the affinity.
+
+    Unlike a `preexec_fn`, this is safe to call from the threads of `run_on_cores`. Does nothing without a core or
+    on platforms without CPU affinity.
+    """
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return
+    # the process may have exited in the meantime
+    with contextlib.suppress(ProcessLookupError):
+        os.sched_setaffinity(pid, cpu if isinstance(cpu, (set, frozenset)) else {cpu})
+
+
+def can_sample():
+    """Whether this platform has the procfs files the sampler reads."""
+    return (PROC / str(os.getpid()) / "status").exists()
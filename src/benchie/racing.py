@@ -0,0 +1,124 @@
+import json
+import sys
+
+from loguru import logger
+
+from benchie.adaptive import summarize_samples
+from benchie.measure import measure
+from benchie.runtime import run_on_cores, solution_env
+from benchie.stats import confidence_interval
+from benchie.utils import create_command
+
+
+def race(solutions, run, rounds=5, runs_per_round=3, factor=1.0, jobs=1, seed_samples=None):
+    """
+    Benchmark solutions in rounds and drop the ones that are clearly slower than the leader after every round.
+
+    A solution is eliminated when the lower bound of the 95% confidence interval of its mean time is more than
+    `factor` times the upper bound of the leader. The runs of eliminated solutions go to the remaining contenders,
+    so every round spends the same budget as the first one.
+
+    Args:
+        solutions (list): Solutions to race.
+        run (callable): `run(solution, cpu)` measures a single run of a solution, as returned by `measure`.
+        rounds (int): Number of rounds.
+        runs_per_round (int): Number of runs per solution in the first round.
+        factor (float): How much slower than the leader a solution has to be to be eliminated.
+        jobs (int): Number of solutions to run at the same time.
+        seed_samples (dict): Runs that were already measured per solution, e.g. the pretest run. They count as the
+            first runs of the first round.
+
+    Returns
+    -------
+        tuple[dict, dict]: The samples per solution and the round in which each eliminated solution was dropped.
+    """
+    seed_samples = seed_samples or {}
+    samples = {solution: [seed_samples[solution]] if solution in seed_samples else [] for solution in solutions}
+    eliminated = {}
+    contenders = list(solutions)
+    budget = runs_per_round * len(solutions)
+    for k in range(1, rounds + 1):
+        n_runs = max(runs_per_round, budget // len(contenders))
+        logger.info(f"Racing round {k}: {len(contenders)} contender(s), {n_runs} run(s) each")
+
+        def run_contender(solution, cpu, n_runs=n_runs, k=k):
+            # the seed samples are the first runs of the first round
+            n_seeded = len(samples[solution]) if k == 1 else 0
+            return [run(solution, cpu) for _ in range(n_runs - n_seeded)]
+
+        for solution, new_samples in zip(contenders, run_on_cores(run_contender, contenders, jobs)):
+            samples[solution].extend(new_samples)
+            if any(s["exit_code"] != 0 for s in new_samples):
+                logger.warning(f"Eliminating {solution} in round {k}, it failed")
+                eliminated[solution] = k
+        contenders = [solution for solution in contenders if solution not in eliminated]
+        if not contenders:
+            break
+        intervals = {solution: confidence_interval([s["wall"] for s in samples[solution]]) for solution in contenders}
+        leader = min(contenders, key=lambda x: intervals[x][0])
+        for solution in contenders:
+            if solution != leader and intervals[solution][1] > factor * intervals[leader][2]:
+                logger.info(f"Eliminating {solution} in round {k}, it is slower than {leader}")
+                eliminated[solution] = k
+        contenders = [solution for solution in contenders if solution not in eliminated]
+    return samples, eliminated
+
+
+def run_racing_all(
+    output,
+    all_correct_solutions,
+    testfile,
+    rounds=5,
+    factor=1.0,
+    timeout=None,
+    jobs=1,
+    seed_samples=None,
+    pool=None,
+    rss_interval_ms=None,
+):
+    """
+    Race all solutions in a fresh interpreter per run, see `race`.
+
+    The results are written to `<data>_racing.json` in the format of a hyperfine JSON export. Eliminated solutions
+    keep the statistics of their runs so far, with the round they were eliminated in. With a `ContainerPool`, the
+    runs are a `docker exec` in a container of the pool instead of a run on the host. With `rss_interval_ms`, the
+    memory of every run on the host is sampled and the median peak RSS is added to the results.
+
+    Returns
+    -------
+        dict: The results, or None if there was nothing to benchmark.
+    """
+    name = testfile.stem
+    if len(all_correct_solutions) == 0:
+        logger.error("No valid solutions to benchmark.")
+        return
+
+    def run(solution, cpu):
+        if pool is not None:
+            return pool.run(solution, testfile, timeout=timeout)
+        command = [sys.executable, "-c", create_command(solution, testfile)]
+        # DANGER: arbitrary code run, only run on valid Dodona code!
+        return measure(
+            command,
+            env=solution_env(solution),
+            timeout=timeout,
+            cpu=cpu,
+            rss_interval_ms=rss_interval_ms,
+        )
+
+    jobs = pool.size if pool is not None else jobs
+    samples, eliminated = race(
+        all_correct_solutions, run, rounds=rounds, factor=factor, jobs=jobs, seed_samples=seed_samples
+    )
+    results = [
+        summarize_samples(
+            solution.stem,
+            samples[solution],
+            n_samples=len(samples[solution]),
+            eliminated_round=eliminated.get(solution),
+        )
+        for solution in all_correct_solutions
+    ]
+    racing = {"results": results}
+    (output / f"{name}_racing.json").write_text(json.dumps(racing, indent=2), encoding="utf8")
+    return racing
@@ -0,0 +1,198 @@
+"""
+Performance regressions of a student between versions of their solution.
+
+After every run on a dataset, the times of every student are kept with the hash of their solution. When a new
+version of a solution runs, its times are compared with the times of the previous version with a Mann-Whitney U test,
+so only a significant change is reported as a regression or an improvement.
+
+A student is the Dodona user of a fetched submission, whose solution file is named after the latest submission, or
+the name of the solution otherwise, e.g. the folder of a subgit or classroom repository.
+"""
+
+import json
+import math
+import statistics
+
+from loguru import logger
+
+from benchie.cache import hash_tree
+from benchie.fetch_submissions import student_ids
+from benchie.reporting import TIMING_ENGINES
+
+# timing outputs with the times of every run, in order of preference, relative to the test file name
+TIMING_FILES = ["{}_benchmark.json", *(f"{{}}_{engine}.json" for engine in TIMING_ENGINES)]
+
+
+def rank(values):
+    """
+    Ranks of the values, starting at 1, with the mean rank for ties.
+
+    >>> rank([3.0, 1.0, 3.0, 2.0])
+    [3.5, 1.0, 3.5, 2.0]
+    """
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def mann_whitney_u(x, y):
+    """
+    Two-sided Mann-Whitney U test, with the normal approximation and a correction for ties.
+
+    Returns
+    -------
+        tuple[float, float]: The U statistic of `x` and the p-value.
+
+    >>> u, p = mann_whitney_u([1.0, 1.1, 1.2, 1.3, 1.4], [2.0, 2.1, 2.2, 2.3, 2.4])
+    >>> u, round(p, 4)
+    (0.0, 0.0122)
+    """
+    n1, n2 = len(x), len(y)
+    ranks = rank([*x, *y])
+    u = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    # the variance of U shrinks with every group of tied values
+    counts = {}
+    for value in [*x, *y]:
+        counts[value] = counts.get(value, 0) + 1
+    ties = sum(t**3 - t for t in counts.values())
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    # continuity correction
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+def compare_times(old, new, alpha=0.05):
+    """
+    Compare the times of two versions of a solution.
+
+    The effect size is the rank-biserial correlation, from -1 when every new run is faster than every old run to 1
+    when every new run is slower.
+
+    Returns
+    -------
+        dict: The medians, the relative change of the median, the U statistic, the p-value, the effect size and the
+            verdict: `regression`, `improvement` or `unchanged`.
+
+    >>> compare_times([1.0, 1.1, 1.2, 1.3, 1.4], [2.0, 2.1, 2.2, 2.3, 2.4])["verdict"]
+    'regression'
+    """
+    u, p = mann_whitney_u(new, old)
+    effect_size = 2 * u / (len(old) * len(new)) - 1
+    old_median, new_median = statistics.median(old), statistics.median(new)
+    verdict = "unchanged"
+    if p < alpha:
+        verdict = "regression" if new_median > old_median else "improvement"
+    return {
+        "old_median": old_median,
+        "new_median": new_median,
+        "change": new_median / old_median - 1,
+        "u": u,
+        "p": p,
+        "effect_size": effect_size,
+        "n_old": len(old),
+        "n_new": len(new),
+        "verdict": verdict,
+    }
+
+
+def read_times(output, name):
+    """Times of every solution in the first timing output of a dataset with the times of every run."""
+    for timing_file in TIMING_FILES:
+        json_path = output / timing_file.format(name)
+        if json_path.exists():
+            results = json.loads(json_path.read_text(encoding="utf8"))["results"]
+            return {c["command"]: c["times"] for c in results if c.get("times")}
+    return {}
+
+
+def create_regression_table(comparisons):
+    r"""
+    Markdown table of the compared solutions, the significant changes first.
+
+    >>> create_regression_table({"a": {"old_median": 1.0, "new_median": 2.0, "change": 1.0, "p": 0.01,
+    ...     "effect_size": 1.0, "verdict": "regression"}}).splitlines()[2]
+    ' | `a` | 1.000 | 2.000 | +100.0% | 0.010 | 1.00 | regression ⚠ | '
+    """
+    d = " | "
+    header = ["Command", "Old median [s]", "New median [s]", "Change", "p-value", "Effect size", "Verdict"]
+    output = [d + d.join(header) + d, d + d.join([":---", *["---:" for _ in range(len(header) - 1)]]) + d]
+    for name, c in sorted(comparisons.items(), key=lambda x: (x[1]["verdict"] == "unchanged", x[1]["p"])):
+        columns = [
+            f"`{name}`",
+            f"{c['old_median']:.3f}",
+            f"{c['new_median']:.3f}",
+            f"{c['change'] * 100:+.1f}%",
+            f"{c['p']:.3f}",
+            f"{c['effect_size']:.2f}",
+            c["verdict"] + (" ⚠" if c["verdict"] == "regression" else ""),
+        ]
+        output.append(d + d.join(columns) + d)
+    return "\n".join(output)
+
+
+def detect_regressions(testfile, output, previous, solutions, alpha=0.05):
+    """
+    Compare the times of the new versions of the solutions on a dataset with the times of their previous version.
+
+    The times and the source hash of every student are kept in `<previous>/<data>.json`. A solution with a
+    changed source is compared with the previous version of its student and the comparisons are written to
+    `<data>_regressions.md` and `<data>_regressions.json`.
+
+    Args:
+        testfile (Path): The test file of the dataset.
+        output (Path): The output folder of the dataset.
+        previous (Path): The folder to keep the times of the previous versions in, outside the output folder.
+        solutions (list[Path]): The solutions.
+        alpha (float): Significance level of a change.
+
+    Returns
+    -------
+        dict: The comparison per solution with a new version, see `compare_times`.
+    """
+    name = testfile.stem
+    times = read_times(output, name)
+    previous_path = previous / f"{name}.json"
+    kept = json.loads(previous_path.read_text(encoding="utf8")) if previous_path.exists() else {}
+    students = {}
+    for folder in {solution.parent for solution in solutions}:
+        students.update(student_ids(folder))
+    comparisons = {}
+    for solution in solutions:
+        if solution.stem not in times:
+            continue
+        student = students.get(solution.stem, solution.stem)
+        solution_hash = hash_tree(solution)
+        old = kept.get(student)
+        if old and old["hash"] != solution_hash:
+            comparison = compare_times(old["times"], times[solution.stem], alpha=alpha)
+            comparisons[solution.stem] = comparison
+            if comparison["verdict"] != "unchanged":
+                logger.info(
+                    f"{comparison['verdict'].capitalize()} of '{solution.stem}' on {name}: "
+                    f"{comparison['change'] * 100:+.1f}% (p={comparison['p']:.3f})"
+                )
+        kept[student] = {"solution": solution.stem, "hash": solution_hash, "times": times[solution.stem]}
+    previous.mkdir(parents=True, exist_ok=True)
+    previous_path.write_text(json.dumps(kept), encoding="utf8")
+
+    md_path = output / f"{name}_regressions.md"
+    json_path = output / f"{name}_regressions.json"
+    if comparisons:
+        json_path.write_text(json.dumps(comparisons, indent=2), encoding="utf8")
+        md_path.write_text(create_regression_table(comparisons))
+    else:
+        # the output files are kept between runs, do not report the changes of an earlier run
+        md_path.unlink(missing_ok=True)
+        json_path.unlink(missing_ok=True)
+    return comparisons
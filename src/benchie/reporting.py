@@ -46,6 +46,10 @@ def get_peak_memory_tree(output):
     return d
 
 
+# scale of the memory units, relative to MB
+MEMORY_UNITS = {"": 1e-6, "K": 1e-3, "M": 1, "G": 1e3, "T": 1e6}
+
+
 def key_by_memory(s):
     """_summary_
 
@@ -55,16 +59,32 @@ def key_by_memory(s):
     1.0
     >>> key_by_memory('1.0 GB')
     1000.0
+    >>> key_by_memory('12.346MB')
+    12.346
+    >>> key_by_memory('2.048kB')
+    0.002048
     """
-    if s.endswith("KB") or s.endswith("KiB"):
-        return float(s[:-3]) / 1000
-    elif s.endswith("MB") or s.endswith("MiB"):
-        return float(s[:-3])
-    elif s.endswith("GB") or s.endswith("GiB"):
-        return float(s[:-3]) * 1000
-    else:
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([KMGT]?)i?B\s*", str(s), flags=re.IGNORECASE)
+    if not match:
         # e.g. None
         return float("inf")
+    return float(match.group(1)) * MEMORY_UNITS[match.group(2).upper()]
+
+
+def format_size(num):
+    """
+    Format a size in bytes like the peak memory in a memray report, see `key_by_memory`.
+
+    >>> format_size(12345678)
+    '12.346MB'
+    >>> format_size(500)
+    '500.000B'
+    """
+    for unit in ["", "K", "M", "G"]:
+        if abs(num) < 1000:
+            return f"{num:.3f}{unit}B"
+        num /= 1000
+    return f"{num:.3f}TB"
 
 
 def make_relative(d):
@@ -84,7 +104,97 @@ def make_relative(d):
     return d_relative
 
 
-def create_table(with_imports, with_tracker, timings=None):
+# timing engines besides hyperfine, that write a hyperfine JSON export to `<data>_<engine>.json`
+TIMING_ENGINES = ["forkserver", "adaptive", "racing"]
+# scale of the time units in a table, relative to seconds
+TIME_UNITS = {"s": 1, "ms": 1e3, "µs": 1e6, "ns": 1e9}
+
+
+def time_unit(timings):
+    """
+    Largest time unit in which the fastest mean is at least 1.
+
+    >>> time_unit({"results": [{"mean": 0.0042}, {"mean": 1.5}]})
+    'ms'
+    >>> time_unit({"results": [{"mean": 2.0}]})
+    's'
+    """
+    fastest = min((c["mean"] for c in timings["results"]), default=1)
+    for unit, scale in TIME_UNITS.items():
+        if fastest * scale >= 1:
+            return unit
+    return "ns"
+
+
+def has_rss(timings):
+    """Whether the memory of the timed runs was sampled, see `benchie.procfs`."""
+    return bool(timings) and any(c.get("peak_rss") is not None for c in timings["results"])
+
+
+def resource_columns(resources):
+    """
+    Columns with the CPU utilisation, context switches and I/O of a solution, see `benchie.accounting`.
+
+    >>> resource_columns({"cpu": 0.985, "voluntary_cs": 3, "involuntary_cs": 12, "rchar": 2_000_000, "wchar": 0})
+    ['98.5', '3 / 12', '2.000MB / 0.000B']
+    """
+    if not resources:
+        return ["", "", ""]
+    return [
+        f"{resources['cpu'] * 100:.1f}" if "cpu" in resources else "",
+        f"{resources.get('voluntary_cs', 0):.0f} / {resources.get('involuntary_cs', 0):.0f}",
+        f"{format_size(resources.get('rchar', 0))} / {format_size(resources.get('wchar', 0))}",
+    ]
+
+
+def _timing_columns(c, scale):
+    """
+    The command, mean, min and max columns of a hyperfine result, in the unit of `scale`.
+
+    >>> _timing_columns({"command": "a", "mean": 2.0, "stddev": 0.1, "min": 1.9, "max": 2.1, "eliminated_round": 1}, 1)
+    ['`a` (eliminated in round 1)', '2.000 ± 0.100', '1.900', '2.100']
+    """
+    command = f"`{c['command']}`"
+    if c.get("eliminated_round"):
+        command += f" (eliminated in round {c['eliminated_round']})"
+    return [
+        f"{x:.3f}" if isinstance(x, float) else str(x)
+        for x in [
+            command,
+            # mean + stdev,
+            f"{c['mean'] * scale:.3f} ± {c['stddev'] * scale:.3f}",
+            # min,
+            c["min"] * scale,
+            # max,
+            c["max"] * scale,
+        ]
+    ]
+
+
+def _memory_table(with_imports, with_tracker):
+    """The lines of a table of the memory peaks of the solutions, ranked on their peak."""
+    d = " | "
+    header = ["Command"]
+    if with_imports:
+        header.append("(with_imports) Peak memory")
+    if with_tracker:
+        header.append("(with_tracker) Median peak memory")
+    header.append("Rank")
+    output = [d + d.join(header) + d, d + d.join([":---", *["---:" for _ in range(len(header) - 1)]]) + d]
+
+    relative_peaks = make_relative(with_imports or with_tracker)
+    for k in relative_peaks:
+        columns = [f"`{k}`"]
+        if with_imports:
+            columns.append(with_imports[k])
+        if with_tracker:
+            columns.append(with_tracker[k])
+        columns.append(str(relative_peaks[k]))
+        output.append(d + d.join([str(c) for c in columns]) + d)
+    return output
+
+
+def create_table(with_imports, with_tracker, timings=None, unit="s", resources=None):
     r"""
     Expected output:
 
@@ -97,31 +207,29 @@ def create_table(with_imports, with_tracker, timings=None):
     ' | Command | Peak memory | Rank | \n | :--- | ---: | ---: | \n | `13309298` |  |  |  | 1.0 MB | 0 | '
     >>> create_table({'13309298': '1.0 MB'}, {'results': [{'command': '13309298', 'mean': 4.5, 'stddev': 0.036, 'min': 4.474, 'max': 4.541}]})
     ' | Command | Mean [s] | Min [s] | Max [s] | Peak memory | Rank | \n | :--- | ---: | ---: | ---: | ---: | ---: | \n | `13309298` | 4.500 ± 0.036 | 4.474 | 4.541 | 1.0 MB | 0 | '
+
+    Without memory profiles, the solutions are ranked on their mean time.
+
+    >>> create_table({}, {}, {'results': [{'command': 'a', 'mean': 0.002, 'stddev': 0.0001, 'min': 0.0019, 'max': 0.0021}]}, unit="ms").splitlines()
+    [' | Command | Mean [ms] | Min [ms] | Max [ms] | Rank | ', ' | :--- | ---: | ---: | ---: | ---: | ', ' | `a` | 2.000 ± 0.100 | 1.900 | 2.100 | 0 | ']
+
+    The peak RSS sampled during the timed runs gets its own column, and so do the resources of the runs.
+
+    >>> create_table({}, {}, {'results': [{'command': 'a', 'mean': 2.0, 'stddev': 0.1, 'min': 1.9, 'max': 2.1, 'peak_rss': 12345678}]}).splitlines()[2]
+    ' | `a` | 2.000 ± 0.100 | 1.900 | 2.100 | 12.346MB | 0 | '
     """
     output = []
     d = " | "
 
     if timings is None:
-        header = ["Command"]
-        if with_imports:
-            header.append("(with_imports) Peak memory")
-        if with_tracker:
-            header.append("(with_tracker) Median peak memory")
-        header.append("Rank")
-        output.append(d + d.join(header) + d)
-        output.append(d + d.join([":---", *["---:" for _ in range(len(header) - 1)]]) + d)
-
-        relative_peaks = make_relative(with_imports or with_tracker)
-        for k in relative_peaks:
-            columns = [f"`{k}`"]
-            if with_imports:
-                columns.append(with_imports[k])
-            if with_tracker:
-                columns.append(with_tracker[k])
-            columns.append(str(relative_peaks[k]))
-            output.append(d + d.join([str(c) for c in columns]) + d)
+        output = _memory_table(with_imports, with_tracker)
     else:
-        header = ["Command", "Mean [s]", "Min [s]", "Max [s]"]
+        with_rss = has_rss(timings)
+        resources = resources or {}
+        with_resources = bool(resources) or any(c.get("resources") for c in timings["results"])
+        header = ["Command", f"Mean [{unit}]", f"Min [{unit}]", f"Max [{unit}]"]
+        header.extend(["Peak RSS"] if with_rss else [])
+        header.extend(["CPU [%]", "Context switches (vol / invol)", "Read / write"] if with_resources else [])
         if with_imports:
             header.append("(with_imports) Peak memory")
         if with_tracker:
@@ -129,21 +237,18 @@ def create_table(with_imports, with_tracker, timings=None):
         header.append("Rank")
         output.append(d + d.join(header) + d)
         output.append(d + d.join([":---", *["---:" for _ in range(len(header) - 1)]]) + d)
-        d_relative = make_relative(with_imports or with_tracker)
+        if with_imports or with_tracker:
+            d_relative = make_relative(with_imports or with_tracker)
+        else:
+            sort_timings = sorted(timings["results"], key=lambda x: x["mean"])
+            d_relative = {c["command"]: i for i, c in enumerate(sort_timings)}
         for c in timings["results"]:
             name = c["command"]
-            columns = [
-                f"{x:.3f}" if isinstance(x, float) else str(x)
-                for x in [
-                    f"`{name}`",
-                    # mean + stdev,
-                    f"{c['mean']:.3f} ± {c['stddev']:.3f}",
-                    # min,
-                    c["min"],
-                    # max,
-                    c["max"],
-                ]
-            ]
+            columns = _timing_columns(c, TIME_UNITS[unit])
+            if with_rss:
+                columns.append(format_size(c["peak_rss"]) if c.get("peak_rss") is not None else "")
+            if with_resources:
+                columns.extend(resource_columns(c.get("resources") or resources.get(name)))
             if with_imports:
                 columns.append(with_imports[name])
             if with_tracker:
@@ -153,26 +258,148 @@ def create_table(with_imports, with_tracker, timings=None):
     return "\n".join(output)
 
 
-def postprocess_output(path, output):
+def get_scalene_hotspots(profile, top=10):
+    """
+    Top CPU and memory hotspots of the functions and the lines in a scalene JSON profile.
+
+    An entry is a hotspot when it is in the top `top` of the CPU time, or of the peak memory. The CPU time is the
+    percentage of the total, in Python, native code and the system.
+
+    >>> profile = {"files": {"/s/a.py": {"functions": [], "lines": [
+    ...     {"lineno": 1, "line": "x = f()\\n", "n_cpu_percent_python": 80.0, "n_cpu_percent_c": 5.0,
+    ...      "n_sys_percent": 1.0, "n_peak_mb": 0.0, "n_malloc_mb": 0.0},
+    ...     {"lineno": 2, "line": "pass\\n", "n_cpu_percent_python": 0.0, "n_cpu_percent_c": 0.0,
+    ...      "n_sys_percent": 0.0, "n_peak_mb": 0.0, "n_malloc_mb": 0.0},
+    ...     {"lineno": 3, "line": "y = [0] * n\\n", "n_cpu_percent_python": 0.0, "n_cpu_percent_c": 0.0,
+    ...      "n_sys_percent": 0.0, "n_peak_mb": 8.0, "n_malloc_mb": 8.0}]}}}
+    >>> [(h["lineno"], h["cpu"]) for h in get_scalene_hotspots(profile, top=1)["lines"]]
+    [(1, 86.0), (3, 0.0)]
+    """
+    hotspots = {}
+    for kind in ("functions", "lines"):
+        entries = []
+        for file, file_profile in profile.get("files", {}).items():
+            for entry in file_profile.get(kind, []):
+                entries.append({
+                    "file": file,
+                    "lineno": entry["lineno"],
+                    "code": entry["line"].strip(),
+                    "cpu": entry.get("n_cpu_percent_python", 0)
+                    + entry.get("n_cpu_percent_c", 0)
+                    + entry.get("n_sys_percent", 0),
+                    "peak_mb": entry.get("n_peak_mb", 0),
+                    "malloc_mb": entry.get("n_malloc_mb", 0),
+                })
+        by_cpu = sorted(entries, key=lambda e: e["cpu"], reverse=True)[:top]
+        by_memory = sorted(entries, key=lambda e: e["peak_mb"], reverse=True)[:top]
+        selected = [e for e in by_cpu if e["cpu"] > 0]
+        selected += [e for e in by_memory if e["peak_mb"] > 0 and e not in selected]
+        hotspots[kind] = sorted(selected, key=lambda e: (e["cpu"], e["peak_mb"]), reverse=True)
+    return hotspots
+
+
+def get_all_hotspots(output, top=10):
+    """Hotspots of the scalene profiles in `scalene/<solution>_scalene.json`, see `benchie.scalene`."""
+    d = {}
+    for p in sorted(output.glob("scalene/*_scalene.json")):
+        name = p.stem.removesuffix("_scalene")
+        d[name] = get_scalene_hotspots(json.loads(p.read_text(encoding="utf8")), top=top)
+    return d
+
+
+def create_hotspot_table(hotspots):
+    r"""
+    Markdown tables with the function and line hotspots of every solution, see `get_scalene_hotspots`.
+
+    >>> create_hotspot_table({"a": {"functions": [], "lines": [
+    ...     {"file": "/s/a.py", "lineno": 1, "code": "x = f()", "cpu": 86.0, "peak_mb": 0.0, "malloc_mb": 0.0}]}}).splitlines()
+    ['## `a`', '', ' | Line | Code | CPU [%] | Peak memory [MB] | Allocated [MB] | ', ' | :--- | :--- | ---: | ---: | ---: | ', ' | `a.py:1` | `x = f()` | 86.0 | 0.000 | 0.000 | ']
+    """
+    output = []
+    d = " | "
+    for name, kinds in hotspots.items():
+        output.append(f"## `{name}`")
+        for kind, title in (("functions", "Function"), ("lines", "Line")):
+            if not kinds[kind]:
+                continue
+            output.append("")
+            header = [title, "Code", "CPU [%]", "Peak memory [MB]", "Allocated [MB]"]
+            output.append(d + d.join(header) + d)
+            output.append(d + d.join([":---", ":---", "---:", "---:", "---:"]) + d)
+            for e in kinds[kind]:
+                # pipes would break the table
+                code = e["code"].replace("|", "\\|")
+                columns = [
+                    f"`{e['file'].rsplit('/', 1)[-1]}:{e['lineno']}`",
+                    f"`{code}`",
+                    f"{e['cpu']:.1f}",
+                    f"{e['peak_mb']:.3f}",
+                    f"{e['malloc_mb']:.3f}",
+                ]
+                output.append(d + d.join(columns) + d)
+        output.append("")
+    return "\n".join(output)
+
+
+def _load_timings(output, name, engine, history=None, exercise=None):
+    # the results of an engine from the history, or from its JSON export in the output folder
+    if history is not None:
+        return history.timings(name, engine=engine, exercise=exercise)
+    json_path = output / (f"{name}_benchmark.json" if engine == "hyperfine" else f"{name}_{engine}.json")
+    if json_path.exists():
+        return json.loads(json_path.read_text(encoding="utf8"))
+    return None
+
+
+def postprocess_output(path, output, history=None, exercise=None):
+    """
+    Write the markdown tables of a dataset to its output folder.
+
+    With a `benchie.history.History`, the timings and the memory peaks of the last iteration are read from the
+    history database instead of the output files.
+    """
     name = path.stem
     any_output = False
 
     # add hyperfine output
-    timings = None
-    json_path = output / (name + "_benchmark.json")
-    if json_path.exists():
+    timings = _load_timings(output, name, "hyperfine", history, exercise)
+    if timings:
         any_output = True
-        timings = json.loads(json_path.read_text(encoding="utf8"))
+
+    # add resources of the hyperfine runs, or of the pretest
+    resources = {}
+    resources_path = output / (name + "_resources.json")
+    if resources_path.exists():
+        resources = {c["command"]: c for c in json.loads(resources_path.read_text(encoding="utf8"))["results"]}
 
     ## add memray output
-    with_imports, with_tracker = get_all_peak_memory(output)
-    if with_imports or with_tracker:
+    if history is not None:
+        with_imports, with_tracker = history.peaks(name, exercise=exercise)
+    else:
+        with_imports, with_tracker = get_all_peak_memory(output)
+    if with_imports or with_tracker or has_rss(timings) or (timings and resources):
         any_output = True
         # run only if memory profiling present
-        table = create_table(with_imports, with_tracker, timings=timings)
+        table = create_table(with_imports, with_tracker, timings=timings, resources=resources)
         table_path = output / (name + "_memory_benchmark.md")
         table_path.write_text(table)
 
+    # add output of the other timing engines, e.g. the forkserver times are usually too fast to show in seconds
+    for engine in TIMING_ENGINES:
+        engine_timings = _load_timings(output, name, engine, history, exercise)
+        if engine_timings:
+            any_output = True
+            table = create_table(with_imports, with_tracker, timings=engine_timings, unit=time_unit(engine_timings))
+            table_path = output / f"{name}_{engine}_benchmark.md"
+            table_path.write_text(table)
+
+    # add the scalene hotspots
+    hotspots = get_all_hotspots(output)
+    if hotspots:
+        any_output = True
+        table_path = output / (name + "_hotspots.md")
+        table_path.write_text(create_hotspot_table(hotspots))
+
     if not any_output:
         logger.info("No output to process")
         return
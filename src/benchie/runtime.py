@@ -1,10 +1,22 @@
+import itertools
+import json
+import os
+import queue
+import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from loguru import logger
 
-from benchie.utils import create_command
+from benchie import accounting
+from benchie.accounting import write_resources_json
+from benchie.events import events
+from benchie.forkserver import run_forkserver
+from benchie.interference import InterferenceMonitor, interference_note, remeasure, write_interference_json
+from benchie.procfs import RssSampler, pin_to_core, write_rss_json
+from benchie.utils import create_command, solution_module
 
 import re
 
@@ -16,7 +28,63 @@ def _conclude_cmd(module_path):
     return f'import pathlib; import shutil; [shutil.rmtree(p) for p in pathlib.Path("{module_path!s}").rglob("__pycache__")]'
 
 
-def run_hyperfine_process_docker(docker_image, testfile, module_path, json_path, md_path, warmup, min_runs, names):
+def available_cores(jobs):
+    """
+    List of CPU cores to pin `jobs` parallel benchmark jobs to, one core per job.
+
+    The first core is left free for benchie itself and the OS when there are enough cores.
+    Returns `[None]` if the platform does not support CPU affinity.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [None]
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) > jobs:
+        cores = cores[1:]
+    return cores[: max(jobs, 1)]
+
+
+def run_on_cores(fn, items, jobs, durations=None):
+    """
+    Call `fn(item, cpu)` for every item, with at most one call per core at the same time.
+
+    With `durations`, the items with the longest expected duration start first, so the cores stay busy until the end.
+
+    Returns
+    -------
+        list: The results of `fn`, in the order of `items`.
+    """
+    cores: queue.Queue[int] = queue.Queue()
+    for cpu in available_cores(jobs):
+        cores.put(cpu)
+
+    def run(item):
+        cpu = cores.get()
+        try:
+            return fn(item, cpu)
+        finally:
+            cores.put(cpu)
+
+    order = list(range(len(items)))
+    if durations:
+        order.sort(key=lambda i: durations.get(items[i], 0), reverse=True)
+    with ThreadPoolExecutor(max_workers=cores.qsize()) as executor:
+        futures = {i: executor.submit(run, items[i]) for i in order}
+        return [futures[i].result() for i in range(len(items))]
+
+
+def run_hyperfine_process_docker(
+    docker_image,
+    testfile,
+    module_path,
+    json_path,
+    md_path,
+    warmup,
+    min_runs,
+    names,
+    cpu=None,
+    max_runs=None,
+    record_path=None,
+):
     output = json_path.parent.resolve()
     destination_root = "/submission"
     destination_output = f"{destination_root}/{output.name}"
@@ -27,33 +95,38 @@ def run_hyperfine_process_docker(docker_image, testfile, module_path, json_path,
     json_path = destination_output + "/" + json_path.name
     md_path = destination_output + "/" + md_path.name
     executable = "'uv run --frozen --no-sync python'"
+    mount_accounting = ""
+    if record_path is not None:
+        # account the resources of every run in the container, the shell runs in the uv environment
+        mount_accounting = f"--mount type=bind,source={accounting.__file__},destination=/benchie/accounting.py,readonly"
+        record = f"{destination_output}/{Path(record_path).name}"
+        executable = f"'uv run --frozen --no-sync python -S /benchie/accounting.py --record {record} python'"
     subcommand = create_command(module_path, testfile)
     cmd_conclude = _conclude_cmd(src)
     logger.debug(f"Executable: {executable}")
     logger.debug(f"Subcommand: {subcommand}")
     logger.debug(f"Conclude command: {cmd_conclude}")
+    max_runs = f"-M {max_runs}" if max_runs else ""
     command = f"""
         hyperfine --ignore-failure --export-json {json_path!s} --export-markdown {md_path!s} \
-            -w {warmup} -m {min_runs} --shell {executable} --show-output --conclude \'{cmd_conclude}\' \
+            -w {warmup} -m {min_runs} {max_runs} --shell {executable} --show-output --conclude \'{cmd_conclude}\' \
             {" ".join(["-n " + x for x in names])} \
             -L module {",".join(names)} \'{subcommand}\'
     """.strip()
     logger.info(f"Command: {command}")
-    cmds = f"docker run -t --rm {mount_output} {mount_module} -e PYTHONPATH=$PYTHONPATH --entrypoint '/bin/bash' {docker_image} -c \"{command}\""
+    cpuset = f"--cpuset-cpus={cpu}" if cpu is not None else ""
+    cmds = f"docker run -t --rm {cpuset} {mount_output} {mount_module} {mount_accounting} -e PYTHONPATH=$PYTHONPATH --entrypoint '/bin/bash' {docker_image} -c \"{command}\""
     return subprocess.run(cmds, shell=True, check=True, env={"PYTHONPATH": src})
 
 
-def run_hyperfine_process(testfile, module_path, json_path, md_path, warmup, min_runs, names):
-    subcommand = create_command(module_path, testfile, generic=True)
-    # subcommand = f"docker run -t --rm --mount type=bind,source=/Users/benjaminr/Documents/GitHub/benchmarks-2024/solutions/project/{{module}},destination=/submission,readonly --mount type=bind,source=/Users/benjaminr/Documents/GitHub/benchmarks-2024/data/project/{testfile.read_text().strip()},destination=/home/runner/data/Levine_13dim.fcs,readonly local_combio_project"
-    executable = sys.executable
-    # executable = "docker"
-    cmd_conclude = _conclude_cmd(module_path)
-    logger.debug(f"Executable: {executable}")
-    logger.debug(f"Command: {subcommand}")
-    logger.debug(f"Conclude command: {cmd_conclude}")
-    commands = [subcommand for _ in names]
+def hyperfine_commands(subcommand, module_path, names):
+    """
+    Command of every solution for hyperfine, with the source folder of the solution on the path of shell test files.
 
+    >>> hyperfine_commands('import subprocess; subprocess.run(["sh", "run.sh"])', "/s", ["a"])[0]
+    'import subprocess; import os; subprocess.run(["sh", "run.sh"], env={**os.environ, "PYTHONPATH": "/s/a/src"})'
+    """
+    commands = [subcommand for _ in names]
     # add python path for shell scripts
     # Matches: subprocess.run([...]) possibly with optional args
     pattern = r'(subprocess\.run\s*\(\s*\[.*?\])(\s*\))'
@@ -62,16 +135,297 @@ def run_hyperfine_process(testfile, module_path, json_path, md_path, warmup, min
         # Inject env argument
         replacement = r'import os; \1, env={**os.environ, "PYTHONPATH": "' + pythonpath + r'"}\2'
         commands[i] = re.sub(pattern, replacement, commands[i])
+    return commands
 
+
+def run_hyperfine_process(
+    testfile,
+    module_path,
+    json_path,
+    md_path,
+    warmup,
+    min_runs,
+    names,
+    cpu=None,
+    max_runs=None,
+    rss_interval_ms=None,
+    record_path=None,
+):
+    """
+    Benchmark solutions in a hyperfine process.
+
+    With `rss_interval_ms`, the memory of every run of hyperfine is sampled, see `RssSampler`, and the sampled runs
+    are returned. With `record_path`, the resources of every run are appended to it, see `benchie.accounting`.
+    """
+    subcommand = create_command(module_path, testfile, generic=True)
+    # subcommand = f"docker run -t --rm --mount type=bind,source=/Users/benjaminr/Documents/GitHub/benchmarks-2024/solutions/project/{{module}},destination=/submission,readonly --mount type=bind,source=/Users/benjaminr/Documents/GitHub/benchmarks-2024/data/project/{testfile.read_text().strip()},destination=/home/runner/data/Levine_13dim.fcs,readonly local_combio_project"
+    executable = sys.executable
+    if record_path is not None:
+        # hyperfine subtracts the mean startup time of the shell, but not the variance the wrapper adds
+        executable = f"{sys.executable} -S {accounting.__file__} --record {record_path} {sys.executable}"
+    # executable = "docker"
+    cmd_conclude = _conclude_cmd(module_path)
+    logger.debug(f"Executable: {executable}")
+    logger.debug(f"Command: {subcommand}")
+    logger.debug(f"Conclude command: {cmd_conclude}")
+    commands = hyperfine_commands(subcommand, module_path, names)
+
+    max_runs = f"-M {max_runs}" if max_runs else ""
+    # the shell may start hyperfine before the shell itself is pinned, so pin hyperfine in the command
+    taskset = f"taskset -c {cpu}" if cpu is not None and shutil.which("taskset") else ""
     command = f"""
-        PYTHONPATH={module_path!s}/src hyperfine --ignore-failure --export-json {json_path!s} --export-markdown {md_path!s} \
-            -w {warmup} -m {min_runs} --shell {executable} --show-output --conclude \'{cmd_conclude}\' \
+        PYTHONPATH={module_path!s}/src {taskset} hyperfine --ignore-failure --export-json {json_path!s} --export-markdown {md_path!s} \
+            -w {warmup} -m {min_runs} {max_runs} --shell \'{executable}\' --show-output --conclude \'{cmd_conclude}\' \
             {" ".join(["-n " + x for x in names])} \
             -L module {",".join(names)} \
             {" ".join(f"'{cmd}'" for cmd in commands)}
     """
     logger.info(f"Command {command}")
-    return subprocess.run(command, shell=True, check=True)
+    process = subprocess.Popen(command, shell=True)
+    pin_to_core(process.pid, cpu)
+    sampler = None
+    if rss_interval_ms:
+        # every run of hyperfine is a child of the hyperfine process
+        sampler = RssSampler(
+            process.pid, interval_ms=rss_interval_ms, group_under="hyperfine", exclude=accounting.__file__
+        ).start()
+    returncode = process.wait()
+    runs = sampler.stop() if sampler else []
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+    return runs
+
+
+def assign_runs(runs, names, warmup=0):
+    """
+    Assign the runs of a hyperfine process to the solutions they ran, without the warmup runs.
+
+    Every run has the `cmdlines` of its processes, like the runs of `RssSampler`.
+
+    A run belongs to a solution when it imports the solution, or when the source folder of the solution is on its
+    path, like the runs of shell test files, see `hyperfine_commands`. Runs that did neither, like the shell
+    calibration and the conclude command, are left out.
+
+    >>> runs = [{"cmdlines": ["python -c "]}, {"cmdlines": ["python -c import a; a.f()"]}, {"cmdlines": ["python -c import a; a.f()"]}]
+    >>> {name: len(x) for name, x in assign_runs(runs, ["a", "b"], warmup=1).items()}
+    {'a': 1, 'b': 0}
+    """
+    assigned: dict[str, list[dict]] = {name: [] for name in names}
+    for run in runs:
+        for name in names:
+            pattern = rf"\bimport {re.escape(name)}\b|/{re.escape(name)}/src\b"
+            if any(re.search(pattern, cmd) for cmd in run["cmdlines"]):
+                assigned[name].append(run)
+                break
+    return {name: name_runs[warmup:] for name, name_runs in assigned.items()}
+
+
+def merge_hyperfine_json(json_paths, json_path, names=None):
+    """
+    Merge the exports of several hyperfine runs into a single hyperfine JSON export.
+
+    Args:
+        json_paths (list[Path]): Paths to the hyperfine JSON exports to merge. Missing exports are skipped.
+        json_path (Path): Path to write the merged export to.
+        names (list[str]): Order of the commands in the merged export.
+
+    Returns
+    -------
+        dict: The merged export.
+    """
+    results = []
+    for path in json_paths:
+        if not Path(path).exists():
+            logger.warning(f"Missing hyperfine export {path}")
+            continue
+        results.extend(json.loads(Path(path).read_text(encoding="utf8"))["results"])
+    if names is not None:
+        order = {name: i for i, name in enumerate(names)}
+        results.sort(key=lambda x: order.get(x["command"], len(order)))
+    merged = {"results": results}
+    Path(json_path).write_text(json.dumps(merged, indent=2), encoding="utf8")
+    return merged
+
+
+def hyperfine_markdown(results):
+    """
+    Markdown table in the format of the hyperfine markdown export.
+
+    >>> print(hyperfine_markdown([{"command": "a", "mean": 1.0, "stddev": 0.1, "min": 0.9, "max": 1.1}]))
+    | Command | Mean [s] | Min [s] | Max [s] | Relative |
+    |:---|---:|---:|---:|---:|
+    | `a` | 1.000 ± 0.100 | 0.900 | 1.100 | 1.00 |
+    """
+    lines = ["| Command | Mean [s] | Min [s] | Max [s] | Relative |", "|:---|---:|---:|---:|---:|"]
+    if not results:
+        return "\n".join(lines)
+    fastest = min(results, key=lambda x: x["mean"])
+    for c in results:
+        ratio = c["mean"] / fastest["mean"] if fastest["mean"] else 1.0
+        relative = f"{ratio:.2f}"
+        if c is not fastest and c["mean"] and fastest["mean"]:
+            # propagate the relative standard deviation of both commands
+            error = ratio * ((c["stddev"] / c["mean"]) ** 2 + (fastest["stddev"] / fastest["mean"]) ** 2) ** 0.5
+            relative += f" ± {error:.2f}"
+        lines.append(
+            f"| `{c['command']}` | {c['mean']:.3f} ± {c['stddev']:.3f} | {c['min']:.3f} | {c['max']:.3f} | {relative} |"
+        )
+    return "\n".join(lines) + interference_note(results)
+
+
+def _batch_runs(names, durations, min_runs, time_budget=None, runs=None):
+    """
+    Minimum and maximum number of runs of a batch, without a maximum if None.
+
+    The time budget in seconds caps the runs of the batch by the longest pretest duration in ms of its solutions. A
+    number of `runs` measures that many runs, e.g. to measure contaminated samples again.
+
+    >>> _batch_runs(["a", "b"], {"a": 100, "b": 500}, 3, time_budget=10), _batch_runs(["a"], {}, 3, runs=1)
+    ((3, 20), (2, 2))
+    """
+    if runs:
+        # hyperfine needs at least 2 runs
+        return max(2, runs), max(2, runs)
+    longest = max((durations.get(x, 0) for x in names), default=0)
+    if time_budget and longest:
+        return min_runs, max(min_runs, int(time_budget * 1000 / longest))
+    return min_runs, None
+
+
+def _read_records(record_path, names, warmup=0):
+    """The accounted runs of a hyperfine process by solution, see `assign_runs`."""
+    records = [json.loads(line) for line in record_path.read_text().splitlines()]
+    for record in records:
+        record["cmdlines"] = [" ".join(record.pop("argv"))]
+    return assign_runs(records, names, warmup=warmup)
+
+
+def _report_runs(results, name):
+    """Report the worst outcome of the runs of every solution as a progress event."""
+    for c in results:
+        result = "failed" if any(c.get("exit_codes") or [0]) else "ok"
+        events.run("hyperfine", c["command"], name, result, duration=c.get("mean"), count=len(c.get("times") or []))
+
+
+def _add_peak_rss(results, rss_json, rss_runs, names):
+    """Write the sampled runs of every solution to `rss_json` and add their peak memory to the results."""
+    rss = {r["command"]: r for r in write_rss_json(rss_json, {x: rss_runs.get(x, []) for x in names})}
+    for c in results:
+        if c["command"] in rss:
+            c["peak_rss"] = rss[c["command"]]["peak_rss"]
+            c["peak_uss"] = rss[c["command"]]["peak_uss"]
+
+
+class _HyperfineBatches:
+    """
+    The hyperfine processes of the batches of a test file, with the sampled and accounted runs of every solution.
+
+    `run` runs a batch on a core, see `run_on_cores`. A batch with a number of runs measures the contaminated samples
+    of its solutions again, see `measure_again`. The arguments are those of `run_hyperfine_all`.
+    """
+
+    def __init__(
+        self,
+        testfile,
+        module_path,
+        jobs_output,
+        warmup,
+        min_runs,
+        durations_by_name,
+        time_budget=None,
+        docker_image=None,
+        rss_interval_ms=None,
+        record_resources=False,
+        n_batches=0,
+        jobs=1,
+    ):
+        self.testfile = testfile
+        self.module_path = module_path
+        self.jobs_output = jobs_output
+        self.warmup = warmup
+        self.min_runs = min_runs
+        self.durations_by_name = durations_by_name
+        self.time_budget = time_budget
+        self.docker_image = docker_image
+        self.rss_interval_ms = rss_interval_ms
+        self.record_resources = record_resources
+        self.n_batches = n_batches
+        self.jobs = jobs
+        self.rss_runs = {}
+        self.resource_runs = {}
+        # accounted runs of every batch, to align with its times
+        self.records = {}
+        self._finished = itertools.count(1)
+        self._retries = itertools.count(1)
+
+    def _run_process(self, batch_names, batch_json, batch_md, min_runs, max_runs, cpu, record_path):
+        # DANGER: arbitrary code run, only run on valid Dodona code!
+        if self.docker_image:
+            run_hyperfine_process_docker(
+                self.docker_image,
+                self.testfile,
+                self.module_path,
+                batch_json,
+                batch_md,
+                self.warmup,
+                min_runs,
+                batch_names,
+                cpu=cpu,
+                max_runs=max_runs,
+                record_path=record_path,
+            )
+            return []
+        return run_hyperfine_process(
+            self.testfile,
+            self.module_path,
+            batch_json,
+            batch_md,
+            self.warmup,
+            min_runs,
+            batch_names,
+            cpu=cpu,
+            max_runs=max_runs,
+            rss_interval_ms=self.rss_interval_ms,
+            record_path=record_path,
+        )
+
+    def run(self, batch, cpu):
+        """Run a batch, the id, the names of its solutions and a number of runs or None, and return its export."""
+        i, batch_names, runs = batch
+        name = self.testfile.stem
+        batch_json = self.jobs_output / f"{name}_{i}.json"
+        batch_md = self.jobs_output / f"{name}_{i}.md"
+        record_path = self.jobs_output / f"{name}_{i}_resources.jsonl" if self.record_resources else None
+        if record_path is not None:
+            record_path.unlink(missing_ok=True)
+        min_runs, max_runs = _batch_runs(batch_names, self.durations_by_name, self.min_runs, self.time_budget, runs)
+        logger.info(f"Benchmarking {batch_names} on core {cpu}, at most {max_runs or 'default'} runs")
+        try:
+            sampled = self._run_process(batch_names, batch_json, batch_md, min_runs, max_runs, cpu, record_path)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error while benchmarking {batch_names}: {e}")
+            sampled = []
+        for x, x_runs in assign_runs(sampled, batch_names, warmup=self.warmup).items():
+            self.rss_runs.setdefault(x, []).extend(x_runs)
+        if record_path is not None and record_path.exists():
+            self.records[i] = _read_records(record_path, batch_names, warmup=self.warmup)
+            for x, x_runs in self.records[i].items():
+                self.resource_runs.setdefault(x, []).extend(x_runs)
+        if not runs:
+            events.queue("hyperfine", self.n_batches - next(self._finished))
+        return batch_json
+
+    def measure_again(self, pending):
+        """Measure a number of runs per solution again, in a batch per solution, see `benchie.interference`."""
+        retry = next(self._retries)
+        retry_batches = [(f"retry{retry}_{k}", [x], runs) for k, (x, runs) in enumerate(pending.items())]
+        retry_jsons = run_on_cores(self.run, retry_batches, self.jobs)
+        measured = {}
+        for (i, (x,), _), retry_json in zip(retry_batches, retry_jsons):
+            if retry_json.exists():
+                result = json.loads(retry_json.read_text(encoding="utf8"))["results"][0]
+                measured[x] = (result, self.records.get(i, {}).get(x, []))
+        return measured
 
 
 def run_hyperfine_all(
@@ -84,7 +438,49 @@ def run_hyperfine_all(
     min_runs=3,
     subset=None,
     docker_image=None,
+    jobs=1,
+    durations=None,
+    batch_size=1,
+    time_budget=None,
+    rss_interval_ms=None,
+    record_resources=False,
+    interference=False,
+    interference_retries=2,
 ):
+    """
+    Benchmark all solutions with hyperfine, split into small batches that run in parallel.
+
+    Every batch gets its own hyperfine process, pinned to a dedicated CPU core. Batches are started longest
+    first, based on the pretest durations, and their exports are merged into a single hyperfine export.
+
+    Args:
+        output (Path): Path to the output directory.
+        all_correct_solutions (list[Path]): Paths to the solutions.
+        testfile (Path): Path to the test file.
+        json_path (Path): Path of the merged JSON export.
+        md_path (Path): Path of the merged markdown export.
+        warmup (int): Number of warmup runs per solution.
+        min_runs (int): Minimum number of runs per solution.
+        docker_image (str): Docker image to use for benchmarking.
+        jobs (int): Number of hyperfine processes to run at the same time.
+        durations (dict[Path, int]): Pretest duration per solution, used to start the longest batches first.
+        batch_size (int): Number of solutions per hyperfine process.
+        time_budget (float): Maximum time in seconds per solution. With the pretest durations, this caps the number of
+            runs of every batch.
+        rss_interval_ms (int): Interval to sample the memory of the runs at. The peak RSS is added to the export and
+            the sampled runs are written to `<data>_rss.json`. No sampling if None.
+        record_resources (bool): Flag indicating whether to account the resources of every run, which are written to
+            `<data>_resources.json`, see `benchie.accounting`. Every run then starts in an accounting wrapper, which
+            adds run-to-run noise that hyperfine does not subtract.
+        interference (bool): Flag indicating whether to monitor the interference of other processes during the runs.
+            Contaminated samples are discarded and measured again, and written to `<data>_interference.json`, see
+            `benchie.interference`. The runs are accounted to know when they ran.
+        interference_retries (int): Maximum number of times to measure the contaminated samples again.
+
+    Returns
+    -------
+        dict: The merged hyperfine export, or None if there was nothing to benchmark.
+    """
     name = testfile.stem
     json_path = Path(json_path or output / f"{name}_benchmark.json")
     md_path = Path(md_path or output / f"{name}_benchmark.md")
@@ -95,15 +491,110 @@ def run_hyperfine_all(
     module_path = all_correct_solutions[0].parent
     names = [x.stem for x in all_correct_solutions]
 
-    # DANGER: arbitrary code run, only run on valid Dodona code!
-    try:
-        if docker_image:
-            results = run_hyperfine_process_docker(
-                docker_image, testfile, module_path, json_path, md_path, warmup, min_runs, names
+    # longest processing time first keeps the cores busy until the end
+    durations = durations or {}
+    ordered = sorted(all_correct_solutions, key=lambda x: durations.get(x, 0), reverse=True)
+    batches = [[x.stem for x in ordered[i : i + batch_size]] for i in range(0, len(ordered), batch_size)]
+
+    jobs_output = output / f"{name}_jobs"
+    jobs_output.mkdir(exist_ok=True, parents=True)
+
+    if rss_interval_ms and docker_image:
+        logger.warning("Memory sampling does not support docker images yet, skipping.")
+        rss_interval_ms = None
+    if interference and docker_image:
+        logger.warning("Interference detection needs the accounted runs on the host, skipping.")
+        interference = False
+    hyperfine = _HyperfineBatches(
+        testfile,
+        module_path,
+        jobs_output,
+        warmup,
+        min_runs,
+        {x.stem: duration for x, duration in durations.items()},
+        time_budget=time_budget,
+        docker_image=docker_image,
+        rss_interval_ms=rss_interval_ms,
+        record_resources=record_resources or interference,
+        n_batches=len(batches),
+        jobs=jobs,
+    )
+    events.queue("hyperfine", len(batches))
+    monitor = InterferenceMonitor(expected_cores=min(jobs, len(batches))).start() if interference else None
+    with events.stage("hyperfine", dataset=name):
+        batch_jsons = run_on_cores(hyperfine.run, [(i, x, None) for i, x in enumerate(batches)], jobs)
+
+    results = merge_hyperfine_json(batch_jsons, json_path, names=names)
+    if monitor is not None:
+        runs_by_name = {x: x_runs for records in hyperfine.records.values() for x, x_runs in records.items()}
+        with events.stage("interference", dataset=name):
+            _, discarded = remeasure(
+                results["results"], runs_by_name, monitor, hyperfine.measure_again, interference_retries
             )
-        else:
-            results = run_hyperfine_process(testfile, module_path, json_path, md_path, warmup, min_runs, names)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error while benchmarking: {e}")
-        return
+        write_interference_json(output / f"{name}_interference.json", monitor.stop(), discarded)
+        json_path.write_text(json.dumps(results, indent=2), encoding="utf8")
+    _report_runs(results["results"], name)
+    if rss_interval_ms:
+        _add_peak_rss(results["results"], output / f"{name}_rss.json", hyperfine.rss_runs, names)
+        json_path.write_text(json.dumps(results, indent=2), encoding="utf8")
+    if hyperfine.resource_runs:
+        resource_runs = {x: hyperfine.resource_runs.get(x, []) for x in names}
+        write_resources_json(output / f"{name}_resources.json", resource_runs)
+    md_path.write_text(hyperfine_markdown(results["results"]), encoding="utf8")
     return results
+
+
+def solution_env(solution):
+    """Environment to run a solution in, with the solution importable and the hash seed of `set_hash_seed`."""
+    env = {"PYTHONPATH": str(solution / "src") if solution.is_dir() else str(solution.parent)}
+    if "PYTHONHASHSEED" in os.environ:
+        env["PYTHONHASHSEED"] = os.environ["PYTHONHASHSEED"]
+    return env
+
+
+def run_forkserver_all(output, all_correct_solutions, testfile, warmup=1, runs=10, timeout=None, jobs=1, cwd=None):
+    """
+    Time the test file call of all solutions in a warm forkserver, without the interpreter startup and imports.
+
+    The results are written to `<data>_forkserver.json`, in the format of a hyperfine JSON export.
+
+    Returns
+    -------
+        dict: The merged results, or None if there was nothing to benchmark.
+    """
+    name = testfile.stem
+    if testfile.suffix == ".sh":
+        logger.warning(f"The forkserver can not time shell test file {testfile.name}")
+        return
+    if len(all_correct_solutions) == 0:
+        logger.error("No valid solutions to benchmark.")
+        return
+    jobs_output = output / f"{name}_forkserver_jobs"
+    jobs_output.mkdir(exist_ok=True, parents=True)
+    testcode = testfile.read_text().strip()
+
+    def run_solution(solution, cpu):
+        module = solution_module(solution)
+        solution_json = jobs_output / f"{solution.stem}.json"
+        logger.info(f"Timing {solution.stem} in a forkserver on core {cpu}")
+        # DANGER: arbitrary code run, only run on valid Dodona code!
+        try:
+            run_forkserver(
+                solution.stem,
+                f"import {module}",
+                f"{module}.{testcode}",
+                solution_json,
+                warmup,
+                runs,
+                timeout=timeout,
+                env=solution_env(solution),
+                cwd=cwd,
+                cpu=cpu,
+            )
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Error while timing {solution.stem} in a forkserver: {e}")
+        return solution_json
+
+    solution_jsons = run_on_cores(run_solution, all_correct_solutions, jobs)
+    names = [x.stem for x in all_correct_solutions]
+    return merge_hyperfine_json(solution_jsons, output / f"{name}_forkserver.json", names=names)
@@ -1,81 +1,104 @@
 import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
 from pathlib import Path
 
 from loguru import logger
-from scalene import scalene_profiler
-from scalene.scalene_parseargs import ScaleneParseArgs
 
+from benchie.runtime import solution_env
+from benchie.staging import staged_workdir
+from benchie.utils import create_command
 
-def import_solution(solution):
-    try:
-        mod = __import__(solution)
-    except ImportError as e:
-        logger.info(f"Import failed for: {solution}; {e}")
-        mod = None
-    return mod
 
+def has_scalene():
+    """Whether scalene is installed, it is an optional dependency."""
+    return find_spec("scalene") is not None
 
-def create_scalene_command(path, testfile, interpreter="python"):
-    module = path.name.removesuffix(".py")
-    fn_command = testfile.read_text()
-    # command = f"""import {module}; {module}.global_alignment(\\'{str(testfile)}\\')"""
-    command = f"""import {module}; {module}.{fn_command}
+
+def create_scalene_command(runner, solution, output_path, scalene_executable=None):
+    """
+    Command that profiles the CPU and memory of a runner script, only for the lines of the solution.
+
+    The solution is a file or a folder, and `--profile-only` matches every profiled file path that contains it.
+    """
+    if scalene_executable is None:
+        scalene_executable = [sys.executable, "-m", "scalene"]
+    return [
+        *scalene_executable,
+        "--cli",
+        "--json",
+        "--outfile",
+        str(output_path),
+        "--cpu",
+        "--memory",
+        "--profile-only",
+        str(solution),
+        str(runner),
+    ]
+
+
+def run_scalene(output, solution, testfile, workdir, timeout=None, scalene_executable=None):
+    """
+    Profile a solution on a test file with scalene in a worker process.
+
+    The test file is run by a runner script, like the memray runs, and the JSON profile is written to
+    `<solution>_scalene.json`.
+
+    Returns
+    -------
+        Path: The JSON profile, or None if the run failed.
+    """
+    output_path = output / (solution.stem + "_scalene.json")
+    output_path.unlink(missing_ok=True)
+    command = create_command(solution, testfile)
+    logger.debug(f"Created scalene command: {command}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        runner = Path(temp_dir) / (solution.stem + "_scalene_runner.py")
+        runner.write_text(command)
+        scalene_command = create_scalene_command(runner, solution, output_path, scalene_executable)
+        # DANGER: arbitrary code run, only run on valid Dodona code!
+        try:
+            subprocess.run(  # noqa: S603
+                scalene_command,
+                check=True,
+                timeout=timeout,
+                env=solution_env(solution),
+                cwd=workdir,
+                stdout=subprocess.DEVNULL,
+            )
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Scalene failed with {e}")
+            return None
+        except subprocess.TimeoutExpired:
+            logger.error(f"Timeout while profiling '{solution.stem}' with scalene")
+            return None
+    if not output_path.exists():
+        logger.error(f"Scalene did not write a profile for '{solution.stem}'")
+        return None
+    return output_path
+
+
+def run_scalene_all(output, all_correct_solutions, testfile, timeout=None, jobs=1):
     """
-    return command
-
-
-def run_scalene_directly(output, solution, testfile):
-    output / (solution.stem + "_scalene.bin")
-    module = solution.name.removesuffix(".py")
-    # DANGER: arbitrary code import, only run on valid Dodona code!
-    mod = import_solution(module)
-
-    (
-        args,
-        left,
-    ) = ScaleneParseArgs.parse_args()
-    scalene_profiler.Scalene.set_initialized()
-    scalene_profiler.Scalene.run_profiler(args, left)
-    scalene_profiler.Scalene.set_initialized()
-    # Turn profiling on
-    scalene_profiler.start()
-    try:
-        dm = mod.DistanceMatrix.loadtxt(testfile)
-        dm.neighbour_joining()
-    except ValueError as e:
-        print(e)  # Output: Command 'exit 1' returned non-zero exit status 1.
-
-    # Turn profiling off
-    scalene_profiler.stop()
-    # scalene_profiler.
-    # use async Popen, don't wait for return
-    # with open(output / (solution.stem + '_summary.txt'), "w") as f:
-    #     subprocess.Popen(['memray', 'summary', str(output_path)], stdout=f)
-    # with open(output / (solution.stem + '_tree.txt'), "w") as f:
-    #     subprocess.Popen(['memray', 'tree', str(output_path)], stdout=f)
-    # with open(output / (solution.stem + '_stats.txt'), "w") as f:
-    #     subprocess.Popen(['memray', 'stats', str(output_path)], stdout=f)
-    # subprocess.Popen(['memray', 'flamegraph', '-o', output / (solution.stem + '_flamgraph.html'), str(output_path)])
-    # subprocess.Popen(['memray', 'table', '-o', output / (solution.stem + '_table.html'), str(output_path)])
-
-
-def run_scalene(output_folder, solution, testfile, format="json"):
-    output_path = output_folder / ((solution.stem) + "_scalene." + format)
-    # all_solutions = list(solutions_path.glob("*.py"))
-    # names = [x.stem.split('_')[1] for x in all_solutions]
-    # command = create_command_scalene(solution, testfile)
-    # assert len(commands) > 1
-    runner = Path("data/global_alignment").resolve() / "scalene_runner.py"
-    logger.info("Benchmarking")
-
-    command = f"""
-        cd {solution.parent!s};
-        scalene --cpu --mem --{format} --profile-only {solution!s} --off {runner!s} --- {solution!s} {testfile!s} > {output_path!s}
+    Profile all solutions with scalene, with up to `jobs` worker processes at the same time.
+
+    Every solution runs once in its own workdir and its profile is written to `scalene/<solution>_scalene.json`,
+    see `benchie.reporting.get_all_hotspots`.
+
+    Returns
+    -------
+        dict: The JSON profile per solution, or None if the run failed.
     """
-    logger.info(f"Command {command}")
-    try:
-        results = subprocess.run(command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error while benchmarking: {e}")
-        return
-    return results
+    scalene_output = output / "scalene"
+    scalene_output.mkdir(exist_ok=True)
+
+    def run(solution):
+        logger.debug(f"Running scalene on {solution}")
+        with staged_workdir(testfile.parent) as workdir:
+            return run_scalene(scalene_output, solution, testfile, workdir, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        profiles = list(executor.map(run, all_correct_solutions))
+    return dict(zip(all_correct_solutions, profiles))
@@ -0,0 +1,178 @@
+import atexit
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import uuid
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+from loguru import logger
+
+from benchie.cache import hash_tree
+
+# ioctl to clone a file on filesystems with copy-on-write support, like btrfs and xfs
+FICLONE = 0x40049409
+# errors after which the next way of linking a file is tried
+LINK_ERRORS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EMLINK, errno.EACCES}
+
+# workdirs that still have to be removed, in case a run does not clean up after itself
+_workdirs: set[Path] = set()
+
+
+class DataStore:
+    """
+    Content-addressed, read-only copies of data folders.
+
+    Every version of a data folder is copied once to `<root>/<digest>`, so the workdirs of all runs on that data can
+    link to it instead of copying it again. The files in the store are read-only, so a solution can not change the
+    data of the next runs through a hardlink. When a data folder changes, its previous version is removed.
+
+    Without a `root`, the store is a new private temporary folder that `remove` deletes.
+    """
+
+    def __init__(self, root=None):
+        self.temporary = root is None
+        self.root = Path(tempfile.mkdtemp(prefix="benchie_store_")) if root is None else Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # digest of the last version of every data folder
+        self._digests: dict[Path, str] = {}
+
+    def store(self, data_folder):
+        """Copy a data folder to the store, except its .py files, and return its read-only copy."""
+        data_folder = Path(data_folder)
+        entries = sorted(path for path in data_folder.glob("*") if path.is_dir() or path.suffix != ".py")
+        h = hashlib.sha256()
+        for entry in entries:
+            h.update(entry.name.encode())
+            h.update(hash_tree(entry).encode())
+        digest = h.hexdigest()
+        previous = self._digests.get(data_folder.resolve())
+        self._digests[data_folder.resolve()] = digest
+        if previous is not None and previous != digest:
+            shutil.rmtree(self.root / previous, ignore_errors=True)
+        path = self.root / digest
+        if path.exists():
+            return path
+        logger.info(f"Staging {data_folder} in {path}")
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        for src in entries:
+            if src.is_dir():
+                shutil.copytree(src, tmp / src.name)
+            else:
+                shutil.copy(src, tmp)
+        for file in tmp.rglob("*"):
+            if file.is_file():
+                file.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        try:
+            # atomic, so a concurrent run never sees a half-copied folder
+            tmp.rename(path)
+        except OSError:
+            # another run stored the same data first
+            shutil.rmtree(tmp, ignore_errors=True)
+        return path
+
+    def remove(self):
+        """Remove a temporary store and everything in it."""
+        if self.temporary:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+def reflink(src, dst):
+    """Copy-on-write clone of a file, which fails if the filesystem does not support it."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+
+
+def link_file(src, dst):
+    """
+    Make `dst` show the content of `src` without copying it, if possible.
+
+    Tries a copy-on-write reflink, then a hardlink and falls back to a symlink, e.g. across filesystems.
+
+    Returns
+    -------
+        str: How the file was linked.
+    """
+    for method, link in (("reflink", reflink), ("hardlink", os.link)):
+        try:
+            link(src, dst)
+        except OSError as e:
+            if e.errno not in LINK_ERRORS:
+                raise
+        else:
+            return method
+    os.symlink(src, dst)
+    return "symlink"
+
+
+def link_tree(src, dst):
+    """Mirror the folder `src` in `dst`, with real folders and linked files, and return the number of links per method."""
+    methods: dict[str, int] = {}
+    for root, dirs, files in os.walk(src):
+        target = Path(dst) / Path(root).relative_to(src)
+        for name in dirs:
+            (target / name).mkdir()
+        for name in files:
+            method = link_file(Path(root) / name, target / name)
+            methods[method] = methods.get(method, 0) + 1
+    return methods
+
+
+def stage_workdir(data_folder, store=None):
+    """
+    Create a new workdir with the data of a data folder, linked from the store.
+
+    The workdir is removed with `remove_workdir`, or when the process exits.
+    """
+    store = store or default_store()
+    workdir = Path(tempfile.mkdtemp(prefix="benchie_"))
+    methods = link_tree(store.store(data_folder), workdir)
+    logger.debug(f"Staged workdir {workdir}: {methods}")
+    _workdirs.add(workdir)
+    return workdir
+
+
+def remove_workdir(workdir):
+    """Remove a workdir created by `stage_workdir`."""
+    _workdirs.discard(Path(workdir))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextmanager
+def staged_workdir(data_folder, chdir=False, store=None):
+    """Workdir with the data of a data folder for the duration of the context, see `stage_workdir`."""
+    workdir = stage_workdir(data_folder, store=store)
+    cwd = Path.cwd() if chdir else None
+    try:
+        if chdir:
+            os.chdir(workdir)
+        yield workdir
+    finally:
+        if cwd is not None:
+            os.chdir(cwd)
+        remove_workdir(workdir)
+
+
+@cache
+def default_store():
+    """Private temporary store, shared by all runs of this process and removed when it exits."""
+    return DataStore()
+
+
+@atexit.register
+def _remove_workdirs():
+    for workdir in list(_workdirs):
+        remove_workdir(workdir)
+    if default_store.cache_info().currsize:
+        default_store().remove()
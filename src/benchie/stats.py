@@ -0,0 +1,70 @@
+import math
+import statistics
+
+# two-sided 95% quantiles of the t distribution for 1 to 30 degrees of freedom
+T_975 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+
+
+def t_quantile(df):
+    """
+    Two-sided 95% quantile of the t distribution, the normal quantile above 30 degrees of freedom.
+
+    >>> t_quantile(2)
+    4.303
+    >>> t_quantile(1000)
+    1.96
+    """
+    if df < 1:
+        return math.inf
+    if df <= len(T_975):
+        return T_975[df - 1]
+    return 1.96
+
+
+def confidence_interval(samples):
+    """
+    95% confidence interval of the mean of the samples.
+
+    >>> confidence_interval([1.0, 1.0, 1.0])
+    (1.0, 1.0, 1.0)
+    >>> confidence_interval([1.0])
+    (1.0, -inf, inf)
+    """
+    mean = statistics.mean(samples)
+    if len(samples) < 2:
+        return mean, -math.inf, math.inf
+    half_width = t_quantile(len(samples) - 1) * statistics.stdev(samples) / math.sqrt(len(samples))
+    return mean, mean - half_width, mean + half_width
+
+
+def relative_ci_width(samples):
+    """
+    Width of the 95% confidence interval of the mean, relative to the mean.
+
+    >>> round(relative_ci_width([0.9, 1.0, 1.1]), 3)
+    0.497
+    """
+    mean, low, high = confidence_interval(samples)
+    if mean == 0:
+        return math.inf
+    return (high - low) / mean
+
+
+def is_stationary(samples, window=3, tolerance=0.1):
+    """
+    Whether the last `window` samples are within `tolerance` of their mean, relative to that mean.
+
+    >>> is_stationary([3.0, 1.5, 1.0, 1.02, 0.99])
+    True
+    >>> is_stationary([3.0, 1.5, 1.0])
+    False
+    """
+    if len(samples) < window:
+        return False
+    last = samples[-window:]
+    mean = statistics.mean(last)
+    return mean > 0 and (max(last) - min(last)) / mean <= tolerance
@@ -0,0 +1,294 @@
+"""
+Scaling sweeps over parameterised test files with generated inputs.
+
+A sweep is a `sweep_*.json` next to the `data_*.py` files, with a call like in a test file, its parameters and an
+optional input generator:
+
+    {
+        "call": "global_alignment('{input}', {n})",
+        "parameters": {"n": {"min": 100, "max": 10000, "factor": 10}},
+        "input": {"generator": "dna", "length": "{n}", "seed": 42},
+        "runs": 3
+    }
+
+Every combination of the parameters is a point of the sweep. A parameter is a list of values, a range like the
+parameter scan of hyperfine with `min`, `max` and `step`, or a geometric range with `factor`. The generated input of
+a point is stored once in an `InputCache` and linked into the workdir, where the call refers to it as `{input}`.
+"""
+
+import atexit
+import hashlib
+import itertools
+import json
+import random
+import shutil
+import stat
+import statistics
+import sys
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from pathlib import Path
+
+from loguru import logger
+
+from benchie.adaptive import summarize_samples
+from benchie.complexity import create_complexity_table, estimate_complexity
+from benchie.measure import measure
+from benchie.reporting import TIME_UNITS, format_size, time_unit
+from benchie.runtime import solution_env
+from benchie.staging import link_file, staged_workdir
+from benchie.utils import create_code_command
+
+# input generators by name, with the suffix of the files they write
+GENERATORS = {}
+
+
+def generator(name, suffix=".txt"):
+    """Register an input generator, a function that writes an input to a text file for its keyword arguments."""
+
+    def register(fn):
+        GENERATORS[name] = (fn, suffix)
+        return fn
+
+    return register
+
+
+@generator("dna", suffix=".fasta")
+def generate_dna(fh, length, seed=0, name="seq", width=80):
+    """A random DNA sequence of `length` nucleotides in FASTA format."""
+    rng = random.Random(seed)  # noqa: S311
+    sequence = "".join(rng.choices("ACGT", k=int(length)))
+    fh.write(f">{name}\n")
+    for i in range(0, len(sequence), width):
+        fh.write(sequence[i : i + width] + "\n")
+
+
+@generator("integers")
+def generate_integers(fh, count, seed=0, low=0, high=1_000_000):
+    """`count` random integers between `low` and `high`, one per line."""
+    rng = random.Random(seed)  # noqa: S311
+    for _ in range(int(count)):
+        fh.write(f"{rng.randint(low, high)}\n")
+
+
+class InputCache:
+    """
+    Generated inputs, stored once per generator and arguments at `<root>/<digest>/`.
+
+    The inputs are read-only, like the data in a `benchie.staging.DataStore`, and are reused by all solutions,
+    sweeps and later benchmarks with the same generator and arguments.
+
+    Without a `root`, the cache is a new private temporary folder that `remove` deletes.
+    """
+
+    def __init__(self, root=None):
+        self.temporary = root is None
+        self.root = Path(tempfile.mkdtemp(prefix="benchie_inputs_")) if root is None else Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def remove(self):
+        """Remove a temporary cache and everything in it."""
+        if self.temporary:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def get(self, name, **kwargs):
+        """Path of the input of a generator for the given arguments, which is generated on first use."""
+        fn, suffix = GENERATORS[name]
+        digest = hashlib.sha256(json.dumps([name, kwargs], sort_keys=True).encode()).hexdigest()
+        path = self.root / digest / f"{name}_{digest[:12]}{suffix}"
+        if path.exists():
+            return path
+        logger.info(f"Generating {name} input {kwargs}")
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        with open(tmp / path.name, "w", encoding="utf8") as fh:
+            fn(fh, **kwargs)
+        (tmp / path.name).chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        try:
+            # atomic, so a concurrent run never sees a half-written input
+            tmp.rename(path.parent)
+        except OSError:
+            # another run generated the same input first
+            (tmp / path.name).unlink()
+            tmp.rmdir()
+        return path
+
+
+@cache
+def default_inputs():
+    """Private temporary input cache, shared by all sweeps of this process and removed when it exits."""
+    return InputCache()
+
+
+@atexit.register
+def _remove_default_inputs():
+    if default_inputs.cache_info().currsize:
+        default_inputs().remove()
+
+
+def parameter_values(values):
+    """
+    Values of a sweep parameter.
+
+    >>> parameter_values([1, 2])
+    [1, 2]
+    >>> parameter_values({"min": 10, "max": 30, "step": 10})
+    [10, 20, 30]
+    >>> parameter_values({"min": 100, "max": 10000, "factor": 10})
+    [100, 1000, 10000]
+    """
+    if isinstance(values, list):
+        return values
+    if "factor" in values:
+        result = [values["min"]]
+        while result[-1] * values["factor"] <= values["max"]:
+            result.append(result[-1] * values["factor"])
+        return result
+    step = values.get("step", 1)
+    n = round((values["max"] - values["min"]) / step)
+    return [values["min"] + i * step for i in range(n + 1)]
+
+
+def _resolve(value, parameters):
+    # "{n}" refers to the value of parameter n, other strings are formatted with the parameters
+    if isinstance(value, str):
+        if value.startswith("{") and value.endswith("}") and value[1:-1] in parameters:
+            return parameters[value[1:-1]]
+        return value.format(**parameters)
+    return value
+
+
+def expand_sweep(spec):
+    """
+    Points of a sweep, every combination of the parameter values, with the arguments of the input generator.
+
+    >>> [p["parameters"] for p in expand_sweep({"call": "f({n}, {k})", "parameters": {"n": [1, 2], "k": [3]}})]
+    [{'n': 1, 'k': 3}, {'n': 2, 'k': 3}]
+    >>> expand_sweep({"call": "f('{input}')", "parameters": {"n": [5]}, "input": {"generator": "dna", "length": "{n}"}})
+    [{'parameters': {'n': 5}, 'input': {'generator': 'dna', 'length': 5}}]
+    """
+    names = list(spec["parameters"])
+    points = []
+    for values in itertools.product(*(parameter_values(spec["parameters"][name]) for name in names)):
+        parameters = dict(zip(names, values))
+        point = {"parameters": parameters}
+        if spec.get("input"):
+            point["input"] = {k: _resolve(v, parameters) for k, v in spec["input"].items()}
+        points.append(point)
+    return points
+
+
+def run_sweep(solution, spec, points, sweep_folder, inputs, timeout=None):
+    """
+    Run every point of a sweep on a solution, `runs` times per point, in a workdir with the data of the sweep.
+
+    After a timeout, the larger points are skipped, as they would time out too.
+
+    Returns
+    -------
+        list[dict]: The results per point, like a hyperfine JSON export result, with the `parameters`.
+    """
+    env = solution_env(solution)
+    runs = spec.get("runs", 3)
+    warmup = spec.get("warmup", 0)
+    results = []
+    timed_out = False
+    with staged_workdir(sweep_folder) as workdir:
+        for point in points:
+            parameters = point["parameters"]
+            if timed_out:
+                results.append({"command": solution.stem, "parameters": parameters, "skipped": True})
+                continue
+            call_parameters = dict(parameters)
+            if "input" in point:
+                arguments = dict(point["input"])
+                input_path = inputs.get(arguments.pop("generator"), **arguments)
+                if not (workdir / input_path.name).exists():
+                    link_file(input_path, workdir / input_path.name)
+                call_parameters["input"] = input_path.name
+            command = [sys.executable, "-c", create_code_command(solution, spec["call"].format(**call_parameters))]
+            # DANGER: arbitrary code run, only run on valid Dodona code!
+            samples = [measure(command, env=env, cwd=workdir, timeout=timeout) for _ in range(warmup + runs)][warmup:]
+            result = summarize_samples(solution.stem, samples, parameters=parameters)
+            if "resources" in result:
+                result["max_rss"] = result["resources"]["max_rss"]
+            results.append(result)
+            if any(s["exit_code"] is None for s in samples):
+                logger.warning(f"'{solution.stem}' timed out on {parameters}, skipping the larger points")
+                timed_out = True
+    return results
+
+
+def create_sweep_table(results):
+    r"""
+    Markdown table of the sweep of a solution, with a row per point.
+
+    >>> create_sweep_table([{"parameters": {"n": 10}, "mean": 0.5, "stddev": 0.01, "min": 0.49, "max": 0.51,
+    ...     "max_rss": 9_000_000, "exit_codes": [0]}]).splitlines()[2]
+    ' | 10 | 500.000 ± 10.000 | 490.000 | 510.000 | 9.000MB | '
+    """
+    d = " | "
+    names = list(results[0]["parameters"])
+    timed = [r for r in results if not r.get("skipped") and r["mean"] == r["mean"]]
+    unit = time_unit({"results": timed}) if timed else "s"
+    scale = TIME_UNITS[unit]
+    header = [*names, f"Mean [{unit}]", f"Min [{unit}]", f"Max [{unit}]", "Max RSS"]
+    output = [d + d.join(header) + d, d + d.join(["---:" for _ in header]) + d]
+    for r in results:
+        columns = [str(r["parameters"][name]) for name in names]
+        if r.get("skipped"):
+            columns.extend(["skipped", "", "", ""])
+        elif r not in timed or any(code != 0 for code in r["exit_codes"]):
+            columns.extend(["failed", "", "", ""])
+        else:
+            columns.extend([
+                f"{r['mean'] * scale:.3f} ± {r['stddev'] * scale:.3f}",
+                f"{r['min'] * scale:.3f}",
+                f"{r['max'] * scale:.3f}",
+                format_size(r["max_rss"]) if r.get("max_rss") else "",
+            ])
+        output.append(d + d.join(columns) + d)
+    return "\n".join(output)
+
+
+def run_sweep_all(output, all_correct_solutions, sweep_path, timeout=None, jobs=1, inputs=None):
+    """
+    Run a sweep on all solutions, with up to `jobs` solutions at the same time.
+
+    The results are written to `<sweep>.json`, with a table per solution at `<solution>_sweep.md`. The time and
+    the peak memory are fit against the `size` parameter of the sweep, by default its first parameter, and the
+    scaling exponents are written to `complexity.md` and `complexity.json`, see `benchie.complexity`.
+
+    Returns
+    -------
+        dict: The results per point per solution.
+    """
+    spec = json.loads(sweep_path.read_text(encoding="utf8"))
+    points = expand_sweep(spec)
+    inputs = inputs or default_inputs()
+    output.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Sweep {sweep_path.name} over {len(points)} points")
+
+    def run(solution):
+        logger.info(f"Sweeping {solution.stem}")
+        return run_sweep(solution, spec, points, sweep_path.parent, inputs, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        results = dict(zip((s.stem for s in all_correct_solutions), executor.map(run, all_correct_solutions)))
+
+    (output / f"{sweep_path.stem}.json").write_text(json.dumps({"results": results}, indent=2), encoding="utf8")
+    for name, solution_results in results.items():
+        (output / f"{name}_sweep.md").write_text(create_sweep_table(solution_results))
+
+    size = spec.get("size", next(iter(spec["parameters"])))
+    points_by_metric = {"time": {}, "memory": {}}
+    for name, solution_results in results.items():
+        ok = [r for r in solution_results if not r.get("skipped") and all(code == 0 for code in r["exit_codes"])]
+        points_by_metric["time"][name] = [(r["parameters"][size], statistics.median(r["times"])) for r in ok]
+        points_by_metric["memory"][name] = [(r["parameters"][size], r["max_rss"]) for r in ok if r.get("max_rss")]
+    fits = estimate_complexity(points_by_metric)
+    (output / "complexity.json").write_text(json.dumps({"size": size, "results": fits}, indent=2))
+    (output / "complexity.md").write_text(create_complexity_table(fits))
+    return results
@@ -1,4 +1,12 @@
 
+def solution_module(path):
+    """Name of the module to import for a solution file or a solution folder with a `src` layout."""
+    if path.is_dir():
+        assert (path / "src").exists(), f"Source folder {path / 'src'} does not exist"
+        return list((path / "src").iterdir())[0].name
+    return path.name.removesuffix(".py")
+
+
 def create_command(path, testfile, generic=False):
     """Create a command to execute a test file using a given path and interpreter."""
     testcode = testfile.read_text()
@@ -12,12 +20,12 @@ def create_command(path, testfile, generic=False):
         return "import {module}; {module}.{" + testcode + "} \
         "
 
-    if path.is_dir():
-        assert (path / "src").exists(), f"Source folder {path / 'src'} does not exist"
-        module = list((path / "src").iterdir())[0].name
-    else:
-        module = path.name.removesuffix(".py")
+    return create_code_command(path, testcode)
+
 
+def create_code_command(path, testcode):
+    """Create a command to execute a call of the solution module, like the call in a test file."""
+    module = solution_module(path)
     command = f"""import {module}; {module}.{testcode}
     """
     return command
\ No newline at end of file
@@ -0,0 +1,31 @@
+import json
+import sys
+
+from benchie.accounting import main
+from benchie.measure import measure
+
+# a child that writes, and a grandchild that writes and allocates
+WRITE = "import sys; open(sys.argv[1], 'ab').write(b'x' * 1_000_000)"
+SPAWN = f"""
+import subprocess, sys
+{WRITE}
+subprocess.run([sys.executable, '-c', "{WRITE}; y = bytearray(64 * 1024 * 1024)", sys.argv[1]], check=True)
+"""
+
+
+def test_measure_accounts_descendants(tmp_path):
+    sample = measure([sys.executable, "-c", SPAWN, str(tmp_path / "out")])
+    assert sample["exit_code"] == 0
+    assert sample["wchar"] >= 2_000_000
+    assert sample["max_rss"] > 64 * 1024 * 1024
+    assert sample["minor_faults"] > 0
+    assert sample["voluntary_cs"] + sample["involuntary_cs"] > 0
+
+
+def test_accounting_wrapper(tmp_path):
+    record = tmp_path / "runs.jsonl"
+    for _ in range(2):
+        assert main(["--record", str(record), sys.executable, "-c", SPAWN, str(tmp_path / "out")]) == 0
+    runs = [json.loads(line) for line in record.read_text().splitlines()]
+    assert len(runs) == 2
+    assert all(run["wchar"] >= 2_000_000 and run["exit_code"] == 0 for run in runs)
@@ -0,0 +1,44 @@
+import json
+from itertools import chain, repeat
+
+from benchie.adaptive import run_adaptive_all, sample_adaptive
+
+
+def fake_run(walls):
+    walls = iter(walls)
+    return lambda: {"wall": next(walls), "user": 0.0, "system": 0.0, "exit_code": 0}
+
+
+def test_adaptive_skips_warmup_until_stationary():
+    # two slow cold runs, then a steady state
+    run = fake_run(chain([3.0, 2.0], repeat(1.0)))
+    samples, n_warmup, stop_reason = sample_adaptive(run, target_ci=0.05, time_budget=100)
+    assert n_warmup == 2
+    assert stop_reason == "converged"
+    assert all(s["wall"] == 1.0 for s in samples)
+
+
+def test_adaptive_counts_seed_as_warmup():
+    seed = [{"wall": 3.0, "user": 0.0, "system": 0.0, "exit_code": 0}]
+    run = fake_run(chain([2.0], repeat(1.0)))
+    samples, n_warmup, _ = sample_adaptive(run, target_ci=0.05, time_budget=100, seed=seed)
+    assert n_warmup == 2
+    assert all(s["wall"] == 1.0 for s in samples)
+
+
+def test_adaptive_stops_on_time_budget():
+    run = fake_run(chain.from_iterable(repeat([1.0, 2.0])))
+    samples, _, stop_reason = sample_adaptive(run, target_ci=0.01, time_budget=10, max_warmup=0)
+    assert stop_reason == "time_budget"
+    assert sum(s["wall"] for s in samples) <= 12
+
+
+def test_sleep_adaptive(sleep_solution, sleep_data, tmp_path):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    run_adaptive_all(tmp_path, solutions, testfile, target_ci=0.5, time_budget=2, timeout=10)
+    results = json.loads((tmp_path / "data_01_adaptive.json").read_text())["results"]
+    assert [c["command"] for c in results] == ["sleep_fast", "sleep_slow"]
+    for c in results:
+        assert c["stop_reason"] in {"converged", "time_budget"}
+        assert c["n_samples"] == len(c["times"]) >= 3
@@ -0,0 +1,94 @@
+import json
+import shutil
+import sys
+
+import pytest
+
+from benchie.benchmark import BenchmarkOption, _cache_settings, benchmark
+from benchie.cache import ResultCache, hash_tree
+
+
+def test_hash_tree_ignores_pycache(sleep_solution, tmp_path):
+    solution = tmp_path / "solution"
+    shutil.copytree(sleep_solution, solution)
+    before = hash_tree(solution)
+    (solution / "__pycache__").mkdir(exist_ok=True)
+    (solution / "__pycache__" / "sleep_fast.cpython.pyc").write_bytes(b"\0")
+    assert hash_tree(solution) == before
+    (solution / "sleep_fast.py").write_text("changed")
+    assert hash_tree(solution) != before
+
+
+def test_cache_skips_unchanged_solutions(sleep_solution, sleep_data, tmp_path, monkeypatch):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    cache = ResultCache(tmp_path / "cache")
+    options = [BenchmarkOption.MEMRAY_IMPORTS.value]
+    kwargs = {"timeout": 10, "disable_pretest": False, "benchmark_options": options, "cache": cache}
+    assert benchmark(testfile, tmp_path / "first", solutions, **kwargs) == solutions
+    peak = (tmp_path / "first" / "sleep_fast_memray_imports.txt").read_text()
+
+    # nothing changed, so nothing should run again
+    def fail(*args, **kwargs):
+        pytest.fail("cached solution was run again")
+
+    # benchie.benchmark is shadowed by the function of the same name
+    module = sys.modules["benchie.benchmark"]
+    monkeypatch.setattr(module, "pretest_solution", fail)
+    monkeypatch.setattr(module, "measure", fail)
+    monkeypatch.setattr(module, "run_memray_all", fail)
+    assert benchmark(testfile, tmp_path / "second", solutions, **kwargs) == solutions
+    assert (tmp_path / "second" / "sleep_fast_memray_imports.txt").read_text() == peak
+    # the resources of the pretest runs are restored too
+    resources = json.loads((tmp_path / "second" / "data_01_resources.json").read_text())["results"]
+    assert [c["command"] for c in resources] == ["sleep_fast", "sleep_slow"]
+
+
+def test_changed_solutions(sleep_solution, sleep_data, tmp_path):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    cache = ResultCache(tmp_path / "cache")
+    kwargs = {"timeout": 10, "disable_pretest": False, "benchmark_options": [], "cache": cache}
+    # only the changed solutions run, sleep_slow is not cached yet
+    assert benchmark(testfile, tmp_path / "first", solutions, changed={"sleep_fast"}, **kwargs) == solutions[:1]
+    assert benchmark(testfile, tmp_path / "second", solutions, **kwargs) == solutions
+    # the unchanged solutions are restored from the cache
+    assert benchmark(testfile, tmp_path / "third", solutions, changed=set(), **kwargs) == solutions
+
+
+def test_cache_skips_failures_not_timeouts(sleep_data, tmp_path, monkeypatch):
+    testfile = sleep_data / "data_01.py"
+    solutions = tmp_path / "solutions"
+    solutions.mkdir()
+    (solutions / "broken.py").write_text("def example_sleep(n):\n    raise ValueError(n)\n")
+    (solutions / "hangs.py").write_text("import time\n\n\ndef example_sleep(n):\n    time.sleep(60)\n")
+    all_solutions = sorted(solutions.glob("*.py"))
+    kwargs = {"timeout": 1, "disable_pretest": False, "benchmark_options": [], "cache": ResultCache(tmp_path / "cache")}
+    assert benchmark(testfile, tmp_path / "first", all_solutions, **kwargs) == []
+
+    module = sys.modules["benchie.benchmark"]
+    pretest_solution = module.pretest_solution
+    ran = []
+
+    def pretest(solution, *args, **kwargs):
+        ran.append(solution.stem)
+        return pretest_solution(solution, *args, **kwargs)
+
+    monkeypatch.setattr(module, "pretest_solution", pretest)
+    assert benchmark(testfile, tmp_path / "second", all_solutions, **kwargs) == []
+    # the failure is cached, a timeout can be transient and runs again
+    assert ran == ["hangs"]
+    status = json.loads((tmp_path / "second" / "data_01_status.json").read_text())
+    assert status == {"broken": "failed", "hangs": "timeout"}
+
+
+def test_cache_settings():
+    options = {"time_budget": 10.0, "pretest_as_warmup": False, "target_ci": 0.05, "min_runs": 3, "batch_size": 1}
+    hyperfine = _cache_settings([BenchmarkOption.HYPERFINE.value], 10, False, None, **options)
+    for setting in ("time_budget", "pretest_as_warmup", "min_runs", "batch_size", "interference"):
+        assert setting in hyperfine
+    interference = [BenchmarkOption.HYPERFINE.value, BenchmarkOption.INTERFERENCE.value]
+    assert _cache_settings(interference, 10, False, None, **options) != hyperfine
+    # the settings of the timed benchmarks do not change the memory peaks
+    memray = _cache_settings([BenchmarkOption.MEMRAY_IMPORTS.value], 10, False, None, **options)
+    assert memray == {"timeout": 10, "disable_pretest": False}
@@ -0,0 +1,47 @@
+import json
+
+from benchie.calibration import calibrate, set_hash_seed, write_calibration, write_normalised
+from benchie.runtime import solution_env
+
+
+def test_calibration(tmp_path, monkeypatch):
+    monkeypatch.delenv("PYTHONHASHSEED", raising=False)
+    assert set_hash_seed(0) == "0"
+    before, after = calibrate(repeats=3), calibrate(repeats=3)
+    assert set(before["workloads"]) == {"cpu", "alloc", "io"}
+    assert before["environment"]["pythonhashseed"] == "0"
+    assert before["environment"]["cpu_count"]
+
+    # the first host becomes the reference machine
+    reference = tmp_path / "reference.json"
+    summary = write_calibration(tmp_path, before, after, reference)
+    assert reference.exists()
+    assert 0.5 < summary["speed_factor"] < 2
+    assert json.loads((tmp_path / "calibration.json").read_text())["noise_floor"] == summary["noise_floor"]
+
+    # a reference machine that is twice as fast
+    faster = json.loads(reference.read_text())
+    for workload in faster["workloads"].values():
+        workload["median"] /= 2
+    reference.write_text(json.dumps(faster))
+    summary = write_calibration(tmp_path, before, before, reference)
+    assert abs(summary["speed_factor"] - 2) < 1e-9
+    assert summary["drift"] == 0
+
+    output = tmp_path / "data_01"
+    output.mkdir()
+    results = [{"command": "a", "mean": 1.0, "stddev": 0.1, "min": 0.9, "max": 1.1, "times": [0.9, 1.1]}]
+    (output / "data_01_benchmark.json").write_text(json.dumps({"results": results}))
+    table = write_normalised(tmp_path / "data_01.py", output, summary).read_text()
+    assert "0.500 ± 0.050" in table
+    assert "speed factor 2.00" in table
+
+
+def test_hash_seed(monkeypatch, sleep_solution):
+    monkeypatch.delenv("PYTHONHASHSEED", raising=False)
+    assert "PYTHONHASHSEED" not in solution_env(sleep_solution / "sleep_fast.py")
+    assert set_hash_seed(1) == "1"
+    # every engine runs the solutions with the seed, not only hyperfine
+    assert solution_env(sleep_solution / "sleep_fast.py") == {"PYTHONPATH": str(sleep_solution), "PYTHONHASHSEED": "1"}
+    # an exported seed takes precedence
+    assert set_hash_seed(2) == "1"
@@ -0,0 +1,43 @@
+import json
+
+from benchie.complexity import data_sizes, write_complexity
+
+
+def test_measured_sizes(tmp_path):
+    (tmp_path / "small.txt").write_text("a" * 10)
+    (tmp_path / "large.txt").write_text("a" * 1000)
+    (tmp_path / "data_01.py").write_text("f('small.txt')")
+    (tmp_path / "data_02.py").write_text("f('large.txt')")
+    (tmp_path / "data_03.py").write_text("f(3)")
+    assert data_sizes(sorted(tmp_path.glob("data_*.py"))) == {"data_01": 10, "data_02": 1000}
+
+
+def test_complexity_flags_quadratic(tmp_path):
+    data = tmp_path / "data"
+    output = tmp_path / "output"
+    data.mkdir()
+    sizes = {"data_01": 100, "data_02": 1000, "data_03": 10000}
+    (data / "sizes.json").write_text(json.dumps(sizes))
+    data_paths = []
+    for name, n in sizes.items():
+        (data / f"{name}.py").write_text(f"f({n})")
+        data_paths.append(data / f"{name}.py")
+        (output / name).mkdir(parents=True)
+        results = [
+            {"command": "linear", "mean": n * 1e-5, "median": n * 1e-5},
+            {"command": "quadratic", "mean": n**2 * 1e-8, "median": n**2 * 1e-8},
+        ]
+        (output / name / f"{name}_benchmark.json").write_text(json.dumps({"results": results}))
+        (output / name / "quadratic_memray.txt").write_text(f"{n / 1000:.3f}MB")
+
+    results = {r["command"]: r for r in write_complexity(output, data_paths)}
+    assert abs(results["linear"]["time"]["exponent"] - 1) < 0.01
+    assert abs(results["quadratic"]["time"]["exponent"] - 2) < 0.01
+    assert results["quadratic"]["time"]["r2"] > 0.99
+    assert abs(results["quadratic"]["memory"]["exponent"] - 1) < 0.01
+    assert results["quadratic"]["flagged"]
+    assert not results["linear"]["flagged"]
+    table = (output / "complexity.md").read_text()
+    # the slowest scaling comes first
+    assert table.index("`quadratic` ⚠") < table.index("`linear`")
+    assert json.loads((output / "complexity.json").read_text())["sizes"] == sizes
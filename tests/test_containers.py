@@ -0,0 +1,42 @@
+from benchie.benchmark import pretest_all
+from benchie.containers import ContainerPool, LocalRuntime, split_cores
+
+
+def test_split_cores():
+    cpusets = split_cores(3)
+    assert len(cpusets) == 3
+    assert all(cpuset for cpuset in cpusets)
+
+
+def test_sleep_container_pool(sleep_solution, sleep_data):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    runtime = LocalRuntime()
+    with ContainerPool(runtime, image=None, size=1) as pool:
+        (container,) = pool.containers
+        root = runtime.roots[container]
+        samples = [pool.run(solution, testfile, timeout=10) for solution in solutions * 2]
+        assert all(sample["exit_code"] == 0 for sample in samples)
+        # every solution is copied in once, however often it runs
+        assert len({dst for dst, _ in pool._copied[container] if dst.startswith("/submission")}) == len(solutions)
+
+        correct = pretest_all(solutions, testfile, timeout=10, pool=pool)
+        assert [solution["path"] for solution in correct] == solutions
+    # the containers are stopped afterwards
+    assert not root.exists()
+
+
+def test_changed_folder_solution(sleep_data, tmp_path):
+    testfile = sleep_data / "data_01.py"
+    solution = tmp_path / "student"
+    package = solution / "src" / "student"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("def example_sleep(n):\n    pass\n")
+    runtime = LocalRuntime()
+    with ContainerPool(runtime, image=None, size=1) as pool:
+        assert pool.run(solution, testfile, timeout=10)["exit_code"] == 0
+        # the new version replaces the copy in the container, instead of being copied into it
+        (package / "__init__.py").write_text("def example_sleep(n):\n    raise SystemExit(3)\n")
+        assert pool.run(solution, testfile, timeout=10)["exit_code"] == 3
+        (container,) = pool.containers
+        assert not (runtime.roots[container] / "submission" / "student" / "student").exists()
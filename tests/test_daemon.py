@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from benchie.daemon import Backoff, SolutionsWatcher, Trigger, notify, serve, start_notify_server
+
+
+def _notify(port, body):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/notify", data=json.dumps(body).encode(), method="POST")
+    with urllib.request.urlopen(request) as response:  # noqa: S310
+        return response.status
+
+
+def test_daemon(tmp_path):
+    trigger = Trigger()
+    server = start_notify_server(trigger, port=0)
+    port = server.server_address[1]
+    cycles = []
+
+    def cycle(changed, fetch):
+        cycles.append((changed, fetch))
+        if len(cycles) == 2:
+            trigger.close()
+        return False
+
+    # notifications close together are coalesced into a single cycle
+    assert _notify(port, {"solutions": ["solution_1"]}) == 202
+    assert _notify(port, {"solutions": ["solution_2"], "fetch": False}) == 202
+    thread = threading.Thread(target=serve, args=(cycle, trigger, Backoff(0.2, 1)), kwargs={"debounce": 0.2})
+    thread.start()
+    thread.join(timeout=10)
+    server.shutdown()
+    assert not thread.is_alive()
+    # after the notifications, nothing is notified, so it polls
+    assert cycles == [({"solution_1", "solution_2"}, True), (None, True)]
+
+
+def test_notify_invalid():
+    server = start_notify_server(Trigger(), port=0)
+    with pytest.raises(urllib.error.HTTPError) as e:
+        _notify(server.server_address[1], {"solutions": "solution_1"})
+    assert e.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as e:
+        _notify(server.server_address[1], {"fetch": "no"})
+    server.shutdown()
+    assert e.value.code == 400
+
+
+def test_notify_synced():
+    trigger = Trigger()
+    server = start_notify_server(trigger, port=0)
+    # e.g. after `benchie fetch_subgit --notify`
+    assert notify(f"http://127.0.0.1:{server.server_address[1]}/", ["solution_2", "solution_1"]) == 202
+    changes = trigger.wait(5, debounce=0.05)
+    server.shutdown()
+    assert changes.solutions == {"solution_1", "solution_2"}
+    assert not changes.fetch
+
+
+def test_watch(tmp_path):
+    (tmp_path / "solution_1.py").write_text("print(1)")
+    (tmp_path / "solution_2").mkdir()
+    (tmp_path / "solution_2" / "main.py").write_text("print(2)")
+    trigger = Trigger()
+    watcher = SolutionsWatcher(trigger, tmp_path, interval=0.05)
+    watcher.start()
+    time.sleep(0.2)
+    # compiled files do not count as a change
+    (tmp_path / "solution_2" / "__pycache__").mkdir()
+    (tmp_path / "solution_2" / "__pycache__" / "main.cpython-311.pyc").write_bytes(b"")
+    assert trigger.wait(0.3, debounce=0.05) is None
+    (tmp_path / "solution_2" / "main.py").write_text("print(2.0)")
+    (tmp_path / "solution_3.py").write_text("print(3)")
+    changes = trigger.wait(5, debounce=0.2)
+    watcher.stop()
+    assert changes.solutions == {"solution_2", "solution_3"}
+    assert not changes.fetch
@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from benchie.benchmark import BenchmarkOption
+from benchie.distributed import Heartbeat, JobQueue, coordinate
+
+
+def test_distributed(sleep_solution, sleep_data, tmp_path):
+    testfiles = [sleep_data / "data_01.py", sleep_data / "data_02.py"]
+    solutions = sorted(sleep_solution.glob("*.py"))
+    queue = tmp_path / "queue.sqlite"
+    output = tmp_path / "output"
+    options = [BenchmarkOption.FORKSERVER.value, BenchmarkOption.MEMRAY_TRACKER.value]
+
+    # create the database up front, so the jobs can be counted before the coordinator submits them
+    JobQueue(queue).close()
+    counts = {}
+    coordinator = threading.Thread(
+        target=lambda: counts.update(
+            coordinate(queue, output, testfiles, solutions, options, {"timeout": 10}, poll=0.1)
+        ),
+        daemon=True,
+    )
+    coordinator.start()
+    while not sqlite3.connect(queue).execute("SELECT COUNT(*) FROM jobs").fetchone()[0]:
+        time.sleep(0.05)
+    worker = f"from benchie.distributed import run_worker; run_worker({str(queue)!r})"
+    workers = [subprocess.Popen([sys.executable, "-c", worker], cwd=tmp_path) for _ in range(2)]  # noqa: S603
+    for process in workers:
+        assert process.wait(timeout=120) == 0
+    coordinator.join(timeout=60)
+    assert counts == {"done": 8}
+
+    # every job was claimed exactly once
+    connection = sqlite3.connect(queue)
+    assert connection.execute("SELECT DISTINCT attempts FROM jobs").fetchall() == [(1,)]
+    assert connection.execute("SELECT COUNT(*) FROM hosts").fetchone()[0] == 1
+
+    for testfile in testfiles:
+        output_data = output / testfile.stem
+        results = json.loads((output_data / f"{testfile.stem}_forkserver.json").read_text())["results"]
+        assert [c["command"] for c in results] == ["sleep_fast", "sleep_slow"]
+        assert all(c["host"] for c in results)
+        assert (output_data / "sleep_slow_memray.txt").exists()
+        assert json.loads((output_data / f"{testfile.stem}_status.json").read_text()) == {
+            "sleep_fast": "ok",
+            "sleep_slow": "ok",
+        }
+        assert (output_data / f"{testfile.stem}_forkserver_benchmark.md").exists()
+    assert (output / "leaderboard.md").exists()
+
+
+def test_lease(tmp_path):
+    path = tmp_path / "queue.sqlite"
+    with JobQueue(path) as queue:
+        queue.submit([("a.py", "data_01.py", ["hyperfine"])], {})
+        job = queue.claim("worker_1", "host")
+        # the heartbeat keeps the job of a slow worker on the queue
+        beat = Heartbeat(path, job["id"], "worker_1", interval=0.05)
+        beat.start()
+        time.sleep(0.5)
+        assert queue.requeue_stale(0.3) == 0
+        beat.stop()
+
+        # without a heartbeat, the job is requeued and claimed by another worker
+        time.sleep(0.2)
+        assert queue.requeue_stale(0.1) == 1
+        assert queue.claim("worker_2", "host")["id"] == job["id"]
+        # the first worker no longer holds the job, its outputs are ignored
+        assert not queue.renew(job["id"], "worker_1")
+        assert not queue.complete(job["id"], "worker_1", {"stale.json": "{}"})
+        assert not queue.fail(job["id"], "worker_1", "error")
+        assert queue.complete(job["id"], "worker_2", {"data_01_benchmark.json": "{}"})
+        assert [result["files"] for result in queue.results(1)] == [{"data_01_benchmark.json": "{}"}]
+
+
+def test_worker_cores(tmp_path):
+    with JobQueue(tmp_path / "queue.sqlite") as queue:
+        other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        try:
+            # two workers on the same node never get the same core
+            worker_1, worker_2 = f"node:{os.getpid()}", f"node:{other.pid}"
+            assert queue.claim_core("node", worker_1, [1, 2]) == 1
+            assert queue.claim_core("node", worker_2, [1, 2]) == 2
+            assert queue.claim_core("node", f"node:{os.getppid()}", [1, 2]) is None
+            assert queue.claim_core("other_node", worker_2, [1, 2]) == 1
+        finally:
+            other.kill()
+            other.wait()
+        # the core of a worker that stopped is free again
+        assert queue.claim_core("node", f"node:{os.getppid()}", [1, 2]) == 2
+        queue.release_cores("node", worker_1)
+        assert queue.claim_core("node", f"node:{os.getppid()}", [1]) == 1
@@ -1,11 +1,11 @@
-from benchie.benchmark import run_once_docker
+from benchie.benchmark import pretest_solution
 from benchie.runtime import run_hyperfine_process_docker
 
 
-def test_run_once_docker(docker_image, sleep_solution, sleep_data):
+def test_pretest_docker(docker_image, sleep_solution, sleep_data):
     testfile = sleep_data / "data_01.py"
     solution = next(iter(sleep_solution.glob("*.py")))
-    run_once_docker(docker_image, solution, testfile, 10)
+    assert pretest_solution(solution, testfile, 10, docker_image=docker_image)["exit_code"] == 0
 
 
 def test_run_hyperfine_process_docker(docker_image, sleep_solution, sleep_data, tmp_path):
@@ -16,10 +16,10 @@ def test_run_hyperfine_process_docker(docker_image, sleep_solution, sleep_data,
     )
 
 
-def test_bio_run_once_docker(docker_image, bio_solution, bio_data):
+def test_bio_pretest_docker(docker_image, bio_solution, bio_data):
     testfile = bio_data / "data_01.py"
     solution = next(iter(bio_solution.glob("*.py")))
-    run_once_docker(docker_image, solution, testfile, 10)
+    assert pretest_solution(solution, testfile, 10, docker_image=docker_image)["exit_code"] == 0
 
 
 def test_bio_run_hyperfine_process_docker(docker_image, bio_solution, bio_data, tmp_path):
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from benchie.events import EventStream, outcome
+
+
+def test_events(tmp_path):
+    stream = EventStream()
+    stream.configure(events_path=tmp_path / "events.jsonl", metrics_path=tmp_path / "metrics" / "benchie.prom")
+
+    stream.queue("pretest", 2)
+    with stream.stage("pretest", dataset="data_01"):
+        stream.run("pretest", "a", "data_01", outcome(0), duration=0.2)
+        stream.run("pretest", "b", "data_01", outcome(None), duration=30.0)
+        stream.queue("pretest", 0)
+    with pytest.raises(RuntimeError), stream.stage("benchmark", dataset="data_01"):
+        raise RuntimeError
+    stream.cycle_succeeded(exercise="global_alignment")
+
+    lines = [json.loads(line) for line in (tmp_path / "events.jsonl").read_text().splitlines()]
+    assert [line["event"] for line in lines] == [
+        "queue",
+        "stage_start",
+        "run",
+        "run",
+        "queue",
+        "stage_finish",
+        "stage_start",
+        "stage_finish",
+        "cycle_succeeded",
+    ]
+    assert lines[3]["outcome"] == "timeout"
+    assert lines[5]["outcome"] == "ok"
+    assert lines[5]["dataset"] == "data_01"
+    assert lines[7]["outcome"] == "error"
+
+    metrics = (tmp_path / "metrics" / "benchie.prom").read_text()
+    assert 'benchie_runs_total{engine="pretest",outcome="ok"} 1' in metrics
+    assert 'benchie_runs_total{engine="pretest",outcome="timeout"} 1' in metrics
+    assert 'benchie_timeouts_total{engine="pretest"} 1' in metrics
+    assert 'benchie_queue_depth{stage="pretest"} 0' in metrics
+    assert 'benchie_stages_total{outcome="error",stage="benchmark"} 1' in metrics
+    assert 'benchie_stage_duration_seconds_bucket{le="+Inf",stage="pretest"} 1' in metrics
+    assert 'benchie_stage_duration_seconds_count{stage="benchmark"} 1' in metrics
+    assert "benchie_cycles_total 1" in metrics
+    assert "benchie_last_successful_cycle_timestamp_seconds " in metrics
+    # the metrics file is replaced atomically, no temporary files are left behind
+    assert [p.name for p in (tmp_path / "metrics").iterdir()] == ["benchie.prom"]
+
+
+def test_events_disabled(tmp_path):
+    stream = EventStream()
+    with stream.stage("fetch"):
+        stream.run("pretest", "a", "data_01", "ok")
+    assert not stream.enabled
+    assert stream.metrics() == "\n"
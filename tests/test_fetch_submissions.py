@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from benchie import fetch_submissions
+from benchie.fetch_submissions import main, refresh
+
+
+class _Dodona(BaseHTTPRequestHandler):
+    """Stub of the Dodona API, with an ETag on every response."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.delay)
+        url = urlparse(self.path)
+        server.requests[url.path] += 1
+        server.tokens.add(self.headers["Authorization"])
+        base = f"http://{server.server_address[0]}:{server.server_address[1]}/"
+        if url.path.endswith("/submissions/"):
+            page = int(parse_qs(url.query)["page"][0])
+            ids = server.submissions if page == 0 else []
+            body = [{"id": i, "url": f"{base}submissions/{i}", "user": f"{base}users/{i}"} for i in ids]
+        elif url.path.startswith("/submissions/"):
+            i = int(url.path.rsplit("/", 1)[1])
+            result = json.dumps({"accepted": True, "groups": [{"name": "a"}, {"name": "b"}]})
+            body = {"code": f"print({i})\n", "result": result}
+        else:
+            body = {"name": f"student {url.path.rsplit('/', 1)[1]}"}
+        data = json.dumps(body).encode()
+        etag = f'"{hash(data)}"'
+        if self.headers.get("If-None-Match") == etag:
+            server.not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def dodona():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Dodona)
+    server.submissions = [1, 2]
+    server.requests = Counter()
+    server.tokens = set()
+    server.not_modified = 0
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_submissions(tmp_path, dodona):
+    token = tmp_path / "token"
+    token.write_text("secret\n")
+    solutions = tmp_path / "solutions"
+    base = f"http://127.0.0.1:{dodona.server_address[1]}/"
+
+    def fetch(**kwargs):
+        return main(solutions, course_id=1, exercise_id=2, token=token, jobs=4, base=base, **kwargs)
+
+    assert fetch() == 0
+    assert dodona.tokens == {"secret"}
+    assert sorted(p.name for p in solutions.glob("solution_*.py")) == ["solution_1.py", "solution_2.py"]
+    assert (solutions / "solution_2.py").read_text() == "print(2)\n"
+    students = json.loads((solutions / "students.json").read_text())
+    assert students["1"]["user"] == {"name": "student 1"}
+    assert students["1"]["result"]["groups"] == {"name": "b"}
+    # the code and the result of a submission share a single request
+    assert dodona.requests["/submissions/1"] == 1
+
+    assert fetch() == 1
+    assert dodona.not_modified == 4
+
+    # a new submission replaces the submission of student 1, the other solution is not written again
+    mtime = (solutions / "solution_2.py").stat().st_mtime_ns
+    dodona.submissions = [3, 2]
+    assert fetch() == 0
+    assert sorted(p.name for p in solutions.glob("solution_*.py")) == ["solution_2.py", "solution_3.py"]
+    assert (solutions / "solution_2.py").stat().st_mtime_ns == mtime
+    # the empty pages, the user and the submission of student 2 were not modified
+    assert dodona.requests["/submissions/2"] == 2
+    assert dodona.not_modified == 4 + 3 + 2
+
+
+def test_fetch_timeout(tmp_path, dodona, monkeypatch):
+    token = tmp_path / "token"
+    token.write_text("secret\n")
+    base = f"http://127.0.0.1:{dodona.server_address[1]}/"
+    # a stalled request times out instead of hanging the fetch
+    dodona.delay = 1
+    with pytest.raises(requests.Timeout):
+        main(tmp_path / "solutions", course_id=1, exercise_id=2, token=token, base=base, timeout=0.2)
+
+    # and a refresh that fails is retried in the next cycle
+    def stalled(*args, **kwargs):
+        raise requests.Timeout
+
+    monkeypatch.setattr(fetch_submissions, "main", stalled)
+    assert refresh(1, 2, tmp_path / "solutions", token) is False
@@ -0,0 +1,49 @@
+import json
+import subprocess
+
+import pytest
+
+import benchie
+from benchie.benchmark import BenchmarkOption
+from benchie.forkserver import run_forkserver
+from benchie.reporting import postprocess_output
+
+
+def test_sleep_forkserver(sleep_solution, sleep_data, tmp_path):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    output = benchie.benchmark(
+        testfile=testfile,
+        output=tmp_path,
+        solutions=solutions,
+        timeout=10,
+        disable_pretest=False,
+        benchmark_options=[BenchmarkOption.FORKSERVER.value],
+    )
+    assert output == solutions
+    results = json.loads((tmp_path / "data_01_forkserver.json").read_text())["results"]
+    assert [c["command"] for c in results] == ["sleep_fast", "sleep_slow"]
+    fast, slow = results
+    # only the call is timed, not the interpreter startup
+    assert 0.001 <= fast["mean"] < 0.05
+    assert slow["mean"] > fast["mean"] + 0.05
+    assert len(fast["times_ns"]) == 10
+
+    postprocess_output(testfile, tmp_path)
+    table = (tmp_path / "data_01_forkserver_benchmark.md").read_text()
+    assert "Mean [ms]" in table
+
+
+def test_forkserver_setup_timeout(tmp_path):
+    # a solution that hangs on import never reaches the timed runs
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_forkserver("hang", "import time; time.sleep(60)", "pass", tmp_path / "hang.json", 0, 1, timeout=0.5)
+
+
+def test_forkserver_run_timeout(tmp_path):
+    # every run that hangs is killed at its deadline
+    json_path = tmp_path / "hang.json"
+    with pytest.raises(subprocess.CalledProcessError):
+        run_forkserver("hang", "pass", "import time; time.sleep(60)", json_path, 0, 2, timeout=0.3)
+    (result,) = json.loads(json_path.read_text())["results"]
+    assert result["exit_codes"] == [-9, -9]
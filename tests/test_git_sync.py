@@ -0,0 +1,49 @@
+import subprocess
+
+from benchie.git_sync import sync
+
+
+def _git(*args, cwd):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args], cwd=cwd, check=True)  # noqa: S603, S607
+
+
+def _commit(work, text):
+    (work / "solution.py").write_text(text)
+    _git("add", "solution.py", cwd=work)
+    _git("commit", "-q", "-m", text, cwd=work)
+    _git("push", "-q", "origin", "HEAD:master", cwd=work)
+
+
+def _remote(tmp_path, name):
+    bare = tmp_path / "remotes" / f"{name}.git"
+    bare.mkdir(parents=True)
+    _git("init", "-q", "--bare", "-b", "master", cwd=bare)
+    work = tmp_path / "work" / name
+    work.mkdir(parents=True)
+    _git("init", "-q", "-b", "master", cwd=work)
+    _git("remote", "add", "origin", bare.as_uri(), cwd=work)
+    _commit(work, f"print('{name} v1')\n")
+    return bare.as_uri(), work
+
+
+def test_sync(tmp_path):
+    alice, alice_work = _remote(tmp_path, "alice")
+    bob, _ = _remote(tmp_path, "bob")
+    repos = {"alice": alice, "bob": bob, "carol": (tmp_path / "remotes" / "carol.git").as_uri()}
+    solutions = tmp_path / "solutions"
+
+    # the repository of carol does not exist, it is skipped
+    changed = sync(repos, solutions, branch="master", jobs=2)
+    assert changed == {solutions / "solution_alice", solutions / "solution_bob"}
+    assert (solutions / "solution_bob" / "solution.py").read_text() == "print('bob v1')\n"
+
+    assert sync(repos, solutions, branch="master", jobs=2) == set()
+
+    _commit(alice_work, "print('alice v2')\n")
+    assert sync(repos, solutions, branch="master", jobs=2) == {solutions / "solution_alice"}
+    assert (solutions / "solution_alice" / "solution.py").read_text() == "print('alice v2')\n"
+
+    assert sync(repos, solutions, branch="master", force=True, jobs=2) == {
+        solutions / "solution_alice",
+        solutions / "solution_bob",
+    }
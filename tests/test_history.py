@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from benchie.history import History
+from benchie.reporting import postprocess_output
+
+
+def _write_iteration(output, times):
+    results = [
+        {"command": name, "mean": sum(t) / len(t), "stddev": 0.0, "median": sorted(t)[1], "min": min(t), "max": max(t)}
+        | {"times": t}
+        for name, t in times.items()
+    ]
+    (output / "data_01_benchmark.json").write_text(json.dumps({"results": results}))
+    (output / "fast_memray.txt").write_text("1.500MB")
+    (output / "slow_memray.txt").write_text("2.500MB")
+
+
+def test_history(tmp_path):
+    solutions = tmp_path / "solutions"
+    solutions.mkdir()
+    for name in ("fast", "slow"):
+        (solutions / f"{name}.py").write_text(f"# {name}")
+    testfile = tmp_path / "data" / "data_01.py"
+    testfile.parent.mkdir()
+    testfile.write_text("f()")
+    output = tmp_path / "output"
+    output.mkdir()
+    history = History(tmp_path / "history.sqlite")
+
+    for i in range(3):
+        iteration = history.start_iteration("exercise")
+        _write_iteration(output, {"fast": [1.0 + i, 1.1 + i, 1.2 + i], "slow": [5.0, 5.1, 5.2]})
+        assert history.record(iteration, testfile, output, sorted(solutions.glob("*.py"))) == 4
+
+    # the median of the samples of the last 2 iterations
+    assert history.median_time("fast", last=2) == pytest.approx(2.6)
+    assert history.median_time("fast", dataset="data_01", engine="hyperfine", last=1) == pytest.approx(3.1)
+    assert history.median_time("unknown") is None
+    timings = history.timings("data_01")
+    assert [c["times"] for c in timings["results"]] == [[3.0, 3.1, 3.2], [5.0, 5.1, 5.2]]
+    assert history.peaks("data_01") == ({}, {"fast": "1.500MB", "slow": "2.500MB"})
+
+    # the tables are rendered from the history, not from the output files
+    for p in output.glob("*"):
+        p.unlink()
+    postprocess_output(testfile, output, history=history)
+    table = (output / "data_01_memory_benchmark.md").read_text()
+    assert "| `fast` | 3.100 ± 0.000 | 3.000 | 3.200 | 1.500MB |" in table
+    history.close()
+
+
+def test_history_exercises(tmp_path):
+    solutions = tmp_path / "solutions"
+    solutions.mkdir()
+    for name in ("fast", "slow"):
+        (solutions / f"{name}.py").write_text(f"# {name}")
+    testfile = tmp_path / "data" / "data_01.py"
+    testfile.parent.mkdir()
+    testfile.write_text("f()")
+    output = tmp_path / "output"
+    output.mkdir()
+    history = History(tmp_path / "history.sqlite")
+
+    # the same datasets and solutions in two exercises
+    for exercise, times in (("alignment", [1.0, 1.1, 1.2]), ("assembly", [7.0, 7.1, 7.2])):
+        iteration = history.start_iteration(exercise)
+        _write_iteration(output, {"fast": times, "slow": [5.0, 5.1, 5.2]})
+        history.record(iteration, testfile, output, sorted(solutions.glob("*.py")))
+
+    assert history.median_time("fast", exercise="alignment") == pytest.approx(1.1)
+    assert history.median_time("fast", exercise="assembly") == pytest.approx(7.1)
+    assert history.timings("data_01", exercise="alignment")["results"][0]["times"] == [1.0, 1.1, 1.2]
+    assert history.timings("data_01")["results"][0]["times"] == [7.0, 7.1, 7.2]
+
+    postprocess_output(testfile, output, history=history, exercise="alignment")
+    assert "| `fast` | 1.100 ± 0.000 |" in (output / "data_01_memory_benchmark.md").read_text()
+    history.close()
@@ -0,0 +1,80 @@
+import json
+import sys
+import time
+
+from benchie import accounting
+from benchie.interference import InterferenceMonitor, remeasure, write_interference_json
+from benchie.runtime import hyperfine_markdown
+
+
+class FakeMonitor:
+    def __init__(self, samples):
+        self.samples = samples
+
+    def snapshot(self):
+        return list(self.samples)
+
+
+def test_monitor():
+    monitor = InterferenceMonitor(interval_ms=50).start()
+    time.sleep(0.3)
+    samples = monitor.stop()
+    assert len(samples) > 2
+    assert all(samples[i]["time"] < samples[i + 1]["time"] for i in range(len(samples) - 1))
+    assert any("external_cpu" in sample for sample in samples)
+
+
+def test_accounted_window(tmp_path):
+    record_path = tmp_path / "runs.jsonl"
+    before = time.time()
+    assert accounting.main(["--record", str(record_path), sys.executable, "-c", "pass"]) == 0
+    record = json.loads(record_path.read_text())
+    assert before <= record["start"] < record["end"] <= time.time()
+
+
+def test_remeasure(tmp_path):
+    # the CPU is under pressure during the second second, and the disk during the fourth
+    monitor = FakeMonitor([
+        {"time": 0.0},
+        {"time": 1.0, "cpu_pressure": 0.0, "io_pressure": 0.0},
+        {"time": 2.0, "cpu_pressure": 0.5, "io_pressure": 0.0},
+        {"time": 3.0, "cpu_pressure": 0.0, "io_pressure": 0.0},
+        {"time": 4.0, "cpu_pressure": 0.0, "io_pressure": 0.3},
+        {"time": 6.0, "cpu_pressure": 0.0, "io_pressure": 0.0},
+    ])
+    results = [
+        {"command": "a", "mean": 0.3, "times": [0.1, 0.7, 0.1], "exit_codes": [0, 0, 0]},
+        {"command": "b", "mean": 0.2, "times": [0.2, 0.2], "exit_codes": [0, 0]},
+    ]
+    runs = {
+        "a": [{"start": 0.2, "end": 0.3}, {"start": 1.2, "end": 1.9}, {"start": 2.2, "end": 2.3}],
+        "b": [{"start": 2.5, "end": 2.7}, {"start": 3.5, "end": 3.7}],
+    }
+    measured = []
+
+    def measure(pending):
+        measured.append(dict(pending))
+        # the first retry of b is contaminated again
+        starts = {"a": 2.5, "b": 3.2} if len(measured) == 1 else {"b": 5.0}
+        return {
+            name: (
+                {"command": name, "times": [0.1] * n, "exit_codes": [0] * n},
+                [{"start": starts[name], "end": starts[name] + 0.1}] * n,
+            )
+            for name, n in pending.items()
+        }
+
+    results, discarded = remeasure(results, runs, monitor, measure)
+    assert measured == [{"a": 1, "b": 1}, {"b": 1}]
+    a, b = results
+    assert a["times"] == [0.1, 0.1, 0.1]
+    assert a["mean"] == 0.1 and a["max"] == 0.1
+    assert a["interference"] == {"discarded": 1, "reasons": {"cpu_pressure": 1}, "remeasured": 1}
+    assert b["times"] == [0.2, 0.1]
+    assert b["interference"] == {"discarded": 2, "reasons": {"io_pressure": 2}, "remeasured": 1}
+    assert [run["time"] for run in discarded["a"]] == [0.7]
+
+    table = hyperfine_markdown(results)
+    assert "Discarded 3 contaminated sample(s): `a` 1 (cpu_pressure 1), `b` 2 (io_pressure 2)." in table
+    report = write_interference_json(tmp_path / "data_01_interference.json", monitor.samples, discarded)
+    assert report["peaks"] == {"cpu_pressure": 0.5, "io_pressure": 0.3}
@@ -0,0 +1,61 @@
+import csv
+import json
+
+from benchie.leaderboard import write_leaderboard
+
+
+def _write_dataset(output, name, times, memory, status):
+    output_data = output / name
+    output_data.mkdir(parents=True)
+    results = [{"command": solution, "mean": t, "median": t} for solution, t in times.items()]
+    (output_data / f"{name}_benchmark.json").write_text(json.dumps({"results": results}))
+    for solution, peak in memory.items():
+        (output_data / f"{solution}_memray.txt").write_text(peak)
+    (output_data / f"{name}_status.json").write_text(json.dumps(status))
+
+
+def test_leaderboard(tmp_path):
+    _write_dataset(
+        tmp_path,
+        "data_01",
+        {"a": 1.0, "b": 2.0, "c": 1.0},
+        {"a": "4.000MB", "b": "1.000MB", "c": "1.000MB"},
+        {"a": "ok", "b": "ok", "c": "ok", "d": "failed"},
+    )
+    _write_dataset(
+        tmp_path,
+        "data_02",
+        {"a": 10.0, "b": 10.0},
+        {"a": "10.000MB", "b": "10.000MB"},
+        {"a": "ok", "b": "ok", "c": "timeout"},
+    )
+    data_paths = [tmp_path / "data_01.py", tmp_path / "data_02.py"]
+
+    leaderboard = write_leaderboard(tmp_path, data_paths, ["a", "b", "c", "d"])
+    # b is twice as slow on one dataset, a uses 4 times the best memory on one
+    assert [row["command"] for row in leaderboard] == ["b", "a", "c", "d"]
+    b, a, c, d = leaderboard
+    assert a["time_score"] == 1.0
+    assert a["memory_score"] == 2.0
+    assert abs(a["score"] - 2**0.5) < 1e-9
+    assert abs(b["score"] - 2**0.25) < 1e-9
+    # c is the best on the only dataset it finished, but ranks after the solutions that finished both
+    assert c["score"] == 1.0
+    assert c["datasets"] == {"data_01": "ok", "data_02": "timeout"}
+    assert d["score"] is None
+    assert d["datasets"] == {"data_01": "failed", "data_02": "not run"}
+
+    assert "| 3 | `c` | 1.00 | 1.00 | 1.00 | 1/2 | data_02: timeout |" in (tmp_path / "leaderboard.md").read_text()
+    with open(tmp_path / "leaderboard.csv", newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    assert rows[3] == {
+        "rank": "4",
+        "command": "d",
+        "score": "",
+        "time_score": "",
+        "memory_score": "",
+        "n_datasets": "0",
+        "data_01": "failed",
+        "data_02": "not run",
+    }
+    assert json.loads((tmp_path / "leaderboard.json").read_text())["datasets"] == ["data_01", "data_02"]
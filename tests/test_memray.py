@@ -0,0 +1,18 @@
+import json
+
+from benchie.memray import run_memray_all
+from benchie.reporting import key_by_memory
+
+
+def test_sleep_memray_tracker(sleep_solution, sleep_data, tmp_path):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    peaks = run_memray_all(tmp_path, solutions, testfile, use_tracker=True, runs=2, timeout=30, jobs=2)
+    assert set(peaks) == set(solutions)
+    for solution in solutions:
+        peak = (tmp_path / f"{solution.stem}_memray.txt").read_text()
+        assert key_by_memory(peak) < float("inf")
+        stats = json.loads((tmp_path / "memray_0" / f"{solution.stem}_memray_stats.json").read_text())
+        assert stats["peak_memory"] > 0
+    # the flamegraph is only rendered on request
+    assert not list(tmp_path.rglob("*_flamegraph.html"))
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benchie.measure import measure
+from benchie.procfs import RssSampler, children, cmdline
+from benchie.runtime import assign_runs
+
+ALLOCATE = "import time; x = bytearray(64 * 1024 * 1024); time.sleep(0.3)"
+
+
+def test_measure_samples_rss():
+    sample = measure([sys.executable, "-c", ALLOCATE], rss_interval_ms=10)
+    assert sample["exit_code"] == 0
+    assert sample["rss"]["peak_rss"] > 64 * 1024 * 1024
+    assert sample["rss"]["peak_uss"] > 0
+    assert len(sample["rss"]["timeline"]) > 1
+
+
+def test_sampler_groups_runs(tmp_path):
+    (tmp_path / "a.py").write_text("")
+    (tmp_path / "b.py").write_text("")
+    # like hyperfine, a parent that starts one child per run
+    script = f"{sys.executable} -c 'import a; {ALLOCATE}'; {sys.executable} -c 'import b'; true"
+    process = subprocess.Popen(["/bin/sh", "-c", script], env={"PYTHONPATH": str(tmp_path)})  # noqa: S603
+    sampler = RssSampler(process.pid, interval_ms=5, group_under="sh").start()
+    process.wait()
+    runs = sampler.stop()
+    assigned = assign_runs(runs, ["a", "b"])
+    assert len(assigned["a"]) == 1
+    assert assigned["a"][0]["peak_rss"] > 64 * 1024 * 1024
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_getaffinity"), reason="no CPU affinity")
+def test_measure_pins(tmp_path):
+    cpu = max(os.sched_getaffinity(0))
+    out = tmp_path / "cpus"
+    sample = measure(
+        [sys.executable, "-c", f"import os; open({str(out)!r}, 'w').write(str(os.sched_getaffinity(0)))"], cpu=cpu
+    )
+    assert sample["exit_code"] == 0
+    assert out.read_text() == str({cpu})
+
+
+def test_children_of_threads():
+    # a child forked from a thread other than the main thread
+    code = "import subprocess, threading, time; threading.Thread(target=subprocess.run, args=(['sleep', '2'],)).start(); time.sleep(2)"
+    process = subprocess.Popen([sys.executable, "-c", code])  # noqa: S603
+    try:
+        for _ in range(100):
+            if children(process.pid):
+                break
+            time.sleep(0.02)
+        assert [cmdline(pid) for pid in children(process.pid)] == ["sleep 2"]
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,30 @@
+import json
+from itertools import cycle
+
+from benchie.racing import race, run_racing_all
+from benchie.reporting import postprocess_output
+
+
+def test_race_eliminates_slow_solutions():
+    walls = {"fast": cycle([1.0, 1.01, 0.99]), "slow": cycle([5.0, 5.05, 4.95])}
+
+    def run(solution, cpu):
+        return {"wall": next(walls[solution]), "user": 0.0, "system": 0.0, "exit_code": 0}
+
+    samples, eliminated = race(["fast", "slow"], run, rounds=3, runs_per_round=3)
+    assert eliminated == {"slow": 1}
+    assert len(samples["slow"]) == 3
+    # the budget of the eliminated solution goes to the leader
+    assert len(samples["fast"]) == 3 + 6 + 6
+
+
+def test_sleep_racing(sleep_solution, sleep_data, tmp_path):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    run_racing_all(tmp_path, solutions, testfile, rounds=2, timeout=10)
+    results = {c["command"]: c for c in json.loads((tmp_path / "data_01_racing.json").read_text())["results"]}
+    assert results["sleep_fast"]["eliminated_round"] is None
+    assert results["sleep_slow"]["eliminated_round"] == 1
+
+    postprocess_output(testfile, tmp_path)
+    assert "eliminated in round 1" in (tmp_path / "data_01_racing_benchmark.md").read_text()
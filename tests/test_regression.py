@@ -0,0 +1,79 @@
+import json
+
+from benchie.regression import detect_regressions
+
+
+def _write_times(output, times):
+    results = [{"command": name, "times": t} for name, t in times.items()]
+    (output / "data_01_benchmark.json").write_text(json.dumps({"results": results}))
+
+
+def test_detect_regressions(tmp_path):
+    solutions = tmp_path / "solutions"
+    solutions.mkdir()
+    for name in ("slower", "faster", "same", "noisy"):
+        (solutions / f"{name}.py").write_text("v1")
+    all_solutions = sorted(solutions.glob("*.py"))
+    testfile = tmp_path / "data_01.py"
+    output = tmp_path / "output"
+    output.mkdir()
+    previous = tmp_path / "previous"
+    base = [1.0, 1.02, 0.98, 1.01, 0.99, 1.03, 0.97]
+
+    _write_times(output, dict.fromkeys(("slower", "faster", "same", "noisy"), base))
+    # nothing to compare with the first version
+    assert detect_regressions(testfile, output, previous, all_solutions) == {}
+    assert not (output / "data_01_regressions.md").exists()
+
+    for name in ("slower", "faster", "noisy"):
+        (solutions / f"{name}.py").write_text("v2")
+    _write_times(
+        output,
+        {
+            "slower": [t * 1.5 for t in base],
+            "faster": [t * 0.5 for t in base],
+            "same": base,
+            "noisy": [0.99, 1.01, 1.0, 1.02, 0.98, 1.0, 1.01],
+        },
+    )
+    comparisons = detect_regressions(testfile, output, previous, all_solutions)
+    # an unchanged source is not compared
+    assert set(comparisons) == {"slower", "faster", "noisy"}
+    assert comparisons["slower"]["verdict"] == "regression"
+    assert comparisons["slower"]["effect_size"] == 1.0
+    assert comparisons["faster"]["verdict"] == "improvement"
+    assert comparisons["noisy"]["verdict"] == "unchanged"
+    table = (output / "data_01_regressions.md").read_text()
+    assert "regression ⚠" in table
+
+    # the same versions again, the report of the earlier run is removed
+    assert detect_regressions(testfile, output, previous, all_solutions) == {}
+    assert not (output / "data_01_regressions.md").exists()
+    assert not (output / "data_01_regressions.json").exists()
+
+
+def test_resubmission(tmp_path):
+    # a new Dodona submission replaces the solution of a student with a file named after the submission
+    solutions = tmp_path / "solutions"
+    solutions.mkdir()
+    testfile = tmp_path / "data_01.py"
+    output = tmp_path / "output"
+    output.mkdir()
+    previous = tmp_path / "previous"
+    base = [1.0, 1.02, 0.98, 1.01, 0.99, 1.03, 0.97]
+
+    students = {"11": {"user": {"id": 7}}, "12": {"user": {"id": 8}}}
+    (solutions / "students.json").write_text(json.dumps(students))
+    for submission in students:
+        (solutions / f"solution_{submission}.py").write_text("v1")
+    _write_times(output, {"solution_11": base, "solution_12": base})
+    assert detect_regressions(testfile, output, previous, sorted(solutions.glob("*.py"))) == {}
+
+    students = {"13": {"user": {"id": 7}}, "12": {"user": {"id": 8}}}
+    (solutions / "students.json").write_text(json.dumps(students))
+    (solutions / "solution_11.py").unlink()
+    (solutions / "solution_13.py").write_text("v2")
+    _write_times(output, {"solution_13": [t * 1.5 for t in base], "solution_12": base})
+    comparisons = detect_regressions(testfile, output, previous, sorted(solutions.glob("*.py")))
+    assert set(comparisons) == {"solution_13"}
+    assert comparisons["solution_13"]["verdict"] == "regression"
@@ -0,0 +1,31 @@
+import json
+import sys
+
+from benchie.runtime import assign_runs, available_cores, hyperfine_commands, merge_hyperfine_json
+from benchie.utils import create_command
+
+
+def test_merge_hyperfine_json(tmp_path):
+    for i, name in enumerate(["b", "a"]):
+        result = {"command": name, "mean": 1.0, "stddev": 0.1, "min": 0.9, "max": 1.1, "times": [1.0]}
+        (tmp_path / f"job_{i}.json").write_text(json.dumps({"results": [result]}))
+    json_paths = [tmp_path / "job_0.json", tmp_path / "job_1.json", tmp_path / "missing.json"]
+    merged = merge_hyperfine_json(json_paths, tmp_path / "merged.json", names=["a", "b"])
+    assert [x["command"] for x in merged["results"]] == ["a", "b"]
+    assert json.loads((tmp_path / "merged.json").read_text()) == merged
+
+
+def test_available_cores():
+    cores = available_cores(2)
+    assert 1 <= len(cores) <= 2
+
+
+def test_assign_runs_shell_testfile(tmp_path):
+    testfile = tmp_path / "data_01.sh"
+    testfile.write_text("python3 -m tool input.txt")
+    names = ["sol_a", "sol_b"]
+    commands = hyperfine_commands(create_command(tmp_path, testfile, generic=True), tmp_path, names)
+    # the python process of every run, with the shell test file started by subprocess.run
+    runs = [{"cmdlines": [f"{sys.executable} -c {command}", "python3 -m tool input.txt"]} for command in commands]
+    runs.append({"cmdlines": [f"{sys.executable} -c "]})
+    assert {name: len(x) for name, x in assign_runs(runs, names).items()} == {"sol_a": 1, "sol_b": 1}
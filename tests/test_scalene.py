@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from benchie.reporting import postprocess_output
+from benchie.scalene import run_scalene_all
+
+
+def _line(lineno, line, cpu=0.0, peak_mb=0.0):
+    return {
+        "lineno": lineno,
+        "line": line,
+        "n_cpu_percent_python": cpu,
+        "n_cpu_percent_c": 0.0,
+        "n_sys_percent": 0.0,
+        "n_peak_mb": peak_mb,
+        "n_malloc_mb": peak_mb,
+    }
+
+
+def test_hotspot_report(tmp_path):
+    testfile = tmp_path / "data_01.py"
+    (tmp_path / "scalene").mkdir()
+    profile = {
+        "files": {
+            "/solutions/example/fast.py": {
+                "functions": [_line(1, "align", cpu=90.0, peak_mb=1.5)],
+                "lines": [
+                    _line(2, "    table = [[0] * n for _ in range(m)]\n", cpu=10.0, peak_mb=1.5),
+                    _line(3, "pass"),
+                ],
+            }
+        }
+    }
+    (tmp_path / "scalene" / "fast_scalene.json").write_text(json.dumps(profile))
+    postprocess_output(testfile, tmp_path)
+    table = (tmp_path / "data_01_hotspots.md").read_text()
+    assert "## `fast`" in table
+    assert "`fast.py:1` | `align` | 90.0 | 1.500" in table
+    assert "table = [[0] * n for _ in range(m)]" in table
+    # lines without CPU time or memory are no hotspots
+    assert "`pass`" not in table
+
+
+def test_sleep_scalene(sleep_solution, sleep_data, tmp_path):
+    pytest.importorskip("scalene")
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    profiles = run_scalene_all(tmp_path, solutions, testfile, timeout=60, jobs=2)
+    assert all(profiles[solution] for solution in solutions)
+    postprocess_output(testfile, tmp_path)
+    assert (tmp_path / "data_01_hotspots.md").exists()
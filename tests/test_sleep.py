@@ -1,7 +1,7 @@
 from pathlib import Path
 
 import benchie
-from benchie.benchmark import BenchmarkOption
+from benchie.benchmark import BenchmarkOption, pretest_all
 
 
 def test_sleep_hyperfine(sleep_solution, sleep_data, tmp_path):
@@ -38,4 +38,16 @@ def test_sleep_hyperfine_no_pycache(sleep_solution, sleep_data, tmp_path):
     )
     assert len(output) == 2
     # make sure __pychache__ is removed from solutions folder
-    assert not (sleep_solution / "__pycache__").exists()
\ No newline at end of file
+    assert not (sleep_solution / "__pycache__").exists()
+
+
+def test_sleep_pretest_parallel(sleep_solution, sleep_data, tmp_path):
+    testfile = sleep_data / "data_01.py"
+    solutions = sorted(sleep_solution.glob("*.py"))
+    correct = pretest_all(solutions, testfile, timeout=10, jobs=2, output=tmp_path)
+    # order of the solutions is kept, whichever finishes first
+    assert [solution["path"] for solution in correct] == solutions
+    assert all(solution["pretest_ms"] > 0 for solution in correct)
+    # the pretest run is measured
+    assert all(solution["pretest"]["exit_code"] == 0 for solution in correct)
+    assert (tmp_path / "data_01_pretest.json").exists()
@@ -0,0 +1,44 @@
+import stat
+
+from benchie.staging import DataStore, staged_workdir
+
+
+def test_staged_workdir(tmp_path):
+    data = tmp_path / "data"
+    (data / "reads").mkdir(parents=True)
+    (data / "genome.fasta").write_text(">a\nACGT\n")
+    (data / "reads" / "r1.fastq").write_text("@r1\nAC\n+\nII\n")
+    (data / "data_01.py").write_text("f('genome.fasta')")
+    store = DataStore(tmp_path / "store")
+
+    stored = store.store(data)
+    # the same data is stored once
+    assert store.store(data) == stored
+    assert not (stored / "genome.fasta").stat().st_mode & stat.S_IWUSR
+
+    with staged_workdir(data, store=store) as workdir:
+        assert (workdir / "genome.fasta").read_text() == ">a\nACGT\n"
+        assert (workdir / "reads" / "r1.fastq").exists()
+        assert not (workdir / "data_01.py").exists()
+        # runs can write their own files next to the data
+        (workdir / "out.txt").write_text("x")
+    assert not workdir.exists()
+    assert not (stored / "out.txt").exists()
+
+    # changed data gets a new copy in the store
+    (data / "genome.fasta").write_text(">a\nACGTT\n")
+    assert store.store(data) != stored
+    # and its previous version is removed
+    assert not stored.exists()
+
+
+def test_temporary_store(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "genome.fasta").write_text(">a\nACGT\n")
+    store = DataStore()
+    # a private folder, not a shared one that other users could create first
+    assert not store.root.stat().st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+    assert (store.store(data) / "genome.fasta").exists()
+    store.remove()
+    assert not store.root.exists()
@@ -0,0 +1,43 @@
+import json
+
+from benchie.sweep import InputCache, run_sweep_all
+
+
+def test_sweep_with_generated_inputs(tmp_path):
+    solutions = tmp_path / "solutions"
+    solutions.mkdir()
+    (solutions / "count.py").write_text("def count(path, n):\n    assert len(open(path).read().split()[1]) == n\n")
+    data = tmp_path / "data"
+    data.mkdir()
+    sweep = data / "sweep_dna.json"
+    spec = {
+        "call": "count('{input}', {n})",
+        "parameters": {"n": {"min": 10, "max": 1000, "factor": 10}},
+        "input": {"generator": "dna", "length": "{n}", "seed": 1, "width": 10000},
+        "runs": 2,
+    }
+    sweep.write_text(json.dumps(spec))
+    inputs = InputCache(tmp_path / "inputs")
+    output = tmp_path / "output" / "sweep_dna"
+
+    results = run_sweep_all(output, [solutions / "count.py"], sweep, timeout=30, inputs=inputs)
+    assert [r["parameters"]["n"] for r in results["count"]] == [10, 100, 1000]
+    assert all(r["exit_codes"] == [0, 0] for r in results["count"])
+    # every input is generated once, and the same seed gives the same input
+    assert len(list(inputs.root.glob("*/*.fasta"))) == 3
+    assert inputs.get("dna", length=10, seed=1, width=10000).read_text().startswith(">seq\n")
+    table = (output / "count_sweep.md").read_text()
+    assert len(table.splitlines()) == 2 + 3
+    complexity = json.loads((output / "complexity.json").read_text())
+    assert complexity["size"] == "n"
+    assert complexity["results"][0]["time"]["n"] == 3
+
+
+def test_private_input_cache():
+    # without a root, the inputs are kept in a private folder that is removed afterwards
+    inputs = InputCache()
+    path = inputs.get("integers", count=3, seed=1)
+    assert inputs.root.stat().st_mode & 0o077 == 0
+    assert len(path.read_text().split()) == 3
+    inputs.remove()
+    assert not inputs.root.exists()